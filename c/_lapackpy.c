@@ -0,0 +1,283 @@
+/* Copyright (C) 2017 Atsushi Togo */
+/* All rights reserved. */
+
+/* This file is part of phonopy. */
+
+/* Redistribution and use in source and binary forms, with or without */
+/* modification, are permitted provided that the following conditions */
+/* are met: */
+
+/* * Redistributions of source code must retain the above copyright */
+/*   notice, this list of conditions and the following disclaimer. */
+
+/* * Redistributions in binary form must reproduce the above copyright */
+/*   notice, this list of conditions and the following disclaimer in */
+/*   the documentation and/or other materials provided with the */
+/*   distribution. */
+
+/* * Neither the name of the phonopy project nor the names of its */
+/*   contributors may be used to endorse or promote products derived */
+/*   from this software without specific prior written permission. */
+
+/* THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS */
+/* "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT */
+/* LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS */
+/* FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE */
+/* COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, */
+/* INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, */
+/* BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; */
+/* LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER */
+/* CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT */
+/* LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN */
+/* ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE */
+/* POSSIBILITY OF SUCH DAMAGE. */
+
+#include <Python.h>
+#include <stdio.h>
+#include <numpy/arrayobject.h>
+#include <phonon.h>
+
+static PyObject * py_get_phonons_at_qpoints(PyObject *self, PyObject *args);
+static PyObject *
+py_get_phonons_from_dynamical_matrices(PyObject *self, PyObject *args);
+
+struct module_state {
+  PyObject *error;
+};
+
+#if PY_MAJOR_VERSION >= 3
+#define GETSTATE(m) ((struct module_state*)PyModule_GetState(m))
+#else
+#define GETSTATE(m) (&_state)
+static struct module_state _state;
+#endif
+
+static PyObject *
+error_out(PyObject *m) {
+  struct module_state *st = GETSTATE(m);
+  PyErr_SetString(st->error, "something bad happened");
+  return NULL;
+}
+
+static PyMethodDef _lapackpy_methods[] = {
+  {"error_out", (PyCFunction)error_out, METH_NOARGS, NULL},
+  {"phonons_at_qpoints", py_get_phonons_at_qpoints, METH_VARARGS,
+   "Eigenvalues and eigenvectors of dynamical matrices at q-points by LAPACK"},
+  {"phonons_from_dynamical_matrices", py_get_phonons_from_dynamical_matrices,
+   METH_VARARGS, "Eigenvalues and eigenvectors of dynamical matrices by LAPACK"},
+  {NULL, NULL, 0, NULL}
+};
+
+#if PY_MAJOR_VERSION >= 3
+
+static int _lapackpy_traverse(PyObject *m, visitproc visit, void *arg) {
+  Py_VISIT(GETSTATE(m)->error);
+  return 0;
+}
+
+static int _lapackpy_clear(PyObject *m) {
+  Py_CLEAR(GETSTATE(m)->error);
+  return 0;
+}
+
+static struct PyModuleDef moduledef = {
+  PyModuleDef_HEAD_INIT,
+  "_lapackpy",
+  NULL,
+  sizeof(struct module_state),
+  _lapackpy_methods,
+  NULL,
+  _lapackpy_traverse,
+  _lapackpy_clear,
+  NULL
+};
+
+#define INITERROR return NULL
+
+PyObject *
+PyInit__lapackpy(void)
+
+#else
+#define INITERROR return
+
+  void
+  init_lapackpy(void)
+#endif
+{
+#if PY_MAJOR_VERSION >= 3
+  PyObject *module = PyModule_Create(&moduledef);
+#else
+  PyObject *module = Py_InitModule("_lapackpy", _lapackpy_methods);
+#endif
+  struct module_state *st;
+  if (module == NULL)
+    INITERROR;
+  st = GETSTATE(module);
+
+  st->error = PyErr_NewException("_lapackpy.Error", NULL, NULL);
+  if (st->error == NULL) {
+    Py_DECREF(module);
+    INITERROR;
+  }
+
+#if PY_MAJOR_VERSION >= 3
+  return module;
+#endif
+}
+
+static PyObject * py_get_phonons_at_qpoints(PyObject *self, PyObject *args)
+{
+  PyArrayObject* eigenvalues_py;
+  PyArrayObject* eigenvectors_py;
+  PyArrayObject* qpoints_py;
+  PyArrayObject* force_constants_py;
+  PyArrayObject* r_vector_py;
+  PyArrayObject* multiplicity_py;
+  PyArrayObject* mass_py;
+  PyArrayObject* super2prim_map_py;
+  PyArrayObject* prim2super_map_py;
+  PyObject* born_py;
+  PyObject* dielectric_py;
+  PyArrayObject* reciprocal_lattice_py;
+  PyObject* q_direction_py;
+  double nac_factor, tolerance;
+  char* uplo;
+  char* algorithm;
+
+  double* eigvals;
+  double* eigvecs;
+  double* qpoints;
+  double* fc;
+  double* r;
+  int* multi;
+  double* mass;
+  int* s2p_map;
+  int* p2s_map;
+  double* born;
+  double* dielectric;
+  double* rec_lat;
+  double* q_dir;
+  int num_qpoints, num_patom, num_satom, info;
+
+  if (!PyArg_ParseTuple(args, "OOOOOOOOOOOOOddss",
+                        &eigenvalues_py,
+                        &eigenvectors_py,
+                        &qpoints_py,
+                        &force_constants_py,
+                        &r_vector_py,
+                        &multiplicity_py,
+                        &mass_py,
+                        &super2prim_map_py,
+                        &prim2super_map_py,
+                        &born_py,
+                        &dielectric_py,
+                        &reciprocal_lattice_py,
+                        &q_direction_py,
+                        &nac_factor,
+                        &tolerance,
+                        &uplo,
+                        &algorithm)) {
+    return NULL;
+  }
+
+  eigvals = (double*)PyArray_DATA(eigenvalues_py);
+  eigvecs = (double*)PyArray_DATA(eigenvectors_py);
+  qpoints = (double*)PyArray_DATA(qpoints_py);
+  num_qpoints = PyArray_DIMS(qpoints_py)[0];
+  fc = (double*)PyArray_DATA(force_constants_py);
+  r = (double*)PyArray_DATA(r_vector_py);
+  multi = (int*)PyArray_DATA(multiplicity_py);
+  mass = (double*)PyArray_DATA(mass_py);
+  s2p_map = (int*)PyArray_DATA(super2prim_map_py);
+  p2s_map = (int*)PyArray_DATA(prim2super_map_py);
+  num_patom = PyArray_DIMS(prim2super_map_py)[0];
+  num_satom = PyArray_DIMS(super2prim_map_py)[0];
+  rec_lat = (double*)PyArray_DATA(reciprocal_lattice_py);
+  if (born_py == Py_None) {
+    born = NULL;
+  } else {
+    born = (double*)PyArray_DATA((PyArrayObject*)born_py);
+  }
+  if (dielectric_py == Py_None) {
+    dielectric = NULL;
+  } else {
+    dielectric = (double*)PyArray_DATA((PyArrayObject*)dielectric_py);
+  }
+  if (q_direction_py == Py_None) {
+    q_dir = NULL;
+  } else {
+    q_dir = (double*)PyArray_DATA((PyArrayObject*)q_direction_py);
+  }
+
+  info = phn_get_phonons_at_qpoints(eigvals,
+                                    eigvecs,
+                                    num_qpoints,
+                                    qpoints,
+                                    num_patom,
+                                    num_satom,
+                                    fc,
+                                    r,
+                                    multi,
+                                    mass,
+                                    s2p_map,
+                                    p2s_map,
+                                    born,
+                                    dielectric,
+                                    rec_lat,
+                                    q_dir,
+                                    nac_factor,
+                                    tolerance,
+                                    uplo[0],
+                                    algorithm[0]);
+
+  if (info != 0) {
+    PyErr_Format(PyExc_RuntimeError,
+                 "Diagonalization of dynamical matrix by LAPACK failed "
+                 "(info=%d).", info);
+    return NULL;
+  }
+
+  Py_RETURN_NONE;
+}
+
+static PyObject *
+py_get_phonons_from_dynamical_matrices(PyObject *self, PyObject *args)
+{
+  PyArrayObject* eigenvalues_py;
+  PyArrayObject* eigenvectors_py;
+  char* uplo;
+  char* algorithm;
+
+  double* eigvals;
+  double* eigvecs;
+  int num_qpoints, num_band, info;
+
+  if (!PyArg_ParseTuple(args, "OOss",
+                        &eigenvalues_py,
+                        &eigenvectors_py,
+                        &uplo,
+                        &algorithm)) {
+    return NULL;
+  }
+
+  eigvals = (double*)PyArray_DATA(eigenvalues_py);
+  eigvecs = (double*)PyArray_DATA(eigenvectors_py);
+  num_qpoints = PyArray_DIMS(eigenvalues_py)[0];
+  num_band = PyArray_DIMS(eigenvalues_py)[1];
+
+  info = phn_get_phonons_from_dynamical_matrices(eigvals,
+                                                 eigvecs,
+                                                 num_qpoints,
+                                                 num_band,
+                                                 uplo[0],
+                                                 algorithm[0]);
+
+  if (info != 0) {
+    PyErr_Format(PyExc_RuntimeError,
+                 "Diagonalization of dynamical matrix by LAPACK failed "
+                 "(info=%d).", info);
+    return NULL;
+  }
+
+  Py_RETURN_NONE;
+}
@@ -41,20 +41,25 @@
 #include <derivative_dynmat.h>
 #include <kgrid.h>
 #include <tetrahedron_method.h>
+#include <fc_symmetry.h>
 
 #define KB 8.6173382568083159E-05
 #define PHPYCONST
 
 /* Build dynamical matrix */
 static PyObject * py_get_dynamical_matrix(PyObject *self, PyObject *args);
+static PyObject * py_get_dynamical_matrices(PyObject *self, PyObject *args);
 static PyObject * py_get_nac_dynamical_matrix(PyObject *self, PyObject *args);
 static PyObject * py_get_dipole_dipole(PyObject *self, PyObject *args);
+static PyObject * py_get_dipole_dipole_q0(PyObject *self, PyObject *args);
 static PyObject * py_get_derivative_dynmat(PyObject *self, PyObject *args);
 static PyObject * py_get_thermal_properties(PyObject *self, PyObject *args);
 static PyObject * py_distribute_fc2(PyObject *self, PyObject *args);
 static PyObject * py_distribute_fc2_all(PyObject *self, PyObject *args);
 static PyObject * py_distribute_fc2_with_mappings(PyObject *self, PyObject *args);
 static PyObject * py_compute_permutation(PyObject *self, PyObject *args);
+static PyObject * py_perm_trans_symmetrize_fc(PyObject *self, PyObject *args);
+static PyObject * py_set_tensor_symmetry_fc(PyObject *self, PyObject *args);
 static PyObject * py_gsv_copy_smallest_vectors(PyObject *self, PyObject *args);
 
 static int distribute_fc2(double *fc2,
@@ -103,6 +108,9 @@ static PyObject *
 py_thm_integration_weight_at_omegas(PyObject *self, PyObject *args);
 static PyObject * py_get_tetrahedra_frequenies(PyObject *self, PyObject *args);
 static PyObject * py_tetrahedron_method_dos(PyObject *self, PyObject *args);
+static PyObject *
+py_tetrahedron_mesh_integration_weights(PyObject *self, PyObject *args);
+static PyObject * py_format_fixed_width(PyObject *self, PyObject *args);
 
 static double get_free_energy_omega(const double temperature,
 				    const double omega);
@@ -119,6 +127,17 @@ static int check_overlap(PHPYCONST double (*pos)[3],
                          const double t[3],
                          const double symprec);
 static int nint(const double a);
+static int is_c_intc_array(PyArrayObject *array);
+static int format_fixed_width(char *text,
+                              const double *values,
+                              const npy_intp *positions,
+                              const long num_values,
+                              const int width,
+                              const int precision);
+static int sprint_fixed(char *buf,
+                        const double x,
+                        const int width,
+                        const int precision);
 
 struct module_state {
   PyObject *error;
@@ -141,8 +160,12 @@ error_out(PyObject *m) {
 static PyMethodDef _phonopy_methods[] = {
   {"error_out", (PyCFunction)error_out, METH_NOARGS, NULL},
   {"dynamical_matrix", py_get_dynamical_matrix, METH_VARARGS, "Dynamical matrix"},
+  {"dynamical_matrices", py_get_dynamical_matrices, METH_VARARGS,
+   "Dynamical matrices at q-points"},
   {"nac_dynamical_matrix", py_get_nac_dynamical_matrix, METH_VARARGS, "NAC dynamical matrix"},
   {"dipole_dipole", py_get_dipole_dipole, METH_VARARGS, "Dipole-dipole interaction"},
+  {"dipole_dipole_q0", py_get_dipole_dipole_q0, METH_VARARGS,
+   "q-independent part of dipole-dipole interaction"},
   {"derivative_dynmat", py_get_derivative_dynmat, METH_VARARGS, "Q derivative of dynamical matrix"},
   {"thermal_properties", py_get_thermal_properties, METH_VARARGS, "Thermal properties"},
   {"distribute_fc2", py_distribute_fc2, METH_VARARGS, "Distribute force constants"},
@@ -152,6 +175,12 @@ static PyMethodDef _phonopy_methods[] = {
    "Distribute force constants for all atoms in atom_list using precomputed symmetry mappings."},
   {"compute_permutation", py_compute_permutation, METH_VARARGS,
    "Compute indices of original points in a set of rotated points."},
+  {"perm_trans_symmetrize_fc", py_perm_trans_symmetrize_fc, METH_VARARGS,
+   "Impose index permutation and translational symmetries on force constants"},
+  {"set_tensor_symmetry_fc", py_set_tensor_symmetry_fc, METH_VARARGS,
+   "Average force constants over space group operations"},
+  {"format_fixed_width", py_format_fixed_width, METH_VARARGS,
+   "Format values by printf-like %width.precisionf without new lines"},
   {"gsv_copy_smallest_vectors", py_gsv_copy_smallest_vectors, METH_VARARGS,
    "Implementation detail of get_smallest_vectors."},
   {"neighboring_grid_points", py_thm_neighboring_grid_points,
@@ -170,6 +199,9 @@ static PyMethodDef _phonopy_methods[] = {
    METH_VARARGS, "Run tetrahedron method"},
   {"tetrahedron_method_dos", py_tetrahedron_method_dos,
    METH_VARARGS, "Run tetrahedron method"},
+  {"tetrahedron_mesh_integration_weights",
+   py_tetrahedron_mesh_integration_weights,
+   METH_VARARGS, "Integration weights of all bands at a grid point"},
   {NULL, NULL, 0, NULL}
 };
 
@@ -271,6 +303,174 @@ static PyObject * py_compute_permutation(PyObject *self, PyObject *args)
   return Py_BuildValue("i", is_found);
 }
 
+static PyObject * py_perm_trans_symmetrize_fc(PyObject *self, PyObject *args)
+{
+  PyArrayObject* force_constants_py;
+  PyArrayObject* p2s_map_py;
+  PyArrayObject* s2pp_map_py;
+  PyArrayObject* nsym_list_py;
+  PyArrayObject* inv_trans_perms_py;
+  int iteration;
+
+  double *fc;
+  int *p2s_map;
+  int *s2pp_map;
+  int *nsym_list;
+  int *inv_trans_perms;
+  int num_patom, num_satom;
+
+  if (!PyArg_ParseTuple(args, "OOOOOi",
+                        &force_constants_py,
+                        &p2s_map_py,
+                        &s2pp_map_py,
+                        &nsym_list_py,
+                        &inv_trans_perms_py,
+                        &iteration)) {
+    return NULL;
+  }
+
+  if (!PyArray_ISCARRAY(force_constants_py) ||
+      PyArray_TYPE(force_constants_py) != NPY_DOUBLE ||
+      PyArray_NDIM(force_constants_py) != 4) {
+    PyErr_SetString(PyExc_ValueError,
+                    "force constants have to be C-contiguous double array");
+    return NULL;
+  }
+
+  if (!is_c_intc_array(p2s_map_py) ||
+      !is_c_intc_array(s2pp_map_py) ||
+      !is_c_intc_array(nsym_list_py) ||
+      !is_c_intc_array(inv_trans_perms_py)) {
+    PyErr_SetString(PyExc_ValueError,
+                    "atom mappings have to be C-contiguous intc arrays");
+    return NULL;
+  }
+
+  fc = (double*)PyArray_DATA(force_constants_py);
+  p2s_map = (int*)PyArray_DATA(p2s_map_py);
+  s2pp_map = (int*)PyArray_DATA(s2pp_map_py);
+  nsym_list = (int*)PyArray_DATA(nsym_list_py);
+  inv_trans_perms = (int*)PyArray_DATA(inv_trans_perms_py);
+  num_patom = PyArray_DIMS(force_constants_py)[0];
+  num_satom = PyArray_DIMS(force_constants_py)[1];
+
+  if (PyArray_DIMS(p2s_map_py)[0] != num_patom ||
+      PyArray_DIMS(s2pp_map_py)[0] != num_satom ||
+      PyArray_DIMS(nsym_list_py)[0] != num_satom ||
+      PyArray_DIMS(inv_trans_perms_py)[1] != num_satom)
+  {
+    PyErr_SetString(PyExc_ValueError, "wrong shape for atom mappings");
+    return NULL;
+  }
+
+  fcs_perm_trans_symmetrize_fc(fc,
+                               p2s_map,
+                               s2pp_map,
+                               nsym_list,
+                               inv_trans_perms,
+                               num_patom,
+                               num_satom,
+                               iteration);
+
+  Py_RETURN_NONE;
+}
+
+static PyObject * py_set_tensor_symmetry_fc(PyObject *self, PyObject *args)
+{
+  PyArrayObject* force_constants_py;
+  PyArrayObject* p2s_map_py;
+  PyArrayObject* s2pp_map_py;
+  PyArrayObject* nsym_list_py;
+  PyArrayObject* inv_trans_perms_py;
+  PyArrayObject* rotations_cart_py;
+  PyArrayObject* permutations_py;
+
+  double *fc;
+  double *r_carts;
+  int *p2s_map;
+  int *s2pp_map;
+  int *nsym_list;
+  int *inv_trans_perms;
+  int *permutations;
+  int num_patom, num_satom, num_rot;
+
+  if (!PyArg_ParseTuple(args, "OOOOOOO",
+                        &force_constants_py,
+                        &p2s_map_py,
+                        &s2pp_map_py,
+                        &nsym_list_py,
+                        &inv_trans_perms_py,
+                        &rotations_cart_py,
+                        &permutations_py)) {
+    return NULL;
+  }
+
+  if (!PyArray_ISCARRAY(force_constants_py) ||
+      PyArray_TYPE(force_constants_py) != NPY_DOUBLE ||
+      PyArray_NDIM(force_constants_py) != 4) {
+    PyErr_SetString(PyExc_ValueError,
+                    "force constants have to be C-contiguous double array");
+    return NULL;
+  }
+
+  if (!is_c_intc_array(p2s_map_py) ||
+      !is_c_intc_array(s2pp_map_py) ||
+      !is_c_intc_array(nsym_list_py) ||
+      !is_c_intc_array(inv_trans_perms_py) ||
+      !is_c_intc_array(permutations_py)) {
+    PyErr_SetString(PyExc_ValueError,
+                    "atom mappings have to be C-contiguous intc arrays");
+    return NULL;
+  }
+
+  if (!PyArray_ISCARRAY_RO(rotations_cart_py) ||
+      PyArray_TYPE(rotations_cart_py) != NPY_DOUBLE) {
+    PyErr_SetString(PyExc_ValueError,
+                    "rotations have to be C-contiguous double array");
+    return NULL;
+  }
+
+  fc = (double*)PyArray_DATA(force_constants_py);
+  p2s_map = (int*)PyArray_DATA(p2s_map_py);
+  s2pp_map = (int*)PyArray_DATA(s2pp_map_py);
+  nsym_list = (int*)PyArray_DATA(nsym_list_py);
+  inv_trans_perms = (int*)PyArray_DATA(inv_trans_perms_py);
+  r_carts = (double*)PyArray_DATA(rotations_cart_py);
+  permutations = (int*)PyArray_DATA(permutations_py);
+  num_patom = PyArray_DIMS(force_constants_py)[0];
+  num_satom = PyArray_DIMS(force_constants_py)[1];
+  num_rot = PyArray_DIMS(permutations_py)[0];
+
+  if (PyArray_DIMS(p2s_map_py)[0] != num_patom ||
+      PyArray_DIMS(s2pp_map_py)[0] != num_satom ||
+      PyArray_DIMS(nsym_list_py)[0] != num_satom ||
+      PyArray_DIMS(inv_trans_perms_py)[1] != num_satom ||
+      PyArray_DIMS(permutations_py)[1] != num_satom)
+  {
+    PyErr_SetString(PyExc_ValueError, "wrong shape for atom mappings");
+    return NULL;
+  }
+
+  if (PyArray_DIMS(rotations_cart_py)[0] != num_rot)
+  {
+    PyErr_SetString(PyExc_ValueError, "permutations and rotations are different length");
+    return NULL;
+  }
+
+  fcs_set_tensor_symmetry(fc,
+                          p2s_map,
+                          s2pp_map,
+                          nsym_list,
+                          inv_trans_perms,
+                          r_carts,
+                          permutations,
+                          num_rot,
+                          num_patom,
+                          num_satom);
+
+  Py_RETURN_NONE;
+}
+
 static PyObject * py_gsv_copy_smallest_vectors(PyObject *self, PyObject *args)
 {
   PyArrayObject* py_shortest_vectors;
@@ -372,6 +572,67 @@ static PyObject * py_get_dynamical_matrix(PyObject *self, PyObject *args)
 }
 
 
+static PyObject * py_get_dynamical_matrices(PyObject *self, PyObject *args)
+{
+  PyArrayObject* dynamical_matrices;
+  PyArrayObject* force_constants;
+  PyArrayObject* r_vector;
+  PyArrayObject* qpoints_py;
+  PyArrayObject* multiplicity;
+  PyArrayObject* mass;
+  PyArrayObject* super2prim_map;
+  PyArrayObject* prim2super_map;
+
+  double* dm;
+  double* fc;
+  double* qpoints;
+  double* r;
+  double* m;
+  int* multi;
+  int* s2p_map;
+  int* p2s_map;
+  int num_qpoints;
+  int num_patom;
+  int num_satom;
+
+  if (!PyArg_ParseTuple(args, "OOOOOOOO",
+			&dynamical_matrices,
+			&force_constants,
+			&qpoints_py,
+			&r_vector,
+			&multiplicity,
+			&mass,
+			&super2prim_map,
+			&prim2super_map))
+    return NULL;
+
+  dm = (double*)PyArray_DATA(dynamical_matrices);
+  fc = (double*)PyArray_DATA(force_constants);
+  qpoints = (double*)PyArray_DATA(qpoints_py);
+  num_qpoints = PyArray_DIMS(qpoints_py)[0];
+  r = (double*)PyArray_DATA(r_vector);
+  m = (double*)PyArray_DATA(mass);
+  multi = (int*)PyArray_DATA(multiplicity);
+  s2p_map = (int*)PyArray_DATA(super2prim_map);
+  p2s_map = (int*)PyArray_DATA(prim2super_map);
+  num_patom = PyArray_DIMS(prim2super_map)[0];
+  num_satom = PyArray_DIMS(super2prim_map)[0];
+
+  get_dynamical_matrices_at_qpoints(dm,
+                                    num_qpoints,
+                                    num_patom,
+                                    num_satom,
+                                    fc,
+                                    qpoints,
+                                    r,
+                                    multi,
+                                    m,
+                                    s2p_map,
+                                    p2s_map);
+
+  Py_RETURN_NONE;
+}
+
 static PyObject * py_get_nac_dynamical_matrix(PyObject *self, PyObject *args)
 {
   PyArrayObject* dynamical_matrix;
@@ -454,8 +715,9 @@ static PyObject * py_get_nac_dynamical_matrix(PyObject *self, PyObject *args)
 static PyObject * py_get_dipole_dipole(PyObject *self, PyObject *args)
 {
   PyArrayObject* dd_py;
-  PyArrayObject* K_list_py;
-  PyArrayObject* q_vector_py;
+  PyArrayObject* dd_q0_py;
+  PyArrayObject* G_list_py;
+  PyArrayObject* q_cart_list_py;
   PyArrayObject* q_direction_py;
   PyArrayObject* born_py;
   PyArrayObject* dielectric_py;
@@ -464,18 +726,20 @@ static PyObject * py_get_dipole_dipole(PyObject *self, PyObject *args)
   double tolerance;
 
   double* dd;
-  double* K_list;
-  double* q_vector;
+  double* dd_q0;
+  double* G_list;
+  double* q_cart_list;
   double* q_direction;
   double* born;
   double* dielectric;
   double *pos;
-  int num_patom, num_K;
+  int num_patom, num_G, num_q;
 
-  if (!PyArg_ParseTuple(args, "OOOOOOOdd",
+  if (!PyArg_ParseTuple(args, "OOOOOOOOdd",
 			&dd_py,
-                        &K_list_py,
-			&q_vector_py,
+			&dd_q0_py,
+                        &G_list_py,
+			&q_cart_list_py,
 			&q_direction_py,
 			&born_py,
                         &dielectric_py,
@@ -486,24 +750,28 @@ static PyObject * py_get_dipole_dipole(PyObject *self, PyObject *args)
 
 
   dd = (double*)PyArray_DATA(dd_py);
-  K_list = (double*)PyArray_DATA(K_list_py);
+  dd_q0 = (double*)PyArray_DATA(dd_q0_py);
+  G_list = (double*)PyArray_DATA(G_list_py);
   if ((PyObject*)q_direction_py == Py_None) {
     q_direction = NULL;
   } else {
     q_direction = (double*)PyArray_DATA(q_direction_py);
   }
-  q_vector = (double*)PyArray_DATA(q_vector_py);
+  q_cart_list = (double*)PyArray_DATA(q_cart_list_py);
   born = (double*)PyArray_DATA(born_py);
   dielectric = (double*)PyArray_DATA(dielectric_py);
   pos = (double*)PyArray_DATA(pos_py);
-  num_K = PyArray_DIMS(K_list_py)[0];
+  num_G = PyArray_DIMS(G_list_py)[0];
+  num_q = PyArray_DIMS(q_cart_list_py)[0];
   num_patom = PyArray_DIMS(pos_py)[0];
 
-  get_dipole_dipole(dd, /* [natom, 3, natom, 3, (real, imag)] */
-                    K_list, /* [num_kvec, 3] */
-                    num_K,
+  get_dipole_dipole(dd, /* [num_q, natom, 3, natom, 3, (real, imag)] */
+                    dd_q0, /* [natom, 3, 3, (real, imag)] */
+                    G_list, /* [num_G, 3] */
+                    num_G,
+                    q_cart_list, /* [num_q, 3] */
+                    num_q,
                     num_patom,
-                    q_vector,
                     q_direction,
                     born,
                     dielectric,
@@ -514,6 +782,55 @@ static PyObject * py_get_dipole_dipole(PyObject *self, PyObject *args)
   Py_RETURN_NONE;
 }
 
+static PyObject * py_get_dipole_dipole_q0(PyObject *self, PyObject *args)
+{
+  PyArrayObject* dd_q0_py;
+  PyArrayObject* G_list_py;
+  PyArrayObject* born_py;
+  PyArrayObject* dielectric_py;
+  PyArrayObject* pos_py;
+  double factor;
+  double tolerance;
+
+  double* dd_q0;
+  double* G_list;
+  double* born;
+  double* dielectric;
+  double *pos;
+  int num_patom, num_G;
+
+  if (!PyArg_ParseTuple(args, "OOOOOdd",
+			&dd_q0_py,
+                        &G_list_py,
+			&born_py,
+                        &dielectric_py,
+                        &pos_py,
+			&factor,
+                        &tolerance))
+    return NULL;
+
+
+  dd_q0 = (double*)PyArray_DATA(dd_q0_py);
+  G_list = (double*)PyArray_DATA(G_list_py);
+  born = (double*)PyArray_DATA(born_py);
+  dielectric = (double*)PyArray_DATA(dielectric_py);
+  pos = (double*)PyArray_DATA(pos_py);
+  num_G = PyArray_DIMS(G_list_py)[0];
+  num_patom = PyArray_DIMS(pos_py)[0];
+
+  get_dipole_dipole_q0(dd_q0, /* [natom, 3, 3, (real, imag)] */
+                       G_list, /* [num_G, 3] */
+                       num_G,
+                       num_patom,
+                       born,
+                       dielectric,
+                       factor, /* 4pi/V*unit-conv */
+                       pos, /* [natom, 3] */
+                       tolerance);
+
+  Py_RETURN_NONE;
+}
+
 
 
 static PyObject * py_get_derivative_dynmat(PyObject *self, PyObject *args)
@@ -1266,6 +1583,92 @@ static PyObject * py_get_tetrahedra_frequenies(PyObject *self, PyObject *args)
   Py_RETURN_NONE;
 }
 
+static PyObject *
+py_tetrahedron_mesh_integration_weights(PyObject *self, PyObject *args)
+{
+  PyArrayObject* iw_py;
+  PyArrayObject* freq_points_py;
+  PyArrayObject* mesh_py;
+  PyArrayObject* grid_address_py;
+  PyArrayObject* gp_ir_index_py;
+  PyArrayObject* relative_grid_address_py;
+  PyArrayObject* frequencies_py;
+  int grid_point;
+  char* function;
+
+  double *iw;
+  double* freq_points;
+  int num_freq_points;
+  int* mesh;
+  int (*grid_address)[3];
+  int* gp_ir_index;
+  int (*relative_grid_address)[4][3];
+  double* frequencies;
+  int num_band;
+
+  int is_shift[3] = {0, 0, 0};
+  int i, j, k, l, m;
+  int g_addr[3];
+  int address_double[3];
+  int ir_gps[24][4];
+  double tetrahedra[24][4];
+
+  if (!PyArg_ParseTuple(args, "OOiOOOOOs",
+			&iw_py,
+			&freq_points_py,
+			&grid_point,
+			&mesh_py,
+			&grid_address_py,
+			&gp_ir_index_py,
+			&relative_grid_address_py,
+			&frequencies_py,
+			&function)) {
+    return NULL;
+  }
+
+  /* iw[num_freq_points][num_band] */
+  iw = (double*)PyArray_DATA(iw_py);
+  freq_points = (double*)PyArray_DATA(freq_points_py);
+  num_freq_points = (int)PyArray_DIMS(freq_points_py)[0];
+  mesh = (int*)PyArray_DATA(mesh_py);
+  grid_address = (int(*)[3])PyArray_DATA(grid_address_py);
+  gp_ir_index = (int*)PyArray_DATA(gp_ir_index_py);
+  relative_grid_address = (int(*)[4][3])PyArray_DATA(relative_grid_address_py);
+  frequencies = (double*)PyArray_DATA(frequencies_py);
+  num_band = (int)PyArray_DIMS(frequencies_py)[1];
+
+  /* Indices of ir-grid-points at vertices of 24 tetrahedra */
+  for (i = 0; i < 24; i++) {
+    for (j = 0; j < 4; j++) {
+      for (k = 0; k < 3; k++) {
+	g_addr[k] = grid_address[grid_point][k] +
+	  relative_grid_address[i][j][k];
+      }
+      kgd_get_grid_address_double_mesh(address_double,
+				       g_addr,
+				       mesh,
+				       is_shift);
+      ir_gps[i][j] =
+	gp_ir_index[kgd_get_grid_point_double_mesh(address_double, mesh)];
+    }
+  }
+
+#pragma omp parallel for private(j, l, m, tetrahedra)
+  for (i = 0; i < num_band; i++) {
+    for (l = 0; l < 24; l++) {
+      for (m = 0; m < 4; m++) {
+	tetrahedra[l][m] = frequencies[ir_gps[l][m] * num_band + i];
+      }
+    }
+    for (j = 0; j < num_freq_points; j++) {
+      iw[j * num_band + i] =
+	thm_get_integration_weight(freq_points[j], tetrahedra, function[0]);
+    }
+  }
+
+  Py_RETURN_NONE;
+}
+
 static PyObject * py_tetrahedron_method_dos(PyObject *self, PyObject *args)
 {
   PyArrayObject* dos_py;
@@ -1299,6 +1702,7 @@ static PyObject * py_tetrahedron_method_dos(PyObject *self, PyObject *args)
   int address_double[3];
   int *gp2ir, *ir_grid_points, *weights;
   double iw;
+  double *dos_local;
 
   gp2ir = NULL;
   ir_grid_points = NULL;
@@ -1316,7 +1720,7 @@ static PyObject * py_tetrahedron_method_dos(PyObject *self, PyObject *args)
     return NULL;
   }
 
-  /* dos[num_ir_gp][num_band][num_freq_points][num_coef] */
+  /* dos[num_freq_points][num_coef] */
   dos = (double*)PyArray_DATA(dos_py);
   mesh = (int*)PyArray_DATA(mesh_py);
   freq_points = (double*)PyArray_DATA(freq_points_py);
@@ -1352,38 +1756,63 @@ static PyObject * py_tetrahedron_method_dos(PyObject *self, PyObject *args)
     printf("Something is wrong!\n");
   }
 
-#pragma omp parallel for private(j, k, l, m, q, r, iw, ir_gps, g_addr, tetrahedra, address_double)
-  for (i = 0; i < num_ir_gp; i++) {
-    /* set 24 tetrahedra */
-    for (l = 0; l < 24; l++) {
-      for (q = 0; q < 4; q++) {
-        for (r = 0; r < 3; r++) {
-          g_addr[r] = grid_address[ir_grid_points[i]][r] +
-            relative_grid_address[l][q][r];
-        }
-        kgd_get_grid_address_double_mesh(address_double,
-                                         g_addr,
-                                         mesh,
-                                         is_shift);
-        ir_gps[l][q] = gp2ir[kgd_get_grid_point_double_mesh(address_double, mesh)];
-      }
+  for (i = 0; i < num_freq_points * num_coef; i++) {
+    dos[i] = 0;
+  }
+
+  /* Contributions of grid points are accumulated in thread-local */
+  /* buffers of dos[num_freq_points][num_coef] and summed up at the end. */
+#pragma omp parallel private(i, j, k, l, m, q, r, iw, ir_gps, g_addr, tetrahedra, address_double, dos_local)
+  {
+    dos_local = (double*)malloc(sizeof(double) * num_freq_points * num_coef);
+    for (j = 0; j < num_freq_points * num_coef; j++) {
+      dos_local[j] = 0;
     }
 
-    for (k = 0; k < num_band; k++) {
+#pragma omp for
+    for (i = 0; i < num_ir_gp; i++) {
+      /* set 24 tetrahedra */
       for (l = 0; l < 24; l++) {
         for (q = 0; q < 4; q++) {
-          tetrahedra[l][q] = frequencies[ir_gps[l][q] * num_band + k];
+          for (r = 0; r < 3; r++) {
+            g_addr[r] = grid_address[ir_grid_points[i]][r] +
+              relative_grid_address[l][q][r];
+          }
+          kgd_get_grid_address_double_mesh(address_double,
+                                           g_addr,
+                                           mesh,
+                                           is_shift);
+          ir_gps[l][q] =
+            gp2ir[kgd_get_grid_point_double_mesh(address_double, mesh)];
         }
       }
-      for (j = 0; j < num_freq_points; j++) {
-        iw = thm_get_integration_weight(freq_points[j], tetrahedra, 'I') * weights[i];
-        for (m = 0; m < num_coef; m++) {
-          dos[i * num_band * num_freq_points * num_coef +
-              k * num_coef * num_freq_points + j * num_coef + m] +=
-            iw * coef[i * num_coef * num_band + m * num_band + k];
+
+      for (k = 0; k < num_band; k++) {
+        for (l = 0; l < 24; l++) {
+          for (q = 0; q < 4; q++) {
+            tetrahedra[l][q] = frequencies[ir_gps[l][q] * num_band + k];
+          }
+        }
+        for (j = 0; j < num_freq_points; j++) {
+          iw = thm_get_integration_weight(freq_points[j], tetrahedra, 'I') *
+            weights[i];
+          for (m = 0; m < num_coef; m++) {
+            dos_local[j * num_coef + m] +=
+              iw * coef[i * num_coef * num_band + m * num_band + k];
+          }
         }
       }
     }
+
+#pragma omp critical
+    {
+      for (j = 0; j < num_freq_points * num_coef; j++) {
+        dos[j] += dos_local[j];
+      }
+    }
+
+    free(dos_local);
+    dos_local = NULL;
   }
 
   free(gp2ir);
@@ -1540,6 +1969,13 @@ static int check_overlap(PHPYCONST double (*pos)[3],
   return -1;
 }
 
+static int is_c_intc_array(PyArrayObject *array)
+{
+  return (PyArray_ISCARRAY_RO(array) &&
+          PyArray_TYPE(array) == NPY_INT &&
+          PyArray_ITEMSIZE(array) == sizeof(int));
+}
+
 static int nint(const double a)
 {
   if (a < 0.0)
@@ -1547,3 +1983,179 @@ static int nint(const double a)
   else
     return (int) (a + 0.5);
 }
+
+static PyObject * py_format_fixed_width(PyObject *self, PyObject *args)
+{
+  PyArrayObject* text_py;
+  PyArrayObject* values_py;
+  PyArrayObject* positions_py;
+  int width, precision;
+
+  char *text;
+  double *values;
+  npy_intp *positions;
+  long num_values;
+
+  if (!PyArg_ParseTuple(args, "OOOii",
+                        &text_py,
+                        &values_py,
+                        &positions_py,
+                        &width,
+                        &precision)) {
+    return NULL;
+  }
+
+  text = (char*)PyArray_DATA(text_py);
+  values = (double*)PyArray_DATA(values_py);
+  positions = (npy_intp*)PyArray_DATA(positions_py);
+  num_values = PyArray_DIMS(values_py)[0];
+
+  return PyLong_FromLong((long) format_fixed_width(text,
+                                                   values,
+                                                   positions,
+                                                   num_values,
+                                                   width,
+                                                   precision));
+}
+
+/* Write values as "%width.precisionf" at positions of text. Returns */
+/* 0 if any value can not be written within width characters exactly */
+/* as printf does. */
+static int format_fixed_width(char *text,
+                              const double *values,
+                              const npy_intp *positions,
+                              const long num_values,
+                              const int width,
+                              const int precision)
+{
+  long i;
+  int succeeded;
+
+  succeeded = 1;
+#pragma omp parallel for reduction(&&:succeeded)
+  for (i = 0; i < num_values; i++) {
+    succeeded = succeeded &&
+      sprint_fixed(text + positions[i], values[i], width, precision);
+  }
+  return succeeded;
+}
+
+static const unsigned long long powers_of_ten[] = {
+  1ULL, 10ULL, 100ULL, 1000ULL, 10000ULL, 100000ULL, 1000000ULL,
+  10000000ULL, 100000000ULL, 1000000000ULL, 10000000000ULL,
+  100000000000ULL, 1000000000000ULL, 10000000000000ULL,
+  100000000000000ULL, 1000000000000000ULL, 10000000000000000ULL,
+  100000000000000000ULL, 1000000000000000000ULL};
+
+static const char digit_pairs[] =
+  "00010203040506070809"
+  "10111213141516171819"
+  "20212223242526272829"
+  "30313233343536373839"
+  "40414243444546474849"
+  "50515253545556575859"
+  "60616263646566676869"
+  "70717273747576777879"
+  "80818283848586878889"
+  "90919293949596979899";
+
+/* Correctly rounded (half to even) fixed point representation of x */
+/* computed by integer arithmetic. Returns 0 when it is not possible. */
+static int sprint_fixed(char *buf,
+                        const double x,
+                        const int width,
+                        const int precision)
+{
+#ifdef __SIZEOF_INT128__
+  unsigned __int128 prod, rem, half;
+  unsigned long long mant, pow10, q;
+  double y, r;
+  int i, e, k, len, is_negative;
+  char digits[64];
+
+  if (!isfinite(x) || precision < 1 || precision > 18 || width > 40) {
+    return 0;
+  }
+
+  is_negative = signbit(x) ? 1 : 0;
+  pow10 = powers_of_ten[precision];
+
+  /* |x| * 10^precision in double differs from the exact value at most */
+  /* by y * DBL_EPSILON / 2, which is enough to find the rounded value */
+  /* unless y is close to a half integer. */
+  y = fabs(x) * (double) pow10;
+  r = floor(y);
+  if (x == 0) {
+    q = 0;
+  } else if (y < 4503599627370496.0 && fabs(y - r - 0.5) > y * DBL_EPSILON) {
+    q = (unsigned long long) r + (y - r > 0.5 ? 1 : 0);
+  } else {
+    /* |x| = mant * 2^e exactly */
+    mant = (unsigned long long) ldexp(frexp(fabs(x), &e), 53);
+    e -= 53;
+    prod = (unsigned __int128) mant * pow10;
+    if (e >= 0) {
+      if (e > 10) {
+        return 0;
+      }
+      prod <<= e;
+    } else {
+      k = -e;
+      if (k >= 128) {
+        prod = 0;
+      } else {
+        half = ((unsigned __int128) 1) << (k - 1);
+        rem = prod & ((half << 1) - 1);
+        prod >>= k;
+        if (rem > half || (rem == half && (prod & 1))) {
+          prod++;
+        }
+      }
+    }
+    if (prod >> 63) {
+      return 0;
+    }
+    q = (unsigned long long) prod;
+  }
+
+  /* Digits of q from the last one, at least precision + 1 digits */
+  len = 0;
+  while (q >= 100) {
+    k = (int)(q % 100) * 2;
+    q /= 100;
+    digits[len++] = digit_pairs[k + 1];
+    digits[len++] = digit_pairs[k];
+  }
+  if (q >= 10) {
+    k = (int)q * 2;
+    digits[len++] = digit_pairs[k + 1];
+    digits[len++] = digit_pairs[k];
+  } else {
+    digits[len++] = '0' + (char)q;
+  }
+  while (len < precision + 1) {
+    digits[len++] = '0';
+  }
+
+  if (len + 1 + is_negative > width) {
+    return 0;
+  }
+
+  k = width - 1;
+  for (i = 0; i < len; i++) {
+    if (i == precision) {
+      buf[k--] = '.';
+    }
+    buf[k--] = digits[i];
+  }
+  if (is_negative) {
+    buf[k--] = '-';
+  }
+  for (; k >= 0; k--) {
+    buf[k] = ' ';
+  }
+  return 1;
+#else
+  return 0;
+#endif
+}
@@ -66,6 +66,25 @@ static void get_dm(double dm_real[3][3],
 		   const int k);
 static double get_dielectric_part(const double q[3],
                                   const double *dielectric);
+static void get_dipole_dipole_at_q(double *dd,
+                                   const double *dd_q0,
+                                   const double *G_list,
+                                   const int num_G,
+                                   const double *q_cart,
+                                   const int num_patom,
+                                   const double *q_direction,
+                                   const double *born,
+                                   const double *dielectric,
+                                   const double factor,
+                                   const double *pos,
+                                   const double tolerance);
+static void get_phase_born(double *q_born,
+                           double *phase_born,
+                           const int num_patom,
+                           const double q_born_vector[3],
+                           const double q_phase_vector[3],
+                           const double *born,
+                           const double *pos);
 
 int get_dynamical_matrix_at_q(double *dynamical_matrix,
 			      const int num_patom, 
@@ -136,11 +155,50 @@ int get_dynamical_matrix_at_q(double *dynamical_matrix,
   return 0;
 }
 
-void get_dipole_dipole(double *dd, /* [natom, 3, natom, 3, (real, imag)] */
-                       const double *K_list, /* [num_kvec, 3] */
-                       const int num_K,
+/* Dynamical matrices at many q-points. OpenMP runs over q-points. */
+/* dynamical_matrices: [num_qpoints, num_patom*3, num_patom*3, (real, imag)] */
+int get_dynamical_matrices_at_qpoints(double *dynamical_matrices,
+                                      const int num_qpoints,
+                                      const int num_patom,
+                                      const int num_satom,
+                                      const double *fc,
+                                      const double *qpoints, /* [nq, 3] */
+                                      const double *r,
+                                      const int *multi,
+                                      const double *mass,
+                                      const int *s2p_map,
+                                      const int *p2s_map)
+{
+  int i, dm_size;
+
+  dm_size = num_patom * num_patom * 18;
+
+#pragma omp parallel for
+  for (i = 0; i < num_qpoints; i++) {
+    get_dynamical_matrix_at_q(dynamical_matrices + i * dm_size,
+                              num_patom,
+                              num_satom,
+                              fc,
+                              qpoints + i * 3,
+                              r,
+                              multi,
+                              mass,
+                              s2p_map,
+                              p2s_map,
+                              NULL,
+                              0);
+  }
+
+  return 0;
+}
+
+void get_dipole_dipole(double *dd, /* [num_q, natom, 3, natom, 3, (real, imag)] */
+                       const double *dd_q0, /* [natom, 3, 3, (real, imag)] */
+                       const double *G_list, /* [num_G, 3] */
+                       const int num_G,
+                       const double *q_cart_list, /* [num_q, 3] */
+                       const int num_q,
                        const int num_patom,
-                       const double *q_vector,
                        const double *q_direction,
                        const double *born,
                        const double *dielectric,
@@ -148,102 +206,102 @@ void get_dipole_dipole(double *dd, /* [natom, 3, natom, 3, (real, imag)] */
                        const double *pos, /* [natom, 3] */
                        const double tolerance)
 {
-  int i, j, k, l, g, adrs;
-  double q_K[3], q_G[3];
-  double norm, cos_phase, sin_phase, phase, z;
-  double *charge_sum;
-
-  charge_sum = NULL;
+  int i;
 
-  for (i = 0; i < num_patom * num_patom * 18; i++) {
-    dd[i] = 0;
+#pragma omp parallel for
+  for (i = 0; i < num_q; i++) {
+    get_dipole_dipole_at_q(dd + i * num_patom * num_patom * 18,
+                           dd_q0,
+                           G_list,
+                           num_G,
+                           q_cart_list + i * 3,
+                           num_patom,
+                           q_direction,
+                           born,
+                           dielectric,
+                           factor,
+                           pos,
+                           tolerance);
   }
-  charge_sum = (double*) malloc(sizeof(double) * num_patom * num_patom * 9);
-
-  for (g = 0; g < num_K; g++) {
-    norm = 0;
-    for (i = 0; i < 3; i++) {
-      norm += K_list[g * 3 + i] * K_list[g * 3 + i];
-    }
-
-    if (sqrt(norm) < tolerance) {
-      if (!q_direction) {
-        continue;
-      } else {
-        for (i = 0; i < 3; i++) {q_K[i] = q_direction[i];} 
-      }
-    } else {
-      for (i = 0; i < 3; i++) {q_K[i] = K_list[g * 3 + i];} 
-    }
+}
 
-    get_charge_sum(charge_sum,
-                   num_patom,
-                   factor / get_dielectric_part(q_K, dielectric),
-                   q_K,
-                   born);
+/* K-independent part of dipole-dipole interaction: */
+/* dd_q0[i, k, l] = sum_{G != 0} sum_j charge_sum(G)[i, j, k, l] */
+/*                  * exp(2pi i (pos_i - pos_j).G) */
+/* which is subtracted from diagonal blocks. */
+void get_dipole_dipole_q0(double *dd_q0, /* [natom, 3, 3, (real, imag)] */
+                          const double *G_list, /* [num_G, 3] */
+                          const int num_G,
+                          const int num_patom,
+                          const double *born,
+                          const double *dielectric,
+                          const double factor, /* 4pi/V*unit-conv */
+                          const double *pos, /* [natom, 3] */
+                          const double tolerance)
+{
+  int i, j, k, l, g, adrs;
+  double norm, denom;
+  double *q_born, *phase_born, *phase_born_sum;
 
-    for (i = 0; i < num_patom; i++) {
-      for (j = 0; j < num_patom; j++) {
-        phase = 0;
-        for (k = 0; k < 3; k++) {
-          phase += (pos[i * 3 + k] - pos[j * 3 + k]) * K_list[g * 3 + k];
-        }
-        phase *= 2 * PI;
-        cos_phase = cos(phase);
-        sin_phase = sin(phase);
-        for (k = 0; k < 3; k++) {
-          for (l = 0; l < 3; l++) {
-            adrs = i * num_patom * 18 + k * num_patom * 6 + j * 6 + l * 2;
-            z = charge_sum[i * num_patom * 9 + j * 9 + k * 3 + l];
-            dd[adrs] += z * cos_phase;
-            dd[adrs + 1] += z * sin_phase;
-          }
-        }
-      }
-    }
+  for (i = 0; i < num_patom * 18; i++) {
+    dd_q0[i] = 0;
   }
 
-  for (g = 0; g < num_K; g++) {
+  q_born = (double*) malloc(sizeof(double) * num_patom * 3);
+  phase_born = (double*) malloc(sizeof(double) * num_patom * 6);
+  phase_born_sum = (double*) malloc(sizeof(double) * 6);
+
+  for (g = 0; g < num_G; g++) {
     norm = 0;
     for (i = 0; i < 3; i++) {
-      q_G[i] = K_list[g * 3 + i] - q_vector[i];
-      norm += q_G[i] * q_G[i];
+      norm += G_list[g * 3 + i] * G_list[g * 3 + i];
     }
-
     if (sqrt(norm) < tolerance) {
       continue;
     }
 
-    get_charge_sum(charge_sum,
+    denom = get_dielectric_part(G_list + g * 3, dielectric);
+    get_phase_born(q_born,
+                   phase_born,
                    num_patom,
-                   factor / get_dielectric_part(q_G, dielectric),
-                   q_G,
-                   born);
+                   G_list + g * 3,
+                   G_list + g * 3,
+                   born,
+                   pos);
+
+    /* sum_j (G.Z_j) exp(-2pi i pos_j.G) */
+    for (k = 0; k < 6; k++) {
+      phase_born_sum[k] = 0;
+    }
+    for (j = 0; j < num_patom; j++) {
+      for (l = 0; l < 3; l++) {
+        phase_born_sum[l * 2] += phase_born[j * 6 + l * 2];
+        phase_born_sum[l * 2 + 1] -= phase_born[j * 6 + l * 2 + 1];
+      }
+    }
 
+    /* (G.Z_i) exp(2pi i pos_i.G) x sum_j */
     for (i = 0; i < num_patom; i++) {
-      for (j = 0; j < num_patom; j++) {
-        phase = 0;
-        for (k = 0; k < 3; k++) {
-          phase += (pos[i * 3 + k] - pos[j * 3 + k]) * q_G[k];
-        }
-        phase *= 2 * PI;
-        cos_phase = cos(phase);
-        sin_phase = sin(phase);
-        for (k = 0; k < 3; k++) {
-          for (l = 0; l < 3; l++) {
-            /* i is correct about the third index, not j */
-            adrs = i * num_patom * 18 + k * num_patom * 6 + i * 6 + l * 2;
-            z = charge_sum[i * num_patom * 9 + j * 9 + k * 3 + l];
-            dd[adrs] -= z * cos_phase;
-            dd[adrs + 1] -= z * sin_phase;
-          }
+      for (k = 0; k < 3; k++) {
+        for (l = 0; l < 3; l++) {
+          adrs = i * 18 + k * 6 + l * 2;
+          dd_q0[adrs] += factor / denom *
+            (phase_born[i * 6 + k * 2] * phase_born_sum[l * 2] -
+             phase_born[i * 6 + k * 2 + 1] * phase_born_sum[l * 2 + 1]);
+          dd_q0[adrs + 1] += factor / denom *
+            (phase_born[i * 6 + k * 2] * phase_born_sum[l * 2 + 1] +
+             phase_born[i * 6 + k * 2 + 1] * phase_born_sum[l * 2]);
         }
       }
     }
   }
 
-  free(charge_sum);
-  charge_sum = NULL;
+  free(phase_born_sum);
+  phase_born_sum = NULL;
+  free(phase_born);
+  phase_born = NULL;
+  free(q_born);
+  q_born = NULL;
 }
 
 void get_charge_sum(double *charge_sum,
@@ -388,6 +446,125 @@ static void get_dm(double dm_real[3][3],
   }
 }
 
+/* dd[i, k, j, l] = sum_K charge_sum(K)[i, j, k, l] */
+/*                  * exp(2pi i (pos_i - pos_j).K) - dd_q0[i, k, l] delta_ij */
+/* with K = G + q. The phase factor is separated into those of atoms i */
+/* and j, so trigonometric functions are computed per atom and K. */
+static void get_dipole_dipole_at_q(double *dd,
+                                   const double *dd_q0,
+                                   const double *G_list,
+                                   const int num_G,
+                                   const double *q_cart,
+                                   const int num_patom,
+                                   const double *q_direction,
+                                   const double *born,
+                                   const double *dielectric,
+                                   const double factor,
+                                   const double *pos,
+                                   const double tolerance)
+{
+  int i, j, k, l, g, adrs;
+  double q_K[3], K[3];
+  double norm, coef, pb_ik_re, pb_ik_im, pb_jl_re, pb_jl_im;
+  double *q_born, *phase_born;
+
+  for (i = 0; i < num_patom * num_patom * 18; i++) {
+    dd[i] = 0;
+  }
+
+  q_born = (double*) malloc(sizeof(double) * num_patom * 3);
+  phase_born = (double*) malloc(sizeof(double) * num_patom * 6);
+
+  for (g = 0; g < num_G; g++) {
+    norm = 0;
+    for (i = 0; i < 3; i++) {
+      K[i] = G_list[g * 3 + i] + q_cart[i];
+      norm += K[i] * K[i];
+    }
+
+    if (sqrt(norm) < tolerance) {
+      if (!q_direction) {
+        continue;
+      } else {
+        for (i = 0; i < 3; i++) {q_K[i] = q_direction[i];}
+      }
+    } else {
+      for (i = 0; i < 3; i++) {q_K[i] = K[i];}
+    }
+
+    coef = factor / get_dielectric_part(q_K, dielectric);
+    get_phase_born(q_born, phase_born, num_patom, q_K, K, born, pos);
+
+    for (i = 0; i < num_patom; i++) {
+      for (k = 0; k < 3; k++) {
+        pb_ik_re = phase_born[i * 6 + k * 2] * coef;
+        pb_ik_im = phase_born[i * 6 + k * 2 + 1] * coef;
+        for (j = 0; j < num_patom; j++) {
+          for (l = 0; l < 3; l++) {
+            /* multiplied by complex conjugate of atom j part */
+            pb_jl_re = phase_born[j * 6 + l * 2];
+            pb_jl_im = phase_born[j * 6 + l * 2 + 1];
+            adrs = i * num_patom * 18 + k * num_patom * 6 + j * 6 + l * 2;
+            dd[adrs] += pb_ik_re * pb_jl_re + pb_ik_im * pb_jl_im;
+            dd[adrs + 1] += pb_ik_im * pb_jl_re - pb_ik_re * pb_jl_im;
+          }
+        }
+      }
+    }
+  }
+
+  for (i = 0; i < num_patom; i++) {
+    for (k = 0; k < 3; k++) {
+      for (l = 0; l < 3; l++) {
+        adrs = i * num_patom * 18 + k * num_patom * 6 + i * 6 + l * 2;
+        dd[adrs] -= dd_q0[i * 18 + k * 6 + l * 2];
+        dd[adrs + 1] -= dd_q0[i * 18 + k * 6 + l * 2 + 1];
+      }
+    }
+  }
+
+  free(phase_born);
+  phase_born = NULL;
+  free(q_born);
+  q_born = NULL;
+}
+
+/* phase_born[i, k] = (q_born_vector.Z_i)_k exp(2pi i pos_i.q_phase_vector) */
+static void get_phase_born(double *q_born,
+                           double *phase_born,
+                           const int num_patom,
+                           const double q_born_vector[3],
+                           const double q_phase_vector[3],
+                           const double *born,
+                           const double *pos)
+{
+  int i, j, k;
+  double phase, cos_phase, sin_phase;
+
+  for (i = 0; i < num_patom; i++) {
+    for (j = 0; j < 3; j++) {
+      q_born[i * 3 + j] = 0;
+      for (k = 0; k < 3; k++) {
+        q_born[i * 3 + j] += q_born_vector[k] * born[i * 9 + k * 3 + j];
+      }
+    }
+  }
+
+  for (i = 0; i < num_patom; i++) {
+    phase = 0;
+    for (j = 0; j < 3; j++) {
+      phase += pos[i * 3 + j] * q_phase_vector[j];
+    }
+    phase *= 2 * PI;
+    cos_phase = cos(phase);
+    sin_phase = sin(phase);
+    for (j = 0; j < 3; j++) {
+      phase_born[i * 6 + j * 2] = q_born[i * 3 + j] * cos_phase;
+      phase_born[i * 6 + j * 2 + 1] = q_born[i * 3 + j] * sin_phase;
+    }
+  }
+}
+
 static double get_dielectric_part(const double q[3],
                                   const double *dielectric)
 {
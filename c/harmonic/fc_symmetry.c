@@ -0,0 +1,265 @@
+/* Copyright (C) 2017 Atsushi Togo */
+/* All rights reserved. */
+
+/* This file is part of phonopy. */
+
+/* Redistribution and use in source and binary forms, with or without */
+/* modification, are permitted provided that the following conditions */
+/* are met: */
+
+/* * Redistributions of source code must retain the above copyright */
+/*   notice, this list of conditions and the following disclaimer. */
+
+/* * Redistributions in binary form must reproduce the above copyright */
+/*   notice, this list of conditions and the following disclaimer in */
+/*   the documentation and/or other materials provided with the */
+/*   distribution. */
+
+/* * Neither the name of the phonopy project nor the names of its */
+/*   contributors may be used to endorse or promote products derived */
+/*   from this software without specific prior written permission. */
+
+/* THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS */
+/* "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT */
+/* LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS */
+/* FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE */
+/* COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, */
+/* INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, */
+/* BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; */
+/* LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER */
+/* CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT */
+/* LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN */
+/* ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE */
+/* POSSIBILITY OF SUCH DAMAGE. */
+
+
+#include <stdlib.h>
+#include <string.h>
+#include <fc_symmetry.h>
+
+static void set_permutation_symmetry(double *fc,
+                                     const int *p2s_map,
+                                     const int *s2pp_map,
+                                     const int *nsym_list,
+                                     const int *inv_trans_perms,
+                                     const int num_patom,
+                                     const int num_satom);
+static void set_translational_invariance(double *fc,
+                                         const int *p2s_map,
+                                         const int *s2pp_map,
+                                         const int *nsym_list,
+                                         const int *inv_trans_perms,
+                                         const int num_patom,
+                                         const int num_satom);
+static long get_fc_address(const int i,
+                           const int j,
+                           const int *s2pp_map,
+                           const int *nsym_list,
+                           const int *inv_trans_perms,
+                           const int num_satom);
+
+void fcs_perm_trans_symmetrize_fc(double *fc,
+                                  const int *p2s_map,
+                                  const int *s2pp_map,
+                                  const int *nsym_list,
+                                  const int *inv_trans_perms,
+                                  const int num_patom,
+                                  const int num_satom,
+                                  const int iteration)
+{
+  int i;
+
+  for (i = 0; i < iteration; i++) {
+    set_permutation_symmetry(fc,
+                             p2s_map,
+                             s2pp_map,
+                             nsym_list,
+                             inv_trans_perms,
+                             num_patom,
+                             num_satom);
+    set_translational_invariance(fc,
+                                 p2s_map,
+                                 s2pp_map,
+                                 nsym_list,
+                                 inv_trans_perms,
+                                 num_patom,
+                                 num_satom);
+  }
+}
+
+/* fc(i, j) = 1/N sum_n R_n^T fc(n(i), n(j)) R_n */
+void fcs_set_tensor_symmetry(double *fc,
+                             const int *p2s_map,
+                             const int *s2pp_map,
+                             const int *nsym_list,
+                             const int *inv_trans_perms,
+                             const double *r_carts,
+                             const int *permutations,
+                             const int num_rot,
+                             const int num_patom,
+                             const int num_satom)
+{
+  int i, j, k, l, m, n, r_i, r_j;
+  long adrs, adrs_rot;
+  double *fc_sym;
+  const double *r;
+  double fc_r[9];
+
+  fc_sym = (double*)malloc(sizeof(double) * num_patom * num_satom * 9);
+
+#pragma omp parallel for private(j, k, l, m, n, r_i, r_j, adrs, adrs_rot, r, fc_r)
+  for (i = 0; i < num_patom; i++) {
+    for (j = 0; j < num_satom; j++) {
+      adrs = ((long)i * num_satom + j) * 9;
+      for (k = 0; k < 9; k++) {
+        fc_sym[adrs + k] = 0;
+      }
+      for (n = 0; n < num_rot; n++) {
+        r_i = permutations[n * num_satom + p2s_map[i]];
+        r_j = permutations[n * num_satom + j];
+        adrs_rot = get_fc_address(r_i, r_j, s2pp_map, nsym_list,
+                                  inv_trans_perms, num_satom);
+        r = r_carts + n * 9;
+        /* fc_r = fc(n(i), n(j)) R */
+        for (k = 0; k < 3; k++) {
+          for (l = 0; l < 3; l++) {
+            fc_r[k * 3 + l] = 0;
+            for (m = 0; m < 3; m++) {
+              fc_r[k * 3 + l] += fc[adrs_rot + k * 3 + m] * r[m * 3 + l];
+            }
+          }
+        }
+        for (k = 0; k < 3; k++) {
+          for (l = 0; l < 3; l++) {
+            for (m = 0; m < 3; m++) {
+              fc_sym[adrs + k * 3 + l] += r[m * 3 + k] * fc_r[m * 3 + l];
+            }
+          }
+        }
+      }
+      for (k = 0; k < 9; k++) {
+        fc_sym[adrs + k] /= num_rot;
+      }
+    }
+  }
+
+  memcpy(fc, fc_sym, sizeof(double) * num_patom * num_satom * 9);
+  free(fc_sym);
+  fc_sym = NULL;
+}
+
+/* fc(i, j) = (fc(i, j) + fc(j, i)^T) / 2 */
+static void set_permutation_symmetry(double *fc,
+                                     const int *p2s_map,
+                                     const int *s2pp_map,
+                                     const int *nsym_list,
+                                     const int *inv_trans_perms,
+                                     const int num_patom,
+                                     const int num_satom)
+{
+  int i, j, k, l;
+  long adrs, adrs_T;
+  double *fc_copy;
+
+  fc_copy = (double*)malloc(sizeof(double) * num_patom * num_satom * 9);
+  memcpy(fc_copy, fc, sizeof(double) * num_patom * num_satom * 9);
+
+#pragma omp parallel for private(j, k, l, adrs, adrs_T)
+  for (i = 0; i < num_patom; i++) {
+    for (j = 0; j < num_satom; j++) {
+      adrs = ((long)i * num_satom + j) * 9;
+      adrs_T = get_fc_address(j, p2s_map[i], s2pp_map, nsym_list,
+                              inv_trans_perms, num_satom);
+      for (k = 0; k < 3; k++) {
+        for (l = 0; l < 3; l++) {
+          fc[adrs + k * 3 + l] = (fc_copy[adrs + k * 3 + l] +
+                                  fc_copy[adrs_T + l * 3 + k]) / 2;
+        }
+      }
+    }
+  }
+
+  free(fc_copy);
+  fc_copy = NULL;
+}
+
+/* Drifts of sums over the first and then the second atom indices */
+/* are subtracted uniformly. */
+static void set_translational_invariance(double *fc,
+                                         const int *p2s_map,
+                                         const int *s2pp_map,
+                                         const int *nsym_list,
+                                         const int *inv_trans_perms,
+                                         const int num_patom,
+                                         const int num_satom)
+{
+  int i, j, k;
+  long adrs;
+  double *drift;
+
+  /* By the translational symmetry, sum over the first index depends */
+  /* only on the primitive atom of the second index. */
+  drift = (double*)malloc(sizeof(double) * num_patom * 9);
+
+#pragma omp parallel for private(i, k, adrs)
+  for (j = 0; j < num_patom; j++) {
+    for (k = 0; k < 9; k++) {
+      drift[j * 9 + k] = 0;
+    }
+    for (i = 0; i < num_satom; i++) {
+      adrs = get_fc_address(i, p2s_map[j], s2pp_map, nsym_list,
+                            inv_trans_perms, num_satom);
+      for (k = 0; k < 9; k++) {
+        drift[j * 9 + k] += fc[adrs + k];
+      }
+    }
+    for (k = 0; k < 9; k++) {
+      drift[j * 9 + k] /= num_satom;
+    }
+  }
+
+#pragma omp parallel for private(j, k, adrs)
+  for (i = 0; i < num_patom; i++) {
+    for (j = 0; j < num_satom; j++) {
+      adrs = ((long)i * num_satom + j) * 9;
+      for (k = 0; k < 9; k++) {
+        fc[adrs + k] -= drift[s2pp_map[j] * 9 + k];
+      }
+    }
+  }
+
+  free(drift);
+  drift = NULL;
+
+#pragma omp parallel for private(j, k, adrs)
+  for (i = 0; i < num_patom; i++) {
+    double sum[9];
+    for (k = 0; k < 9; k++) {
+      sum[k] = 0;
+    }
+    for (j = 0; j < num_satom; j++) {
+      adrs = ((long)i * num_satom + j) * 9;
+      for (k = 0; k < 9; k++) {
+        sum[k] += fc[adrs + k];
+      }
+    }
+    for (j = 0; j < num_satom; j++) {
+      adrs = ((long)i * num_satom + j) * 9;
+      for (k = 0; k < 9; k++) {
+        fc[adrs + k] -= sum[k] / num_satom;
+      }
+    }
+  }
+}
+
+/* Address of element (i, j) of full force constants */
+static long get_fc_address(const int i,
+                           const int j,
+                           const int *s2pp_map,
+                           const int *nsym_list,
+                           const int *inv_trans_perms,
+                           const int num_satom)
+{
+  return ((long)s2pp_map[i] * num_satom +
+          inv_trans_perms[(long)nsym_list[i] * num_satom + j]) * 9;
+}
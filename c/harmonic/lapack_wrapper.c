@@ -0,0 +1,156 @@
+/* Copyright (C) 2017 Atsushi Togo */
+/* All rights reserved. */
+
+/* This file is part of phonopy. */
+
+/* Redistribution and use in source and binary forms, with or without */
+/* modification, are permitted provided that the following conditions */
+/* are met: */
+
+/* * Redistributions of source code must retain the above copyright */
+/*   notice, this list of conditions and the following disclaimer. */
+
+/* * Redistributions in binary form must reproduce the above copyright */
+/*   notice, this list of conditions and the following disclaimer in */
+/*   the documentation and/or other materials provided with the */
+/*   distribution. */
+
+/* * Neither the name of the phonopy project nor the names of its */
+/*   contributors may be used to endorse or promote products derived */
+/*   from this software without specific prior written permission. */
+
+/* THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS */
+/* "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT */
+/* LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS */
+/* FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE */
+/* COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, */
+/* INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, */
+/* BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; */
+/* LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER */
+/* CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT */
+/* LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN */
+/* ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE */
+/* POSSIBILITY OF SUCH DAMAGE. */
+
+#include <stdlib.h>
+#include <lapack_wrapper.h>
+
+/* Fortran LAPACK routines. Complex arrays are given as double arrays */
+/* with (real, imag) pairs. */
+extern void zheev_(const char *jobz,
+                   const char *uplo,
+                   const int *n,
+                   double *a,
+                   const int *lda,
+                   double *w,
+                   double *work,
+                   const int *lwork,
+                   double *rwork,
+                   int *info);
+extern void zheevd_(const char *jobz,
+                    const char *uplo,
+                    const int *n,
+                    double *a,
+                    const int *lda,
+                    double *w,
+                    double *work,
+                    const int *lwork,
+                    double *rwork,
+                    const int *lrwork,
+                    int *iwork,
+                    const int *liwork,
+                    int *info);
+
+static void transpose_conjugate(double *a, const int n);
+
+/* Eigenvalues and eigenvectors of a Hermitian matrix. */
+/* a: [n, n, (real, imag)] in row-major (C) order. On return, */
+/* eigenvectors are stored in columns as numpy.linalg.eigh does. */
+/* uplo: 'L' or 'U' with respect to the row-major matrix. */
+/* algorithm: 'd' for zheevd, otherwise zheev is used. */
+int phonopy_zheev(double *w,
+                  double *a,
+                  const int n,
+                  const char uplo,
+                  const char algorithm)
+{
+  int info, lwork, lrwork, liwork;
+  int iwork_query;
+  double work_query[2], rwork_query;
+  char jobz, uplo_f;
+  double *work, *rwork;
+  int *iwork;
+
+  work = NULL;
+  rwork = NULL;
+  iwork = NULL;
+  jobz = 'V';
+
+  /* The row-major matrix is seen as its transpose by Fortran, */
+  /* i.e., the complex conjugate for Hermitian matrix. */
+  if (uplo == 'L' || uplo == 'l') {
+    uplo_f = 'U';
+  } else {
+    uplo_f = 'L';
+  }
+
+  if (algorithm == 'd') {
+    lwork = -1;
+    lrwork = -1;
+    liwork = -1;
+    zheevd_(&jobz, &uplo_f, &n, a, &n, w,
+            work_query, &lwork, &rwork_query, &lrwork,
+            &iwork_query, &liwork, &info);
+    lwork = (int)work_query[0];
+    lrwork = (int)rwork_query;
+    liwork = iwork_query;
+    work = (double*)malloc(sizeof(double) * 2 * lwork);
+    rwork = (double*)malloc(sizeof(double) * lrwork);
+    iwork = (int*)malloc(sizeof(int) * liwork);
+    zheevd_(&jobz, &uplo_f, &n, a, &n, w,
+            work, &lwork, rwork, &lrwork,
+            iwork, &liwork, &info);
+    free(iwork);
+    iwork = NULL;
+  } else {
+    lwork = -1;
+    zheev_(&jobz, &uplo_f, &n, a, &n, w,
+           work_query, &lwork, &rwork_query, &info);
+    lwork = (int)work_query[0];
+    work = (double*)malloc(sizeof(double) * 2 * lwork);
+    rwork = (double*)malloc(sizeof(double) * (3 * n - 2 > 1 ? 3 * n - 2 : 1));
+    zheev_(&jobz, &uplo_f, &n, a, &n, w,
+           work, &lwork, rwork, &info);
+  }
+
+  free(work);
+  work = NULL;
+  free(rwork);
+  rwork = NULL;
+
+  /* Eigenvectors of the conjugated matrix are in rows of a. */
+  transpose_conjugate(a, n);
+
+  return info;
+}
+
+static void transpose_conjugate(double *a, const int n)
+{
+  int i, j, adrs, adrsT;
+  double re, im;
+
+  for (i = 0; i < n; i++) {
+    adrs = i * n * 2 + i * 2;
+    a[adrs + 1] = -a[adrs + 1];
+    for (j = i + 1; j < n; j++) {
+      adrs = i * n * 2 + j * 2;
+      adrsT = j * n * 2 + i * 2;
+      re = a[adrs];
+      im = a[adrs + 1];
+      a[adrs] = a[adrsT];
+      a[adrs + 1] = -a[adrsT + 1];
+      a[adrsT] = re;
+      a[adrsT + 1] = -im;
+    }
+  }
+}
@@ -0,0 +1,297 @@
+/* Copyright (C) 2017 Atsushi Togo */
+/* All rights reserved. */
+
+/* This file is part of phonopy. */
+
+/* Redistribution and use in source and binary forms, with or without */
+/* modification, are permitted provided that the following conditions */
+/* are met: */
+
+/* * Redistributions of source code must retain the above copyright */
+/*   notice, this list of conditions and the following disclaimer. */
+
+/* * Redistributions in binary form must reproduce the above copyright */
+/*   notice, this list of conditions and the following disclaimer in */
+/*   the documentation and/or other materials provided with the */
+/*   distribution. */
+
+/* * Neither the name of the phonopy project nor the names of its */
+/*   contributors may be used to endorse or promote products derived */
+/*   from this software without specific prior written permission. */
+
+/* THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS */
+/* "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT */
+/* LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS */
+/* FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE */
+/* COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, */
+/* INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, */
+/* BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; */
+/* LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER */
+/* CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT */
+/* LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN */
+/* ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE */
+/* POSSIBILITY OF SUCH DAMAGE. */
+
+#include <stdlib.h>
+#include <math.h>
+#include <dynmat.h>
+#include <lapack_wrapper.h>
+#include <phonon.h>
+
+static int get_phonons_at_q(double *eigvals,
+                            double *eigvecs,
+                            const double q[3],
+                            const int num_patom,
+                            const int num_satom,
+                            const double *fc,
+                            const double *r,
+                            const int *multi,
+                            const double *mass,
+                            const int *s2p_map,
+                            const int *p2s_map,
+                            const double *born,
+                            const double *dielectric,
+                            const double *reciprocal_lattice,
+                            const double *q_direction,
+                            const double nac_factor,
+                            const double tolerance,
+                            const char uplo,
+                            const char algorithm);
+static int solve_dynamical_matrix(double *eigvals,
+                                  double *eigvecs,
+                                  const int num_band,
+                                  const char uplo,
+                                  const char algorithm);
+static double *get_nac_charge_sum(const double q[3],
+                                  const int num_patom,
+                                  const int num_satom,
+                                  const double *born,
+                                  const double *dielectric,
+                                  const double *reciprocal_lattice,
+                                  const double *q_direction,
+                                  const double nac_factor,
+                                  const double tolerance);
+
+/* Phonons at q-points, where dynamical matrices are built and */
+/* diagonalized for each q-point. OpenMP runs over q-points. */
+/* eigenvalues: [num_qpoints, num_band] */
+/* eigenvectors: [num_qpoints, num_band, num_band, (real, imag)] */
+/* born == NULL means no NAC. Otherwise NAC by Wang's method is applied. */
+/* q_direction is used only at Gamma point. */
+/* Returns 0, or info of LAPACK at one of the q-points where */
+/* diagonalization failed. */
+int phn_get_phonons_at_qpoints(double *eigenvalues,
+                               double *eigenvectors,
+                               const int num_qpoints,
+                               const double *qpoints,
+                               const int num_patom,
+                               const int num_satom,
+                               const double *fc,
+                               const double *r,
+                               const int *multi,
+                               const double *mass,
+                               const int *s2p_map,
+                               const int *p2s_map,
+                               const double *born,
+                               const double *dielectric,
+                               const double *reciprocal_lattice,
+                               const double *q_direction,
+                               const double nac_factor,
+                               const double tolerance,
+                               const char uplo,
+                               const char algorithm)
+{
+  int i, num_band, info, info_q;
+
+  num_band = num_patom * 3;
+  info = 0;
+
+#pragma omp parallel for private(info_q)
+  for (i = 0; i < num_qpoints; i++) {
+    info_q = get_phonons_at_q(eigenvalues + i * num_band,
+                              eigenvectors + i * num_band * num_band * 2,
+                              qpoints + i * 3,
+                              num_patom,
+                              num_satom,
+                              fc,
+                              r,
+                              multi,
+                              mass,
+                              s2p_map,
+                              p2s_map,
+                              born,
+                              dielectric,
+                              reciprocal_lattice,
+                              q_direction,
+                              nac_factor,
+                              tolerance,
+                              uplo,
+                              algorithm);
+    if (info_q != 0) {
+#pragma omp critical
+      info = info_q;
+    }
+  }
+
+  return info;
+}
+
+/* Dynamical matrices given in eigenvectors are overwritten by */
+/* eigenvectors. Returns as phn_get_phonons_at_qpoints. */
+int phn_get_phonons_from_dynamical_matrices(double *eigenvalues,
+                                            double *eigenvectors,
+                                            const int num_qpoints,
+                                            const int num_band,
+                                            const char uplo,
+                                            const char algorithm)
+{
+  int i, info, info_q;
+
+  info = 0;
+
+#pragma omp parallel for private(info_q)
+  for (i = 0; i < num_qpoints; i++) {
+    info_q = solve_dynamical_matrix(eigenvalues + i * num_band,
+                                    eigenvectors + i * num_band * num_band * 2,
+                                    num_band,
+                                    uplo,
+                                    algorithm);
+    if (info_q != 0) {
+#pragma omp critical
+      info = info_q;
+    }
+  }
+
+  return info;
+}
+
+static int get_phonons_at_q(double *eigvals,
+                            double *eigvecs,
+                            const double q[3],
+                            const int num_patom,
+                            const int num_satom,
+                            const double *fc,
+                            const double *r,
+                            const int *multi,
+                            const double *mass,
+                            const int *s2p_map,
+                            const int *p2s_map,
+                            const double *born,
+                            const double *dielectric,
+                            const double *reciprocal_lattice,
+                            const double *q_direction,
+                            const double nac_factor,
+                            const double tolerance,
+                            const char uplo,
+                            const char algorithm)
+{
+  double *charge_sum;
+
+  charge_sum = NULL;
+
+  if (born) {
+    charge_sum = get_nac_charge_sum(q,
+                                    num_patom,
+                                    num_satom,
+                                    born,
+                                    dielectric,
+                                    reciprocal_lattice,
+                                    q_direction,
+                                    nac_factor,
+                                    tolerance);
+  }
+
+  get_dynamical_matrix_at_q(eigvecs,
+                            num_patom,
+                            num_satom,
+                            fc,
+                            q,
+                            r,
+                            multi,
+                            mass,
+                            s2p_map,
+                            p2s_map,
+                            charge_sum,
+                            0);
+
+  if (charge_sum) {
+    free(charge_sum);
+    charge_sum = NULL;
+  }
+
+  return solve_dynamical_matrix(eigvals,
+                                eigvecs,
+                                num_patom * 3,
+                                uplo,
+                                algorithm);
+}
+
+static int solve_dynamical_matrix(double *eigvals,
+                                  double *eigvecs,
+                                  const int num_band,
+                                  const char uplo,
+                                  const char algorithm)
+{
+  return phonopy_zheev(eigvals, eigvecs, num_band, uplo, algorithm);
+}
+
+/* Returns NULL when q is at Gamma point and q_direction is not given. */
+static double *get_nac_charge_sum(const double q[3],
+                                  const int num_patom,
+                                  const int num_satom,
+                                  const double *born,
+                                  const double *dielectric,
+                                  const double *reciprocal_lattice,
+                                  const double *q_direction,
+                                  const double nac_factor,
+                                  const double tolerance)
+{
+  int i, j, is_gamma;
+  double q_cart[3], q_red[3];
+  double norm, denominator;
+  double *charge_sum;
+
+  is_gamma = 1;
+  for (i = 0; i < 3; i++) {
+    if (fabs(q[i]) > 1e-5) {
+      is_gamma = 0;
+    }
+  }
+
+  for (i = 0; i < 3; i++) {
+    if (is_gamma && q_direction) {
+      q_red[i] = q_direction[i];
+    } else {
+      q_red[i] = q[i];
+    }
+  }
+
+  norm = 0;
+  for (i = 0; i < 3; i++) {
+    q_cart[i] = 0;
+    for (j = 0; j < 3; j++) {
+      q_cart[i] += reciprocal_lattice[i * 3 + j] * q_red[j];
+    }
+    norm += q_cart[i] * q_cart[i];
+  }
+
+  if (sqrt(norm) < tolerance) {
+    return NULL;
+  }
+
+  denominator = 0;
+  for (i = 0; i < 3; i++) {
+    for (j = 0; j < 3; j++) {
+      denominator += q_cart[i] * dielectric[i * 3 + j] * q_cart[j];
+    }
+  }
+
+  charge_sum = (double*) malloc(sizeof(double) * num_patom * num_patom * 9);
+  get_charge_sum(charge_sum,
+                 num_patom,
+                 nac_factor / denominator / (num_satom / num_patom),
+                 q_cart,
+                 born);
+
+  return charge_sum;
+}
@@ -47,17 +47,39 @@ int get_dynamical_matrix_at_q(double *dynamical_matrix,
 			      const int *p2s_map,
 			      const double *charge_sum,
 			      const int with_openmp);
-void get_dipole_dipole(double *dd, /* [natom, 3, natom, 3, (real, imag)] */
-                       const double *K_list, /* [num_kvec, 3] */
-                       const int num_K,
+int get_dynamical_matrices_at_qpoints(double *dynamical_matrices,
+                                      const int num_qpoints,
+                                      const int num_patom,
+                                      const int num_satom,
+                                      const double *fc,
+                                      const double *qpoints,
+                                      const double *r,
+                                      const int *multi,
+                                      const double *mass,
+                                      const int *s2p_map,
+                                      const int *p2s_map);
+void get_dipole_dipole(double *dd, /* [num_q, natom, 3, natom, 3, (real, imag)] */
+                       const double *dd_q0, /* [natom, 3, 3, (real, imag)] */
+                       const double *G_list, /* [num_G, 3] */
+                       const int num_G,
+                       const double *q_cart_list, /* [num_q, 3] */
+                       const int num_q,
                        const int num_patom,
-                       const double *q_vector,
                        const double *q_direction,
                        const double *born,
                        const double *dielectric,
                        const double factor, /* 4pi/V*unit-conv */
                        const double *pos, /* [natom, 3] */
                        const double tolerance);
+void get_dipole_dipole_q0(double *dd_q0, /* [natom, 3, 3, (real, imag)] */
+                          const double *G_list, /* [num_G, 3] */
+                          const int num_G,
+                          const int num_patom,
+                          const double *born,
+                          const double *dielectric,
+                          const double factor, /* 4pi/V*unit-conv */
+                          const double *pos, /* [natom, 3] */
+                          const double tolerance);
 void get_charge_sum(double *charge_sum,
 		    const int num_patom,
 		    const double factor,
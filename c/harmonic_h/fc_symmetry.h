@@ -0,0 +1,63 @@
+/* Copyright (C) 2017 Atsushi Togo */
+/* All rights reserved. */
+
+/* This file is part of phonopy. */
+
+/* Redistribution and use in source and binary forms, with or without */
+/* modification, are permitted provided that the following conditions */
+/* are met: */
+
+/* * Redistributions of source code must retain the above copyright */
+/*   notice, this list of conditions and the following disclaimer. */
+
+/* * Redistributions in binary form must reproduce the above copyright */
+/*   notice, this list of conditions and the following disclaimer in */
+/*   the documentation and/or other materials provided with the */
+/*   distribution. */
+
+/* * Neither the name of the phonopy project nor the names of its */
+/*   contributors may be used to endorse or promote products derived */
+/*   from this software without specific prior written permission. */
+
+/* THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS */
+/* "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT */
+/* LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS */
+/* FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE */
+/* COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, */
+/* INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, */
+/* BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; */
+/* LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER */
+/* CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT */
+/* LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN */
+/* ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE */
+/* POSSIBILITY OF SUCH DAMAGE. */
+
+
+#ifndef __fc_symmetry_H__
+#define __fc_symmetry_H__
+
+/* Force constants are given as fc[num_patom][num_satom][3][3]. For */
+/* full force constants, num_patom == num_satom, p2s_map and */
+/* s2pp_map are identities, and one identity translation is given. */
+/* Element (i, j) of full force constants is found at */
+/* fc[s2pp_map[i]][inv_trans_perms[nsym_list[i]][j]]. */
+void fcs_perm_trans_symmetrize_fc(double *fc,
+                                  const int *p2s_map,
+                                  const int *s2pp_map,
+                                  const int *nsym_list,
+                                  const int *inv_trans_perms,
+                                  const int num_patom,
+                                  const int num_satom,
+                                  const int iteration);
+void fcs_set_tensor_symmetry(double *fc,
+                             const int *p2s_map,
+                             const int *s2pp_map,
+                             const int *nsym_list,
+                             const int *inv_trans_perms,
+                             const double *r_carts,
+                             const int *permutations,
+                             const int num_rot,
+                             const int num_patom,
+                             const int num_satom);
+
+#endif
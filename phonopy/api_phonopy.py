@@ -41,12 +41,17 @@ from phonopy.structure.cells import get_supercell, get_primitive
 from phonopy.harmonic.displacement import (get_least_displacements,
                                            direction_to_displacement)
 from phonopy.harmonic.force_constants import (get_fc2,
+                                              get_sparse_fc2,
                                               symmetrize_force_constants,
                                               rotational_invariance,
                                               cutoff_force_constants,
                                               set_tensor_symmetry)
 from phonopy.harmonic.dynamical_matrix import (DynamicalMatrix,
-                                               DynamicalMatrixNAC)
+                                               DynamicalMatrixNAC,
+                                               DynamicalMatrixSparse)
+from phonopy.harmonic.sparse_force_constants import SparseForceConstants
+from phonopy.harmonic.incremental_force_constants import (
+    IncrementalForceConstants)
 from phonopy.phonon.band_structure import BandStructure
 from phonopy.phonon.thermal_properties import ThermalProperties
 from phonopy.phonon.mesh import Mesh, IterMesh
@@ -124,6 +129,9 @@ class Phonopy(object):
         # set_force_constants or set_forces
         self._force_constants = None
         self._force_constants_decimals = force_constants_decimals
+        self._sparse_force_constants = None
+        self._incremental_fc = None
+        self._incremental_fc_mode = None
 
         # set_dynamical_matrix
         self._dynamical_matrix = None
@@ -219,9 +227,21 @@ class Phonopy(object):
             return self._supercells_with_displacements
 
     def get_force_constants(self):
+        """Dense force constants
+
+        When only sparse force constants are held, the compact force
+        constants of shape (num_patom, num_satom, 3, 3) are built from
+        them at each call.
+        """
+        if (self._force_constants is None and
+            self._sparse_force_constants is not None):
+            return self._sparse_force_constants.get_compact_force_constants()
         return self._force_constants
     force_constants = property(get_force_constants)
 
+    def get_sparse_force_constants(self):
+        return self._sparse_force_constants
+
     def get_rotational_condition_of_fc(self):
         return rotational_invariance(self._force_constants,
                                      self._supercell,
@@ -269,7 +289,12 @@ class Phonopy(object):
                'direction': displacement direction with respect to axes
                'forces': forces on atoms in supercell},
               {...}, ...]}
+           or filename of FORCE_SETS in text, HDF5, or npz format.
         """
+        if isinstance(displacement_dataset, str):
+            from phonopy.file_IO import parse_FORCE_SETS
+            displacement_dataset = parse_FORCE_SETS(
+                filename=displacement_dataset)
         self._displacement_dataset = displacement_dataset
 
         self._displacements = []
@@ -297,13 +322,47 @@ class Phonopy(object):
 
     def set_force_constants(self, force_constants):
         self._force_constants = force_constants
+        self._sparse_force_constants = None
+        self._incremental_fc = None
         self._set_dynamical_matrix()
 
-    def set_force_constants_zero_with_radius(self, cutoff_radius):
+    def set_sparse_force_constants(self, sparse_force_constants):
+        """Only SparseForceConstants are held, and dense ones are dropped
+
+        Dynamical matrices are summed only over the stored atomic pairs.
+        NAC is not supported with sparse force constants.
+        """
+        self._force_constants = None
+        self._sparse_force_constants = sparse_force_constants
+        self._incremental_fc = None
+        self._set_dynamical_matrix()
+
+    def set_force_constants_zero_with_radius(self, cutoff_radius,
+                                             is_sparse=False):
+        """
+        is_sparse: The pairs within cutoff_radius are converted to
+            SparseForceConstants, which replace the dense force
+            constants (see set_sparse_force_constants). The dense force
+            constants exist until this conversion, so the peak memory is
+            not reduced. Use produce_sparse_force_constants to avoid
+            dense force constants.
+        """
+        if is_sparse:
+            self.set_sparse_force_constants(SparseForceConstants(
+                self._force_constants,
+                self._primitive,
+                cutoff_radius=cutoff_radius))
+            return
+
+        if self._is_compact_fc():
+            atom_list = self._primitive.get_primitive_to_supercell_map()
+        else:
+            atom_list = None
         cutoff_force_constants(self._force_constants,
                                self._supercell,
                                cutoff_radius,
-                               symprec=self._symprec)
+                               symprec=self._symprec,
+                               atom_list=atom_list)
         self._set_dynamical_matrix()
 
     def set_dynamical_matrix(self):
@@ -348,7 +407,17 @@ class Phonopy(object):
     def produce_force_constants(self,
                                 forces=None,
                                 calculate_full_force_constants=True,
-                                computation_algorithm="svd"):
+                                computation_algorithm="svd",
+                                is_compact_fc=False,
+                                nprocs=None):
+        """
+        is_compact_fc: Force constants are stored only for the atoms in
+            primitive cell as the first index, i.e., the shape is
+            (num_patom, num_satom, 3, 3). This is taken as the case of
+            calculate_full_force_constants=False.
+        nprocs: Number of threads to solve force constants of
+            symmetrically independent displaced atoms in parallel.
+        """
         if forces is not None:
             self.set_forces(forces)
 
@@ -357,32 +426,131 @@ class Phonopy(object):
             if 'forces' not in disp:
                 return False
 
-        if calculate_full_force_constants:
+        if calculate_full_force_constants and not is_compact_fc:
             self._run_force_constants_from_forces(
                 decimals=self._force_constants_decimals,
-                computation_algorithm=computation_algorithm)
+                computation_algorithm=computation_algorithm,
+                nprocs=nprocs)
         else:
             p2s_map = self._primitive.get_primitive_to_supercell_map()
             self._run_force_constants_from_forces(
                 distributed_atom_list=p2s_map,
                 decimals=self._force_constants_decimals,
-                computation_algorithm=computation_algorithm)
+                computation_algorithm=computation_algorithm,
+                is_compact_fc=is_compact_fc,
+                nprocs=nprocs)
 
+        self._sparse_force_constants = None
+        self._incremental_fc = None
         self._set_dynamical_matrix()
 
         return True
 
+    def produce_sparse_force_constants(self,
+                                       cutoff_radius,
+                                       computation_algorithm="svd"):
+        """Sparse force constants of the pairs within cutoff_radius
+
+        Force constants are solved row by row of the displaced atoms and
+        only the pairs within cutoff_radius are stored in
+        SparseForceConstants without allocating dense force constants
+        (see set_sparse_force_constants).
+        """
+        # A primitive check if 'forces' key is in displacement_dataset.
+        for disp in self._displacement_dataset['first_atoms']:
+            if 'forces' not in disp:
+                return False
+
+        self.set_sparse_force_constants(get_sparse_fc2(
+            self._supercell,
+            self._primitive,
+            self._symmetry,
+            self._displacement_dataset,
+            cutoff_radius=cutoff_radius,
+            decimals=self._force_constants_decimals,
+            computation_algorithm=computation_algorithm))
+
+        return True
+
+    def update_force_constants(self,
+                               first_atoms,
+                               computation_algorithm="svd",
+                               is_compact_fc=False):
+        """Update force constants by newly computed displacements
+
+        first_atoms: List of dicts of 'number', 'displacement' and
+            'forces' in the same format as 'first_atoms' of displacement
+            dataset. These are added to those given at the previous calls,
+            and only the displaced atoms in first_atoms are solved again.
+            Rows of atoms that are not equivalent to any displaced atom
+            given so far are zero. Displacement dataset is not modified.
+        is_compact_fc: Force constants are stored in the compact shape
+            of (num_patom, num_satom, 3, 3).
+
+        computation_algorithm and is_compact_fc have to be the same as
+        those at the previous calls, otherwise RuntimeError is raised.
+        To change them, the accumulated displacements are discarded by
+        set_force_constants or produce_force_constants beforehand.
+
+        Returns True when all rows of force constants are obtained.
+        """
+        if self._incremental_fc is None:
+            if is_compact_fc:
+                atom_list = self._primitive.get_primitive_to_supercell_map()
+            else:
+                atom_list = None
+            self._incremental_fc = IncrementalForceConstants(
+                self._supercell,
+                self._symmetry,
+                atom_list=atom_list,
+                computation_algorithm=computation_algorithm)
+            self._incremental_fc_mode = (is_compact_fc, computation_algorithm)
+        elif self._incremental_fc_mode != (is_compact_fc,
+                                           computation_algorithm):
+            raise RuntimeError(
+                "is_compact_fc=%s and computation_algorithm=%s differ from "
+                "those of the displacements given so far (%s, %s)." %
+                ((is_compact_fc, computation_algorithm) +
+                 self._incremental_fc_mode))
+        self._incremental_fc.add_displacements(first_atoms)
+        self._incremental_fc.run()
+
+        # Copied not to modify the rows kept in IncrementalForceConstants
+        force_constants = self._incremental_fc.get_force_constants()
+        if self._force_constants_decimals:
+            self._force_constants = force_constants.round(
+                decimals=self._force_constants_decimals)
+        else:
+            self._force_constants = force_constants.copy()
+        self._sparse_force_constants = None
+        self._set_dynamical_matrix()
+
+        return self._incremental_fc.is_complete()
+
     def symmetrize_force_constants(self, iteration=3):
-        symmetrize_force_constants(self._force_constants, iteration)
+        if self._is_compact_fc():
+            from phonopy.harmonic.force_constants import (
+                symmetrize_compact_force_constants)
+            symmetrize_compact_force_constants(self._force_constants,
+                                               self._supercell,
+                                               self._primitive,
+                                               iteration=iteration,
+                                               symprec=self._symprec)
+        else:
+            symmetrize_force_constants(self._force_constants, iteration)
         self._set_dynamical_matrix()
 
     def symmetrize_force_constants_by_space_group(self):
-        from phonopy.harmonic.force_constants import (set_tensor_symmetry,
-                                                      set_tensor_symmetry_PJ)
+        from phonopy.harmonic.force_constants import set_tensor_symmetry_PJ
+        if self._is_compact_fc():
+            primitive = self._primitive
+        else:
+            primitive = None
         set_tensor_symmetry_PJ(self._force_constants,
                                self._supercell.get_cell().T,
                                self._supercell.get_scaled_positions(),
-                               self._symmetry)
+                               self._symmetry,
+                               primitive=primitive)
 
         self._set_dynamical_matrix()
 
@@ -463,7 +631,8 @@ class Phonopy(object):
             is_eigenvectors=is_eigenvectors,
             is_band_connection=is_band_connection,
             group_velocity=self._group_velocity,
-            factor=self._factor)
+            factor=self._factor,
+            use_lapack_solver=self._use_lapack_solver)
         return True
 
     def get_band_structure(self):
@@ -516,7 +685,8 @@ class Phonopy(object):
                  is_mesh_symmetry=True,
                  is_eigenvectors=False,
                  is_gamma_center=False,
-                 run_immediately=True):
+                 run_immediately=True,
+                 nprocs=None):
         if self._dynamical_matrix is None:
             print("Warning: Dynamical matrix has not yet built.")
             self._mesh = None
@@ -533,7 +703,8 @@ class Phonopy(object):
             group_velocity=self._group_velocity,
             rotations=self._primitive_symmetry.get_pointgroup_operations(),
             factor=self._factor,
-            use_lapack_solver=self._use_lapack_solver)
+            use_lapack_solver=self._use_lapack_solver,
+            nprocs=nprocs)
         if run_immediately:
             self._mesh.run()
         return True
@@ -555,8 +726,9 @@ class Phonopy(object):
                     self._mesh.get_ir_grid_points(),
                     self._mesh.get_grid_mapping_table())
 
-    def write_hdf5_mesh(self):
-        self._mesh.write_hdf5()
+    def write_hdf5_mesh(self, compression=None, compression_opts=None):
+        self._mesh.write_hdf5(compression=compression,
+                              compression_opts=compression_opts)
 
     def write_yaml_mesh(self):
         self._mesh.write_yaml()
@@ -658,7 +830,16 @@ class Phonopy(object):
                       freq_min=None,
                       freq_max=None,
                       freq_pitch=None,
-                      tetrahedron_method=False):
+                      tetrahedron_method=False,
+                      adaptive_tolerance=None,
+                      method=None,
+                      bin_width=None):
+        """
+        adaptive_tolerance: Frequency points are refined where DOS varies
+            quickly. See Dos.set_draw_area.
+        method, bin_width: With method='histogram', DOS by smearing
+            method is computed on a histogram of bin_width. See Dos.
+        """
 
         if self._mesh is None:
             print("Warning: \'set_mesh\' has to finish correctly "
@@ -668,8 +849,13 @@ class Phonopy(object):
 
         total_dos = TotalDos(self._mesh,
                              sigma=sigma,
-                             tetrahedron_method=tetrahedron_method)
-        total_dos.set_draw_area(freq_min, freq_max, freq_pitch)
+                             tetrahedron_method=tetrahedron_method,
+                             method=method,
+                             bin_width=bin_width)
+        total_dos.set_draw_area(freq_min,
+                                freq_max,
+                                freq_pitch,
+                                adaptive_tolerance=adaptive_tolerance)
         total_dos.run()
         self._total_dos = total_dos
         return True
@@ -718,7 +904,16 @@ class Phonopy(object):
                         freq_pitch=None,
                         tetrahedron_method=False,
                         direction=None,
-                        xyz_projection=False):
+                        xyz_projection=False,
+                        adaptive_tolerance=None,
+                        method=None,
+                        bin_width=None):
+        """
+        adaptive_tolerance: Frequency points are refined where DOS varies
+            quickly. See Dos.set_draw_area.
+        method, bin_width: With method='histogram', DOS by smearing
+            method is computed on a histogram of bin_width. See Dos.
+        """
         self._pdos = None
 
         if self._mesh is None:
@@ -744,8 +939,13 @@ class Phonopy(object):
                                 sigma=sigma,
                                 tetrahedron_method=tetrahedron_method,
                                 direction=direction_cart,
-                                xyz_projection=xyz_projection)
-        self._pdos.set_draw_area(freq_min, freq_max, freq_pitch)
+                                xyz_projection=xyz_projection,
+                                method=method,
+                                bin_width=bin_width)
+        self._pdos.set_draw_area(freq_min,
+                                 freq_max,
+                                 freq_pitch,
+                                 adaptive_tolerance=adaptive_tolerance)
         self._pdos.run()
         return True
 
@@ -1030,7 +1230,8 @@ class Phonopy(object):
             is_eigenvectors=is_eigenvectors,
             group_velocity=self._group_velocity,
             write_dynamical_matrices=write_dynamical_matrices,
-            factor=self._factor)
+            factor=self._factor,
+            use_lapack_solver=self._use_lapack_solver)
         return True
 
     def get_qpoints_phonon(self):
@@ -1195,6 +1396,8 @@ class Phonopy(object):
             factor=self._factor,
             symprec=self._symprec,
             degeneracy_tolerance=degeneracy_tolerance,
+            symmetry=(self._primitive_symmetry if self._is_symmetry
+                      else None),
             log_level=self._log_level)
 
         return self._irreps.run()
@@ -1269,7 +1472,9 @@ class Phonopy(object):
     def _run_force_constants_from_forces(self,
                                          distributed_atom_list=None,
                                          decimals=None,
-                                         computation_algorithm="svd"):
+                                         computation_algorithm="svd",
+                                         is_compact_fc=False,
+                                         nprocs=None):
         if self._displacement_dataset is not None:
             self._force_constants = get_fc2(
                 self._supercell,
@@ -1277,7 +1482,14 @@ class Phonopy(object):
                 self._displacement_dataset,
                 atom_list=distributed_atom_list,
                 decimals=decimals,
-                computation_algorithm=computation_algorithm)
+                computation_algorithm=computation_algorithm,
+                is_compact_fc=is_compact_fc,
+                nprocs=nprocs)
+
+    def _is_compact_fc(self):
+        return (self._force_constants is not None and
+                self._force_constants.shape[0] !=
+                self._force_constants.shape[1])
 
     def _set_dynamical_matrix(self):
         self._dynamical_matrix = None
@@ -1285,12 +1497,24 @@ class Phonopy(object):
         if (self._supercell is None or self._primitive is None):
             print("Bug: Supercell or primitive is not created.")
             return False
-        elif self._force_constants is None:
+        elif (self._force_constants is None and
+              self._sparse_force_constants is None):
             print("Warning: Force constants are not prepared.")
             return False
         elif self._primitive.get_masses() is None:
             print("Warning: Atomic masses are not correctly set.")
             return False
+        elif self._sparse_force_constants is not None:
+            if self._nac_params is not None:
+                raise RuntimeError("NAC is not supported for sparse force "
+                                   "constants.")
+            self._dynamical_matrix = DynamicalMatrixSparse(
+                self._supercell,
+                self._primitive,
+                self._sparse_force_constants,
+                decimals=self._dynamical_matrix_decimals,
+                symprec=self._symprec)
+            return True
         else:
             if self._nac_params is None:
                 self._dynamical_matrix = DynamicalMatrix(
@@ -276,7 +276,7 @@ def get_parser():
         help="Delta-q distance used for group velocity calculation")
     parser.add_argument(
         "--hdf5", dest="is_hdf5", action="store_true",
-        help="Use hdf5 for force constants")
+        help="Use hdf5 for force constants, force sets and displacements")
     parser.add_argument(
         "--irreps", "--irreps-qpoint", dest="irreps_qpoint",
         help="A q-point where characters of irreps are calculated")
@@ -34,6 +34,7 @@
 
 import sys
 import os
+from array import array
 try:
     from StringIO import StringIO
 except ImportError:
@@ -44,64 +45,193 @@ import numpy as np
 # FORCE_SETS
 #
 def write_FORCE_SETS(dataset, filename='FORCE_SETS'):
+    """Write displacement dataset with forces
+
+    The format is chosen by the extension of filename, HDF5 for
+    '.hdf5' or '.h5', numpy's npz for '.npz', and text otherwise.
+
+    """
+    ext = os.path.splitext(filename)[1].lower()
+    if ext in ('.hdf5', '.h5'):
+        write_force_sets_to_hdf5(dataset, filename=filename)
+    elif ext == '.npz':
+        write_force_sets_to_npz(dataset, filename=filename)
+    else:
+        _write_FORCE_SETS_text(dataset, filename)
+
+def _write_FORCE_SETS_text(dataset, filename):
+    from phonopy.phonon.yaml_format import FixedWidthFormatter
+
     num_atom = dataset['natom']
-    displacements = dataset['first_atoms']
-    forces = [x['forces'] for x in dataset['first_atoms']]
+    atom_indices, displacements, forces = _get_force_sets_arrays(dataset)
+    formatter = FixedWidthFormatter(
+        "\n%-5d\n%20.16f %20.16f %20.16f\n" +
+        "%15.10f %15.10f %15.10f\n" * num_atom)
 
     # Write FORCE_SETS
     with open(filename, 'w') as fp:
         fp.write("%-5d\n" % num_atom)
         fp.write("%-5d\n" % len(displacements))
-        for count, disp in enumerate(displacements):
-            fp.write("\n%-5d\n" % (disp['number'] + 1))
-            fp.write("%20.16f %20.16f %20.16f\n" % (tuple(disp['displacement'])))
+        size = max(1, 2 ** 22 // formatter.get_length())
+        for i in range(0, len(displacements), size):
+            fp.write(formatter.format_joined(np.hstack((
+                atom_indices[i:(i + size), None] + 1,
+                displacements[i:(i + size)],
+                forces[i:(i + size)].reshape(-1, num_atom * 3)))))
+
+def write_force_sets_to_hdf5(dataset,
+                             filename='force_sets.hdf5',
+                             compression=None):
+    """Write displacement dataset with forces in HDF5
+
+    The dataset is stored as arrays of 'atom_indices' (zero-based),
+    'displacements', and 'forces' with the number of atoms in supercell
+    as 'natom'. 'directions' is also stored if the dataset has them.
+
+    """
+    import h5py
+    with h5py.File(filename, 'w') as w:
+        for key, value in _get_force_sets_items(dataset):
+            if key == 'forces':
+                w.create_dataset(key, data=value, compression=compression)
+            else:
+                w.create_dataset(key, data=value)
+
+def write_force_sets_to_npz(dataset, filename='force_sets.npz'):
+    """Write displacement dataset with forces in numpy's npz format
+
+    The stored arrays are the same as write_force_sets_to_hdf5.
 
-            for f in forces[count]:
-                fp.write("%15.10f %15.10f %15.10f\n" % (tuple(f)))
+    """
+    with open(filename, 'wb') as w:
+        np.savez(w, **dict(_get_force_sets_items(dataset)))
 
 def parse_FORCE_SETS(is_translational_invariance=False, filename="FORCE_SETS"):
-    with open(filename, 'r') as f:
-        return _get_set_of_forces(f, is_translational_invariance)
+    """Read displacement dataset with forces
+
+    The format, text, HDF5 or npz, is detected from the content of the
+    file.
+
+    """
+    file_format = get_force_sets_format(filename)
+    if file_format == 'hdf5':
+        return read_force_sets_hdf5(
+            filename=filename,
+            is_translational_invariance=is_translational_invariance)
+    elif file_format == 'npz':
+        return read_force_sets_npz(
+            filename=filename,
+            is_translational_invariance=is_translational_invariance)
+    else:
+        with open(filename, 'r') as f:
+            return _get_set_of_forces(f, is_translational_invariance)
 
 def parse_FORCE_SETS_from_strings(strings, is_translational_invariance=False):
     return _get_set_of_forces(StringIO(strings),
                               is_translational_invariance)
 
-def _get_set_of_forces(f, is_translational_invariance):
-    set_of_forces = []
-    num_atom = int(_get_line_ignore_blank(f))
-    num_displacements = int(_get_line_ignore_blank(f))
-
-    for i in range(num_displacements):
-        line = _get_line_ignore_blank(f)
-        atom_number = int(line)
-        line = _get_line_ignore_blank(f).split()
-        displacement = np.array([float(x) for x in line])
-        forces_tmp = []
-        for j in range(num_atom):
-            line = _get_line_ignore_blank(f).split()
-            forces_tmp.append(np.array([float(x) for x in line]))
-        forces_tmp = np.array(forces_tmp, dtype='double')
+def get_force_sets_format(filename):
+    """Return 'hdf5', 'npz', or 'text' by the signature of file"""
+    with open(filename, 'rb') as f:
+        signature = f.read(8)
+    if signature == b'\x89HDF\r\n\x1a\n':
+        return 'hdf5'
+    elif signature[:4] == b'PK\x03\x04':
+        return 'npz'
+    else:
+        return 'text'
 
+def read_force_sets_hdf5(filename='force_sets.hdf5',
+                         is_translational_invariance=False):
+    import h5py
+    with h5py.File(filename, 'r') as f:
+        arrays = dict([(key, f[key][()]) for key in f.keys()])
+    return _get_force_sets_dataset(arrays, is_translational_invariance)
+
+def read_force_sets_npz(filename='force_sets.npz',
+                        is_translational_invariance=False):
+    with np.load(filename) as f:
+        arrays = dict([(key, f[key]) for key in f.files])
+    return _get_force_sets_dataset(arrays, is_translational_invariance)
+
+def _get_force_sets_arrays(dataset):
+    first_atoms = dataset['first_atoms']
+    atom_indices = np.array([x['number'] for x in first_atoms], dtype='intc')
+    displacements = np.array([x['displacement'] for x in first_atoms],
+                             dtype='double').reshape(-1, 3)
+    if first_atoms and 'forces' in first_atoms[0]:
+        forces = np.array([x['forces'] for x in first_atoms],
+                          dtype='double').reshape(-1, dataset['natom'], 3)
+    else:
+        forces = None
+    return atom_indices, displacements, forces
+
+def _get_force_sets_items(dataset):
+    atom_indices, displacements, forces = _get_force_sets_arrays(dataset)
+    items = [('natom', np.array(dataset['natom'], dtype='intc')),
+             ('atom_indices', atom_indices),
+             ('displacements', displacements)]
+    first_atoms = dataset['first_atoms']
+    if first_atoms and 'direction' in first_atoms[0]:
+        items.append(('directions',
+                      np.array([x['direction'] for x in first_atoms],
+                               dtype='intc')))
+    if forces is not None:
+        items.append(('forces', forces))
+    return items
+
+def _get_force_sets_dataset(arrays, is_translational_invariance):
+    forces = arrays.get('forces')
+    if forces is not None:
+        forces = np.array(forces, dtype='double', order='C')
         if is_translational_invariance:
-            forces_tmp -= np.sum(forces_tmp, axis=0) / len(forces_tmp)
+            forces -= forces.mean(axis=1)[:, None, :]
+    first_atoms = []
+    for i, (atom_index, displacement) in enumerate(
+            zip(arrays['atom_indices'], arrays['displacements'])):
+        disp = {'number': int(atom_index),
+                'displacement': np.array(displacement, dtype='double')}
+        if 'directions' in arrays:
+            disp['direction'] = arrays['directions'][i].tolist()
+        if forces is not None:
+            disp['forces'] = forces[i]
+        first_atoms.append(disp)
+    return {'natom': int(arrays['natom']), 'first_atoms': first_atoms}
 
-        forces = {'number': atom_number - 1,
-                  'displacement': displacement,
-                  'forces': forces_tmp}
-        set_of_forces.append(forces)
+def _get_set_of_forces(f, is_translational_invariance):
+    try:
+        values = np.array(f.read().split(), dtype='double')
+    except ValueError:
+        raise RuntimeError("FORCE_SETS contains a value that is not a "
+                           "number.")
+    if len(values) < 2:
+        raise RuntimeError("Numbers of atoms and displacements are not found "
+                           "in FORCE_SETS.")
+    num_atom = int(values[0])
+    num_displacements = int(values[1])
+
+    # Each set: atom number, displacement, and forces on all atoms
+    block_size = 4 + num_atom * 3
+    if len(values) != 2 + block_size * num_displacements:
+        raise RuntimeError("FORCE_SETS does not contain %d sets of forces on "
+                           "%d atoms." % (num_displacements, num_atom))
+    blocks = values[2:].reshape(num_displacements, block_size)
+    forces = np.array(blocks[:, 4:].reshape(-1, num_atom, 3),
+                      dtype='double', order='C')
+    if is_translational_invariance:
+        forces -= forces.sum(axis=1)[:, None, :] / num_atom
+
+    set_of_forces = []
+    for i in range(num_displacements):
+        set_of_forces.append({'number': int(blocks[i, 0]) - 1,
+                              'displacement': blocks[i, 1:4].copy(),
+                              'forces': forces[i]})
 
     dataset = {'natom': num_atom,
                'first_atoms': set_of_forces}
 
     return dataset
 
-def _get_line_ignore_blank(f):
-    line = f.readline().strip()
-    if line == '':
-        line = _get_line_ignore_blank(f)
-    return line
-
 def collect_forces(f, num_atom, hook, force_pos, word=None):
     for line in f:
         if hook in line:
@@ -158,40 +288,90 @@ def iter_collect_forces(filename,
 # FORCE_CONSTANTS, force_constants.hdf5
 #
 def write_FORCE_CONSTANTS(force_constants, filename='FORCE_CONSTANTS'):
+    from phonopy.phonon.yaml_format import FixedWidthFormatter
+
+    fc_shape = force_constants.shape
+    if fc_shape[0] != fc_shape[1]:
+        raise RuntimeError("Compact force constants can not be written in "
+                           "%s. Use force_constants.hdf5." % filename)
+    formatter = FixedWidthFormatter("%4d%4d\n" + ("%22.15f" * 3 + "\n") * 3)
+    indices = np.arange(1, fc_shape[1] + 1, dtype='double')[:, None]
     with open(filename, 'w') as w:
-        fc_shape = force_constants.shape
         w.write("%4d\n" % (fc_shape[0]))
         for i in range(fc_shape[0]):
-            for j in range(fc_shape[1]):
-                w.write("%4d%4d\n" % (i+1, j+1))
-                for vec in force_constants[i][j]:
-                    w.write(("%22.15f"*3 + "\n") % tuple(vec))
+            w.write(formatter.format_joined(np.hstack((
+                np.full_like(indices, i + 1),
+                indices,
+                np.reshape(force_constants[i], (fc_shape[1], 9))))))
 
 def write_force_constants_to_hdf5(force_constants,
-                                  filename='force_constants.hdf5'):
+                                  filename='force_constants.hdf5',
+                                  p2s_map=None):
+    """
+    p2s_map: Primitive-to-supercell map. This is stored to specify the
+        atoms of the first index of compact force constants whose shape
+        is (num_patom, num_satom, 3, 3).
+    """
     import h5py
     with h5py.File(filename, 'w') as w:
         w.create_dataset('force_constants', data=force_constants)
+        if p2s_map is not None:
+            w.create_dataset('p2s_map', data=p2s_map)
 
 def parse_FORCE_CONSTANTS(filename="FORCE_CONSTANTS"):
     with open(filename) as fcfile:
-        num = int((fcfile.readline().strip().split())[0])
-        force_constants = np.zeros((num, num, 3, 3), dtype=float)
-        for i in range(num):
-            for j in range(num):
-                fcfile.readline()
-                tensor = []
-                for k in range(3):
-                    tensor.append([float(x)
-                                   for x in fcfile.readline().strip().split()])
-                force_constants[i, j] = np.array(tensor)
-
-        return force_constants
-
-def read_force_constants_hdf5(filename="force_constants.hdf5"):
+        header = fcfile.readline().split()
+        try:
+            values = np.array(fcfile.read().split(), dtype='double')
+        except ValueError:
+            raise RuntimeError("%s contains a value that is not a number."
+                               % filename)
+
+    try:
+        num = int(header[0])
+    except (IndexError, ValueError):
+        raise RuntimeError("Number of atoms is not found in the first line "
+                           "of %s." % filename)
+
+    # Each block: indices of atom pair and 3x3 tensor
+    if len(values) != num * num * 11:
+        raise RuntimeError("%s does not contain force constants of %d atoms."
+                           % (filename, num))
+    blocks = values.reshape(num * num, 11)
+    atom_pairs = np.rint(blocks[:, :2]).astype(int) - 1
+    if ((atom_pairs[:, 0] != np.repeat(np.arange(num), num)).any() or
+        (atom_pairs[:, 1] != np.tile(np.arange(num), num)).any()):
+        raise RuntimeError("Atom pairs in %s are not in the order of "
+                           "(1, 1), (1, 2), ..." % filename)
+
+    return np.array(blocks[:, 2:].reshape(num, num, 3, 3),
+                    dtype='double', order='C')
+
+def read_force_constants_hdf5(filename="force_constants.hdf5",
+                              p2s_map=None):
+    """
+    p2s_map: When given and the file contains compact force constants,
+        it is checked to be the same as p2s_map stored in the file.
+    """
     import h5py
     with h5py.File(filename, 'r') as f:
-        return f[next(iter(f.keys()))][:]
+        if 'force_constants' in f:
+            fc = f['force_constants'][:]
+        else:
+            fc = f[next(iter(f.keys()))][:]
+        if 'p2s_map' in f:
+            p2s_map_in_file = f['p2s_map'][:]
+        else:
+            p2s_map_in_file = None
+
+    if (p2s_map is not None and
+        p2s_map_in_file is not None and
+        fc.shape[0] != fc.shape[1] and
+        (len(p2s_map) != len(p2s_map_in_file) or
+         (np.array(p2s_map) != p2s_map_in_file).any())):
+        raise RuntimeError("Primitive cell of compact force constants in "
+                           "%s is inconsistent." % filename)
+    return fc
 
 #
 # disp.yaml
@@ -393,39 +573,168 @@ def _expand_borns(borns, primitive, prim_symmetry):
         borns[i] = similarity_transformation(rot_cartesian.transpose(),
                                              borns[map_atoms[i]])
 
+#
+# band.yaml, mesh.yaml, qpoints.yaml
+#
+def parse_band_yaml(filename="band.yaml", is_eigenvectors=False):
+    """Read band.yaml written by phonopy
+
+    Returns a dict of header values (nqpoint, npath, segment_nqpoint,
+    natom, reciprocal_lattice) and arrays of 'qpoints', 'distances',
+    'frequencies', and 'group_velocities' and 'eigenvectors' when they
+    are found in the file. 'labels' is the list of labels of q-points,
+    None for q-points without label. Eigenvectors are read only when
+    is_eigenvectors=True. See _parse_phonon_yaml.
+
+    """
+    return _parse_phonon_yaml(filename, is_eigenvectors)
+
+def parse_mesh_yaml(filename="mesh.yaml", is_eigenvectors=False):
+    """Read mesh.yaml written by phonopy
+
+    Returns a dict of header values (mesh, nqpoint, natom,
+    reciprocal_lattice) and arrays of 'qpoints', 'weights',
+    'frequencies', and 'group_velocities' and 'eigenvectors' when they
+    are found in the file. Eigenvectors are read only when
+    is_eigenvectors=True. See _parse_phonon_yaml.
+
+    """
+    return _parse_phonon_yaml(filename, is_eigenvectors)
+
+def _parse_phonon_yaml(filename, is_eigenvectors):
+    """Read phonon part of band.yaml, mesh.yaml, and qpoints.yaml
+
+    Lines are read one by one in the layout written by phonopy and
+    values are stored in flat arrays of double without building the
+    object tree by a YAML parser, which consumes much time and memory
+    for large files.
+
+    Eigenvectors are returned with the shape of
+    (num_qpoints, num_band, num_band) as those given by phonopy, i.e.,
+    eigenvectors of bands are stored in columns.
+
+    """
+    header_keys = ('nqpoint', 'npath', 'segment_nqpoint', 'natom', 'mesh',
+                   'reciprocal_lattice')
+    data = {}
+    qpoints = array('d')
+    distances = array('d')
+    weights = []
+    labels = []
+    frequencies = array('d')
+    group_velocities = array('d')
+    eigenvectors = array('d')
+
+    with open(filename) as f:
+        key = None
+        for line in f:
+            if line.startswith('phonon:'):
+                break
+            if line.startswith('- '):
+                if key in data and isinstance(data[key], list):
+                    data[key].append(_parse_yaml_value(line[2:]))
+                continue
+            key, _, value = line.partition(':')
+            if key in header_keys:
+                if value.split('#')[0].strip():
+                    data[key] = _parse_yaml_value(value)
+                else:
+                    data[key] = []
+
+        for line in f:
+            # Most lines are of eigenvectors: "      - [ real, imag ]"
+            if line.startswith('      - ['):
+                if is_eigenvectors:
+                    real, imag = line[9:line.index(']')].split(',')
+                    eigenvectors.append(float(real))
+                    eigenvectors.append(float(imag))
+            elif line.startswith('    frequency:'):
+                frequencies.append(float(line[14:]))
+            elif line.startswith('    group_velocity:'):
+                group_velocities.extend(_parse_yaml_value(line[19:]))
+            elif line.startswith('- q-position:'):
+                qpoints.extend(_parse_yaml_value(line[13:]))
+                labels.append(None)
+            elif line.startswith('  distance:'):
+                distances.append(float(line[11:]))
+            elif line.startswith('  weight:'):
+                weights.append(int(line[9:]))
+            elif line.startswith('  label:'):
+                labels[-1] = _parse_yaml_value(line[8:])
+
+    num_qpoints = len(labels)
+    data['qpoints'] = np.reshape(np.frombuffer(qpoints, dtype='double'),
+                                 (num_qpoints, 3))
+    data['frequencies'] = np.reshape(
+        np.frombuffer(frequencies, dtype='double'), (num_qpoints, -1))
+    num_band = data['frequencies'].shape[1]
+    if distances:
+        data['distances'] = np.frombuffer(distances, dtype='double')
+        data['labels'] = labels
+    if weights:
+        data['weights'] = np.array(weights, dtype='intc')
+    if group_velocities:
+        data['group_velocities'] = np.reshape(
+            np.frombuffer(group_velocities, dtype='double'),
+            (num_qpoints, num_band, 3))
+    if eigenvectors:
+        eigvecs = np.reshape(np.frombuffer(eigenvectors, dtype='double'),
+                             (num_qpoints, num_band, num_band, 2))
+        data['eigenvectors'] = np.array(
+            np.swapaxes(eigvecs[..., 0] + 1j * eigvecs[..., 1], 1, 2),
+            dtype=("c%d" % (np.dtype('double').itemsize * 2)),
+            order='C')
+
+    return data
+
+def _parse_yaml_value(value):
+    """Parse a flow value of phonopy's YAML files
+
+    Number, list of numbers, or string is parsed. A comment after '#' is
+    removed unless in quotes.
+
+    """
+    value = value.strip()
+    if value.startswith("'"):
+        return value[1:value.rindex("'")].replace("''", "'")
+    if value.startswith('"'):
+        return value[1:value.rindex('"')]
+    value = value.split('#')[0].strip()
+    if value.startswith('['):
+        return [_parse_yaml_number(x)
+                for x in value.strip('[]').split(',') if x.strip()]
+    return _parse_yaml_number(value)
+
+def _parse_yaml_number(value):
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return float(value)
+        except ValueError:
+            return value.strip()
+
 #
 # e-v.dat, thermal_properties.yaml
 #
 EQUIVALENCE_TOLERANCE = 1e-5
 def read_thermal_properties_yaml(filenames, factor=1.0):
-    import yaml
-    try:
-        from yaml import CLoader as Loader
-    except ImportError:
-        from yaml import Loader
-
-    thermal_properties = []
     num_modes = []
     num_integrated_modes = []
-    for filename in filenames:
-        with open(filename) as f:
-            tp_yaml = yaml.load(f.read(), Loader=Loader)
-            thermal_properties.append(tp_yaml['thermal_properties'])
-            if 'num_modes' in tp_yaml and 'num_integrated_modes' in tp_yaml:
-                num_modes.append(tp_yaml['num_modes'])
-                num_integrated_modes.append(tp_yaml['num_integrated_modes'])
-
-    temperatures = [v['temperature'] for v in thermal_properties[0]]
     temp = []
     cv = []
     entropy = []
     fe_phonon = []
-    for i, _ in enumerate(filenames):
-        temp.append([v['temperature'] for v in thermal_properties[i]])
-        cv.append([v['heat_capacity'] for v in thermal_properties[i]])
-        entropy.append([v['entropy'] for v in thermal_properties[i]])
-        fe_phonon.append([v['free_energy'] for v in thermal_properties[i]])
-
+    for filename in filenames:
+        tp = parse_thermal_properties_yaml(filename)
+        if 'num_modes' in tp and 'num_integrated_modes' in tp:
+            num_modes.append(tp['num_modes'])
+            num_integrated_modes.append(tp['num_integrated_modes'])
+        temp.append(tp['temperature'].tolist())
+        cv.append(tp['heat_capacity'])
+        entropy.append(tp['entropy'])
+        fe_phonon.append(tp['free_energy'])
+    temperatures = temp[0]
 
     if _is_temperatures_match(temp):
         cv = np.array(cv).T * factor
@@ -444,6 +753,85 @@ def read_thermal_properties_yaml(filenames, factor=1.0):
 
     return temperatures, cv, entropy, fe_phonon, num_modes, num_integrated_modes
 
+def parse_thermal_properties_yaml(filename="thermal_properties.yaml"):
+    """Read thermal_properties.yaml written by phonopy
+
+    Lines are read one by one in the layout written by phonopy without
+    building the object tree by a YAML parser. Returns a dict of header
+    values (natom, num_modes, zero_point_energy, etc) and arrays of
+    'temperature', 'free_energy', 'entropy', 'heat_capacity', and
+    'energy'.
+
+    """
+    header_keys = ('natom', 'cutoff_frequency', 'num_modes',
+                   'num_integrated_modes', 'zero_point_energy',
+                   'high_T_entropy')
+    data = {}
+    props = {}
+    for key in ('temperature', 'free_energy', 'entropy', 'heat_capacity',
+                'energy'):
+        props[key] = []
+
+    with open(filename) as f:
+        for line in f:
+            if line.startswith('thermal_properties:'):
+                break
+            key, _, value = line.partition(':')
+            if key in header_keys:
+                data[key] = _parse_yaml_value(value)
+        for line in f:
+            if line.startswith('projected_thermal_properties:'):
+                break
+            key, _, value = line[2:].partition(':')
+            key = key.strip()
+            if key in props:
+                props[key].append(float(value))
+
+    for key in props:
+        data[key] = np.array(props[key], dtype='double')
+    return data
+
+def parse_thermal_displacements_yaml(filename="thermal_displacements.yaml"):
+    """Read thermal_displacements.yaml written by phonopy
+
+    Returns temperatures and thermal displacements with the shape of
+    (num_temperatures, num_atom * 3).
+
+    """
+    return _parse_temperature_dependent_yaml(filename, 'thermal_displacements')
+
+def parse_thermal_distances_yaml(filename="thermal_distances.yaml"):
+    """Read thermal_distances.yaml written by phonopy
+
+    Returns temperatures and thermal distances with the shape of
+    (num_temperatures, num_atom_pairs).
+
+    """
+    return _parse_temperature_dependent_yaml(filename, 'thermal_distances')
+
+def _parse_temperature_dependent_yaml(filename, name):
+    temperatures = []
+    values = array('d')
+    with open(filename) as f:
+        for line in f:
+            if line.startswith(name + ':'):
+                break
+        for line in f:
+            if line.startswith('  - '):
+                value = _parse_yaml_value(line[4:])
+                if isinstance(value, list):
+                    values.extend(value)
+                else:
+                    values.append(value)
+            elif line.startswith('- temperature:'):
+                temperatures.append(float(line[14:]))
+            elif not line.startswith(' '):
+                break
+
+    return (np.array(temperatures, dtype='double'),
+            np.reshape(np.frombuffer(values, dtype='double'),
+                       (len(temperatures), -1)))
+
 def read_cp(filename):
     return _parse_QHA_data(filename)
 
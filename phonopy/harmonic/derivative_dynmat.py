@@ -39,12 +39,17 @@ class DerivativeOfDynamicalMatrix(object):
         self._dynmat = dynamical_matrix
         (self._smallest_vectors,
          self._multiplicity) = self._dynmat.get_shortest_vectors()
-        self._force_constants = self._dynmat.get_force_constants()
+        if self._dynmat.is_sparse_fc():
+            sparse_fc = self._dynmat.get_force_constants()
+            self._force_constants = sparse_fc.get_compact_force_constants()
+        else:
+            self._force_constants = self._dynmat.get_force_constants()
         self._scell = self._dynmat.get_supercell()
         self._pcell = self._dynmat.get_primitive()
 
         self._p2s_map = self._dynmat.get_primitive_to_supercell_map()
         self._s2p_map = self._dynmat.get_supercell_to_primitive_map()
+        self._fc_s2p_map, self._fc_p2s_map = self._dynmat.get_fc_index_maps()
         self._mass = self._pcell.get_masses()
 
         self._ddm = None
@@ -102,8 +107,8 @@ class DerivativeOfDynamicalMatrix(object):
                                  vectors,
                                  multiplicity,
                                  mass,
-                                 self._s2p_map,
-                                 self._p2s_map,
+                                 self._fc_s2p_map,
+                                 self._fc_p2s_map,
                                  nac_factor,
                                  born,
                                  dielectric,
@@ -135,7 +140,7 @@ class DerivativeOfDynamicalMatrix(object):
                        dtype=("c%d" % (itemsize * 2)))
         
         for i, j in list(np.ndindex(num_patom, num_patom)):
-            s_i = self._p2s_map[i]
+            s_i = self._fc_p2s_map[i]
             s_j = self._p2s_map[j]
             mass = np.sqrt(self._mass[i] * self._mass[j])
             ddm_local = np.zeros((num_elem, 3, 3),
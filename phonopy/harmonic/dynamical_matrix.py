@@ -34,6 +34,8 @@
 
 import textwrap
 from phonopy.harmonic.dynmat_to_fc import DynmatToForceConstants
+from phonopy.harmonic.sparse_force_constants import SparseForceConstants
+from phonopy.harmonic.phase_factors import get_phase_factors
 import numpy as np
 
 def get_dynamical_matrix(fc2,
@@ -45,10 +47,22 @@ def get_dynamical_matrix(fc2,
                          symprec=1e-5):
     if frequency_scale_factor is None:
         _fc2 = fc2
+    elif isinstance(fc2, SparseForceConstants):
+        _fc2 = fc2.get_scaled(frequency_scale_factor ** 2)
     else:
         _fc2 = fc2 * frequency_scale_factor ** 2
 
-    if nac_params is None:
+    if isinstance(_fc2, SparseForceConstants):
+        if nac_params is not None:
+            raise RuntimeError("Non-analytical term correction is not "
+                               "supported for sparse force constants.")
+        dm = DynamicalMatrixSparse(
+            supercell,
+            primitive,
+            _fc2,
+            decimals=decimals,
+            symprec=symprec)
+    elif nac_params is None:
         dm = DynamicalMatrix(
             supercell,
             primitive,
@@ -80,6 +94,11 @@ class DynamicalMatrix(object):
     between atoms 1 and 2 in supercell is calculated by, e.g.,
     1j * dot((x_s(2) - x_s(1)), F^-1) * 2pi
     where x_s is reduced atomic coordinate in supercell unit.
+
+    Force constants are given either in the full shape of
+    (num_satom, num_satom, 3, 3) or in the compact shape of
+    (num_patom, num_satom, 3, 3), whose first index is that of
+    the atoms in primitive cell.
     """
 
     def __init__(self,
@@ -90,14 +109,9 @@ class DynamicalMatrix(object):
                  symprec=1e-5):
         self._scell = supercell
         self._pcell = primitive
-        self._force_constants = np.array(force_constants,
-                                         dtype='double', order='C')
         self._decimals = decimals
         self._symprec = symprec
 
-        itemsize = self._force_constants.itemsize
-        self._dtype_complex = ("c%d" % (itemsize * 2))
-
         self._p2s_map = primitive.get_primitive_to_supercell_map()
         self._s2p_map = primitive.get_supercell_to_primitive_map()
         p2p_map = primitive.get_primitive_to_primitive_map()
@@ -105,6 +119,9 @@ class DynamicalMatrix(object):
                          for i in range(len(self._s2p_map))]
         (self._smallest_vectors,
          self._multiplicity) = primitive.get_smallest_vectors()
+        self._set_force_constants(force_constants)
+        self._dynamical_matrix = None
+        self._dynamical_matrices = None
         # Non analytical term correction
         self._nac = False
 
@@ -117,6 +134,9 @@ class DynamicalMatrix(object):
     def get_decimals(self):
         return self._decimals
 
+    def get_symprec(self):
+        return self._symprec
+
     def get_supercell(self):
         return self._scell
 
@@ -135,6 +155,22 @@ class DynamicalMatrix(object):
     def get_supercell_to_primitive_map(self):
         return self._s2p_map
 
+    def is_compact_fc(self):
+        return self._force_constants.shape[0] != self._force_constants.shape[1]
+
+    def is_sparse_fc(self):
+        return False
+
+    def get_fc_index_maps(self):
+        """Maps to look up force constants elements
+
+        Returns (s2p, p2s) to be used in place of supercell-to-primitive
+        and primitive-to-supercell maps when reading force constants,
+        i.e., fc[p2s[i], j] is the element between atom i in primitive
+        cell and atom j in supercell, which belongs to the atom of s2p[j].
+        """
+        return self._fc_s2p_map, self._fc_p2s_map
+
     def get_dynamical_matrix(self):
         dm = self._dynamical_matrix
 
@@ -143,9 +179,57 @@ class DynamicalMatrix(object):
         else:
             return dm.round(decimals=self._decimals)
 
+    def get_dynamical_matrices(self):
+        dms = self._dynamical_matrices
+
+        if self._decimals is None:
+            return dms
+        else:
+            return dms.round(decimals=self._decimals)
+
     def set_dynamical_matrix(self, q):
         self._set_dynamical_matrix(q)
 
+    def set_dynamical_matrices(self, qpoints):
+        """Dynamical matrices at many q-points are computed at once
+
+        qpoints: q-points in reduced coordinates of primitive cell
+           shape=(num_qpoints, 3)
+
+        The result is obtained by get_dynamical_matrices as an array
+        with shape=(num_qpoints, num_band, num_band).
+        """
+        qpoints = np.array(np.reshape(qpoints, (-1, 3)),
+                           dtype='double', order='C')
+        try:
+            import phonopy._phonopy as phonoc
+            self._set_c_dynamical_matrices(qpoints)
+        except ImportError:
+            self._set_py_dynamical_matrices(qpoints)
+
+    def _set_force_constants(self, force_constants):
+        self._force_constants = np.array(force_constants,
+                                         dtype='double', order='C')
+        itemsize = self._force_constants.itemsize
+        self._dtype_complex = ("c%d" % (itemsize * 2))
+        self._set_fc_index_maps()
+
+    def _set_fc_index_maps(self):
+        num_patom = len(self._p2s_map)
+        num_satom = len(self._s2p_map)
+        if self._force_constants.shape[1] != num_satom:
+            raise ValueError("Force constants are inconsistent with "
+                             "supercell.")
+        if self._force_constants.shape[0] == num_satom:
+            self._fc_s2p_map = self._s2p_map
+            self._fc_p2s_map = self._p2s_map
+        elif self._force_constants.shape[0] == num_patom:
+            self._fc_s2p_map = np.array(self._p2p_map, dtype='intc')
+            self._fc_p2s_map = np.arange(num_patom, dtype='intc')
+        else:
+            raise ValueError("Force constants are inconsistent with "
+                             "primitive cell and supercell.")
+
     def _set_dynamical_matrix(self, q):
         try:
             import phonopy._phonopy as phonoc
@@ -170,10 +254,47 @@ class DynamicalMatrix(object):
                                 vectors,
                                 multiplicity,
                                 mass,
-                                self._s2p_map,
-                                self._p2s_map)
+                                self._fc_s2p_map,
+                                self._fc_p2s_map)
         self._dynamical_matrix = dm
 
+    def _set_c_dynamical_matrices(self, qpoints):
+        import phonopy._phonopy as phonoc
+
+        mass = self._pcell.get_masses()
+        size_prim = len(mass)
+        dms = np.zeros((len(qpoints), size_prim * 3, size_prim * 3),
+                       dtype=self._dtype_complex)
+        phonoc.dynamical_matrices(dms.view(dtype='double'),
+                                  self._force_constants,
+                                  qpoints,
+                                  self._smallest_vectors,
+                                  self._multiplicity,
+                                  mass,
+                                  self._fc_s2p_map,
+                                  self._fc_p2s_map)
+        self._dynamical_matrices = dms
+
+    def _set_py_dynamical_matrices(self, qpoints):
+        fc = self._force_constants
+        num_atom = len(self._p2s_map)
+        mass = self._pcell.get_masses()
+        phase_factors = get_phase_factors(self._pcell, qpoints)
+        dms = np.zeros((len(qpoints), num_atom, 3, num_atom, 3),
+                       dtype=self._dtype_complex)
+        for i, s_i in enumerate(self._fc_p2s_map):
+            for j, s_j in enumerate(self._p2s_map):
+                atoms = np.where(self._s2p_map == s_j)[0]
+                sqrt_mm = np.sqrt(mass[i] * mass[j])
+                dms[:, i, :, j, :] = np.einsum(
+                    'qk,kab->qab', phase_factors[:, atoms, i],
+                    fc[s_i, atoms]) / sqrt_mm
+        dms = dms.reshape(len(qpoints), num_atom * 3, num_atom * 3)
+
+        # Impose Hermisian condition
+        self._dynamical_matrices = (
+            dms + dms.conj().transpose(0, 2, 1)) / 2
+
     def _set_py_dynamical_matrix(self, q):
         fc = self._force_constants
         vecs = self._smallest_vectors
@@ -182,7 +303,7 @@ class DynamicalMatrix(object):
         dm = np.zeros((3 * num_atom, 3 * num_atom), dtype=self._dtype_complex)
         mass = self._pcell.get_masses()
 
-        for i, s_i in enumerate(self._p2s_map):
+        for i, s_i in enumerate(self._fc_p2s_map):
             for j, s_j in enumerate(self._p2s_map):
                 sqrt_mm = np.sqrt(mass[i] * mass[j])
                 dm_local = np.zeros((3, 3), dtype=self._dtype_complex)
@@ -202,6 +323,114 @@ class DynamicalMatrix(object):
         # Impose Hermisian condition
         self._dynamical_matrix = (dm + dm.conj().transpose()) / 2
 
+class DynamicalMatrixSparse(DynamicalMatrix):
+    """Dynamical matrix built from SparseForceConstants
+
+    Dynamical matrices are summed only over the atomic pairs stored in
+    SparseForceConstants. get_force_constants returns the
+    SparseForceConstants instance and the force constants are looked up
+    as compact force constants by get_fc_index_maps.
+    """
+
+    def __init__(self,
+                 supercell,
+                 primitive,
+                 force_constants,
+                 decimals=None,
+                 symprec=1e-5):
+        self._pair_blocks = None
+        self._pair_block_indices = None
+        self._pair_fc = None
+        self._pair_vectors = None
+        self._pair_weights = None
+        DynamicalMatrix.__init__(self,
+                                 supercell,
+                                 primitive,
+                                 force_constants,
+                                 decimals=decimals,
+                                 symprec=symprec)
+
+    def is_compact_fc(self):
+        return True
+
+    def is_sparse_fc(self):
+        return True
+
+    def set_dynamical_matrices(self, qpoints, max_chunk_elements=2 ** 22):
+        """Dynamical matrices at many q-points
+
+        Phase factors of the pairs are computed for a chunk of q-points
+        at once. The number of q-points in a chunk is chosen so that
+        the temporary arrays of pairs times q-points have about
+        max_chunk_elements elements.
+        """
+        qpoints = np.array(np.reshape(qpoints, (-1, 3)),
+                           dtype='double', order='C')
+        num_band = len(self._p2s_map) * 3
+        dms = np.zeros((len(qpoints), num_band, num_band),
+                       dtype=self._dtype_complex)
+        num_pairs = max(1, len(self._pair_fc))
+        size = max(1, max_chunk_elements //
+                   (num_pairs * max(9, self._pair_vectors.shape[1])))
+        for i in range(0, len(qpoints), size):
+            dms[i:(i + size)] = self._get_dynamical_matrices(
+                qpoints[i:(i + size)])
+        self._dynamical_matrices = dms
+
+    def _set_force_constants(self, force_constants):
+        if not isinstance(force_constants, SparseForceConstants):
+            raise TypeError("SparseForceConstants is required.")
+        self._force_constants = force_constants
+        self._dtype_complex = ("c%d" % (np.dtype('double').itemsize * 2))
+        num_patom = len(self._p2s_map)
+        self._fc_s2p_map = np.array(self._p2p_map, dtype='intc')
+        self._fc_p2s_map = np.arange(num_patom, dtype='intc')
+
+        # Pairs are sorted by (i, s2pp[j]), so that each block of
+        # dynamical matrix is summed over a contiguous range of pairs.
+        p_atoms, s_atoms = force_constants.get_pairs()
+        blocks = p_atoms * num_patom + self._fc_s2p_map[s_atoms]
+        self._pair_block_indices = np.nonzero(
+            np.r_[True, blocks[1:] != blocks[:-1]])[0]
+        self._pair_blocks = blocks[self._pair_block_indices]
+
+        mass = self._pcell.get_masses()
+        sqrt_mm = np.sqrt(mass[p_atoms] * mass[self._fc_s2p_map[s_atoms]])
+        self._pair_fc = force_constants.get_force_constants() / (
+            sqrt_mm[:, None, None])
+
+        multi = self._multiplicity[s_atoms, p_atoms]
+        max_multi = multi.max() if len(multi) > 0 else 1
+        self._pair_vectors = self._smallest_vectors[
+            s_atoms, p_atoms, :max_multi]
+        self._pair_weights = (
+            np.arange(max_multi)[None, :] < multi[:, None]) / (
+                multi[:, None].astype('double'))
+
+    def _set_dynamical_matrix(self, q):
+        self._dynamical_matrix = self._get_dynamical_matrices(
+            np.reshape(q, (1, 3)))[0]
+
+    def _get_dynamical_matrices(self, qpoints):
+        num_patom = len(self._p2s_map)
+        dms = np.zeros((len(qpoints), num_patom * num_patom, 3, 3),
+                       dtype=self._dtype_complex)
+        if len(self._pair_fc) > 0:
+            # shape=(num_qpoints, num_pairs)
+            phase_factors = np.einsum(
+                'pmq,pm->qp',
+                np.exp(2j * np.pi * np.dot(self._pair_vectors, qpoints.T)),
+                self._pair_weights)
+            dms[:, self._pair_blocks] = np.add.reduceat(
+                self._pair_fc * phase_factors[:, :, None, None],
+                self._pair_block_indices,
+                axis=1)
+        dms = dms.reshape(len(qpoints), num_patom, num_patom, 3, 3).transpose(
+            0, 1, 3, 2, 4).reshape(len(qpoints), num_patom * 3, num_patom * 3)
+
+        # Impose Hermisian condition
+        return (dms + dms.conj().transpose(0, 2, 1)) / 2
+
 # Non analytical term correction (NAC)
 # Call this when NAC is required instead of DynamicalMatrix
 class DynamicalMatrixNAC(DynamicalMatrix):
@@ -223,7 +452,7 @@ class DynamicalMatrixNAC(DynamicalMatrix):
 
         # For method == 'gonze'
         self._Gonze_force_constants = None
-        self._G_vec_list = None
+        self._dd_q0 = None
         self._G_cutoff = None
 
         self._nac = True
@@ -239,6 +468,9 @@ class DynamicalMatrixNAC(DynamicalMatrix):
     def get_dielectric_constant(self):
         return self._dielectric
 
+    def get_nac_method(self):
+        return self._method
+
     def set_nac_params(self, nac_params):
         self._born = np.array(nac_params['born'], dtype='double', order='C')
         self._unit_conversion = nac_params['factor']
@@ -256,15 +488,11 @@ class DynamicalMatrixNAC(DynamicalMatrix):
                 self._G_cutoff = nac_params['G_cutoff']
             else:
                 self._G_cutoff = 4
-            rec_lat = np.linalg.inv(self._pcell.get_cell()) # column vectors
-            G_vec_list = self._get_G_list(rec_lat)
-            G_norm = np.sqrt(((G_vec_list) ** 2).sum(axis=1))
-            self._G_list = G_vec_list[G_norm < self._G_cutoff]
+            self._G_list = self._get_G_list(self._G_cutoff)
             print("G-cutoff distance: %f, number of G-points: %d" %
                   (self._G_cutoff, len(self._G_list)))
-            print(self._G_list)
+            self._set_Gonze_dipole_dipole_q0()
             self._set_Gonze_force_constants()
-            self._Gonze_count = 0
 
     def set_dynamical_matrix(self, q_red, q_direction=None):
         rec_lat = np.linalg.inv(self._pcell.get_cell()) # column vectors
@@ -283,6 +511,41 @@ class DynamicalMatrixNAC(DynamicalMatrix):
         else:
             self._set_Gonze_dynamical_matrix(q_red, q_direction)
 
+    def set_dynamical_matrices(self, qpoints, q_direction=None):
+        """Dynamical matrices with NAC at many q-points
+
+        NAC depends on each q-point. With Gonze method, dynamical
+        matrices and dipole-dipole terms at the q-points other than
+        Gamma point are computed at once, otherwise one by one.
+        q_direction is used only at Gamma point.
+        """
+        qpoints = np.array(np.reshape(qpoints, (-1, 3)),
+                           dtype='double', order='C')
+        num_band = self._pcell.get_number_of_atoms() * 3
+        dms = np.zeros((len(qpoints), num_band, num_band),
+                       dtype=self._dtype_complex)
+        if self._method == 'gonze':
+            rec_lat = np.linalg.inv(self._pcell.get_cell()) # column vectors
+            q_norms = np.linalg.norm(np.dot(qpoints, rec_lat.T), axis=1)
+            is_gamma = (q_norms < self._symprec)
+            if q_direction is not None:
+                is_gamma |= (np.abs(qpoints) < 1e-5).all(axis=1)
+            if (~is_gamma).any():
+                dms[~is_gamma] = self._get_Gonze_dynamical_matrices(
+                    qpoints[~is_gamma])
+            q_indices = np.where(is_gamma)[0]
+        else:
+            q_indices = range(len(qpoints))
+
+        for i in q_indices:
+            q = qpoints[i]
+            if q_direction is not None and (np.abs(q) < 1e-5).all():
+                self.set_dynamical_matrix(q, q_direction=q_direction)
+            else:
+                self.set_dynamical_matrix(q)
+            dms[i] = self._dynamical_matrix
+        self._dynamical_matrices = dms
+
     def _set_Wang_dynamical_matrix(self, q_red, q_direction):
         # Wang method (J. Phys.: Condens. Matter 22 (2010) 202201)
         rec_lat = np.linalg.inv(self._pcell.get_cell()) # column vectors
@@ -323,8 +586,8 @@ class DynamicalMatrixNAC(DynamicalMatrix):
                                     vectors,
                                     multiplicity,
                                     mass,
-                                    self._s2p_map,
-                                    self._p2s_map,
+                                    self._fc_s2p_map,
+                                    self._fc_p2s_map,
                                     np.array(q, dtype='double'),
                                     self._born,
                                     factor)
@@ -333,49 +596,47 @@ class DynamicalMatrixNAC(DynamicalMatrix):
     def _set_py_Wang_force_constants(self, fc, nac_q):
         N = (self._scell.get_number_of_atoms() //
              self._pcell.get_number_of_atoms())
-        for s1 in range(self._scell.get_number_of_atoms()):
-            # This if-statement is the trick.
-            # In contructing dynamical matrix in phonopy
-            # fc of left indices with s1 == self._s2p_map[ s1 ] are
-            # only used.
-            if s1 != self._s2p_map[s1]:
-                continue
-            p1 = self._p2p_map[s1]
+        # In contructing dynamical matrix in phonopy, only fc of left
+        # indices of atoms in primitive cell are used.
+        for p1, s1 in enumerate(self._fc_p2s_map):
             for s2 in range(self._scell.get_number_of_atoms()):
                 p2 = self._p2p_map[s2]
                 fc[s1, s2] += nac_q[p1, p2] / N
 
     def _set_Gonze_dynamical_matrix(self, q_red, q_direction):
-        print("%d %s" % (self._Gonze_count + 1, q_red))
-        self._Gonze_count += 1
         self._force_constants = self._Gonze_force_constants
         self._set_dynamical_matrix(q_red)
         dm_dd = self._get_Gonze_dipole_dipole(q_red, q_direction)
-        self._dynamical_matrix += dm_dd
+        self._dynamical_matrix += dm_dd[0]
+
+    def _get_Gonze_dynamical_matrices(self, qpoints):
+        self._force_constants = self._Gonze_force_constants
+        DynamicalMatrix.set_dynamical_matrices(self, qpoints)
+        return (self._dynamical_matrices +
+                self._get_Gonze_dipole_dipole(qpoints, None))
 
     def _set_Gonze_force_constants(self):
         d2f = DynmatToForceConstants(self._pcell,
                                      self._scell,
+                                     is_full_fc=(not self.is_compact_fc()),
                                      symprec=self._symprec)
+        commensurate_points = d2f.get_commensurate_points()
         self._force_constants = self._bare_force_constants
-        dynmat = []
-        num_q = len(d2f.get_commensurate_points())
-        for i, q_red in enumerate(d2f.get_commensurate_points()):
-            print("%d/%d %s" % (i + 1, num_q, q_red))
-            self._set_dynamical_matrix(q_red)
-            dm_dd = self._get_Gonze_dipole_dipole(q_red, None)
-            self._dynamical_matrix -= dm_dd
-            dynmat.append(self._dynamical_matrix)
+        DynamicalMatrix.set_dynamical_matrices(self, commensurate_points)
+        dynmat = (self._dynamical_matrices -
+                  self._get_Gonze_dipole_dipole(commensurate_points, None))
         d2f.set_dynamical_matrices(dynmat=dynmat)
         d2f.run()
         self._Gonze_force_constants = d2f.get_force_constants()
 
-    def _get_Gonze_dipole_dipole(self, q_red, q_direction):
+    def _get_Gonze_dipole_dipole(self, qpoints, q_direction):
+        """Dipole-dipole terms of dynamical matrices at q-points
+
+        Returns shape=(num_qpoints, num_band, num_band)
+        """
         rec_lat = np.linalg.inv(self._pcell.get_cell()) # column vectors
-        q = np.dot(q_red, rec_lat.T)
-        # K_norm = np.sqrt(((self._G_vec_list + q) ** 2).sum(axis=1))
-        # K_list = self._G_vec_list[K_norm < self._G_cutoff] + q
-        K_list = self._G_list + q
+        q_carts = np.array(np.dot(np.reshape(qpoints, (-1, 3)), rec_lat.T),
+                           dtype='double', order='C')
         if q_direction is None:
             q_dir_cart = None
         else:
@@ -384,36 +645,46 @@ class DynamicalMatrixNAC(DynamicalMatrix):
 
         try:
             import phonopy._phonopy as phonoc
-            C = self._get_c_dipole_dipole(K_list, q, q_dir_cart)
+            C = self._get_c_dipole_dipole(q_carts, q_dir_cart)
         except ImportError:
-            C = self._get_py_dipole_dipole(K_list, q, q_dir_cart)
+            C = self._get_py_dipole_dipole(q_carts, q_dir_cart)
 
         mass = self._pcell.get_masses()
         num_atom = self._pcell.get_number_of_atoms()
         pos = self._pcell.get_positions()
-        for i in range(num_atom):
-            dpos = pos - pos[i]
-            phase_factor = np.exp(2j * np.pi * np.dot(dpos, q))
-            # phase_factor = np.ones(len(dpos))
-            for j in range(num_atom):
-                C[i, :, j, :] *= phase_factor[j] / np.sqrt(mass[i] * mass[j])
+        # exp(2pi i (pos_j - pos_i).q) / sqrt(m_i m_j)
+        dpos = pos[None, :, :] - pos[:, None, :]
+        phase_factors = np.exp(2j * np.pi * np.dot(dpos, q_carts.T))
+        C *= (np.transpose(phase_factors, (2, 0, 1)) /
+              np.sqrt(np.outer(mass, mass)))[:, :, None, :, None]
 
-        C_dd = C.reshape(num_atom * 3, num_atom * 3)
+        return C.reshape(len(q_carts), num_atom * 3, num_atom * 3)
 
-        return C_dd
+    def _set_Gonze_dipole_dipole_q0(self):
+        """q-independent part of dipole-dipole term
 
-    def _get_c_dipole_dipole(self, K_list, q, q_dir_cart):
+        This is subtracted from the diagonal blocks of the dipole-dipole
+        term at every q-point, so computed once.
+        """
+        try:
+            import phonopy._phonopy as phonoc
+            self._dd_q0 = self._get_c_dipole_dipole_q0()
+        except ImportError:
+            self._dd_q0 = self._get_py_dipole_dipole_q0()
+
+    def _get_c_dipole_dipole(self, q_carts, q_dir_cart):
         import phonopy._phonopy as phonoc
 
         pos = self._pcell.get_positions()
         num_atom = self._pcell.get_number_of_atoms()
         volume = self._pcell.get_volume()
-        C = np.zeros((num_atom, 3, num_atom, 3),
+        C = np.zeros((len(q_carts), num_atom, 3, num_atom, 3),
                      dtype=self._dtype_complex, order='C')
 
         phonoc.dipole_dipole(C.view(dtype='double'),
-                             np.array(K_list, dtype='double', order='C'),
-                             q,
+                             self._dd_q0.view(dtype='double'),
+                             self._G_list,
+                             q_carts,
                              q_dir_cart,
                              self._born,
                              self._dielectric,
@@ -422,61 +693,83 @@ class DynamicalMatrixNAC(DynamicalMatrix):
                              self._symprec)
         return C
 
-    def _get_py_dipole_dipole(self, K_list, q, q_dir_cart):
+    def _get_c_dipole_dipole_q0(self):
+        import phonopy._phonopy as phonoc
+
         pos = self._pcell.get_positions()
         num_atom = self._pcell.get_number_of_atoms()
         volume = self._pcell.get_volume()
-        C = np.zeros((num_atom, 3, num_atom, 3),
+        dd_q0 = np.zeros((num_atom, 3, 3), dtype=self._dtype_complex,
+                         order='C')
+
+        phonoc.dipole_dipole_q0(dd_q0.view(dtype='double'),
+                                self._G_list,
+                                self._born,
+                                self._dielectric,
+                                np.array(pos, dtype='double', order='C'),
+                                self._unit_conversion * 4.0 * np.pi / volume,
+                                self._symprec)
+        return dd_q0
+
+    def _get_py_dipole_dipole(self, q_carts, q_dir_cart):
+        num_atom = self._pcell.get_number_of_atoms()
+        C = np.zeros((len(q_carts), num_atom, 3, num_atom, 3),
                      dtype=self._dtype_complex, order='C')
-
-        for q_K in K_list:
-            if np.linalg.norm(q_K) < self._symprec:
-                if q_dir_cart is None:
-                    continue
-                else:
-                    dq_K = q_dir_cart
+        for i, q in enumerate(q_carts):
+            K_list = self._G_list + q
+            q_K = K_list.copy()
+            is_zero = np.linalg.norm(K_list, axis=1) < self._symprec
+            if q_dir_cart is None:
+                K_list = K_list[~is_zero]
+                q_K = q_K[~is_zero]
             else:
-                dq_K = q_K
-
-            Z_mat = (self._get_charge_sum(num_atom, dq_K, self._born) *
-                     self._get_constant_factor(dq_K,
-                                               self._dielectric,
-                                               volume,
-                                               self._unit_conversion))
-            for i in range(num_atom):
-                dpos = - pos + pos[i]
-                phase_factor = np.exp(2j * np.pi * np.dot(dpos, q_K))
-                for j in range(num_atom):
-                    C[i, :,  j, :] += Z_mat[i, j] * phase_factor[j]
-
-        for q_K in K_list:
-            q_G = q_K - q
-            if np.linalg.norm(q_G) < self._symprec:
-                continue
-            Z_mat = (self._get_charge_sum(num_atom, q_G, self._born) *
-                     self._get_constant_factor(q_G,
-                                               self._dielectric,
-                                               volume,
-                                               self._unit_conversion))
-            for i in range(num_atom):
-                C_i = np.zeros((3, 3), dtype=self._dtype_complex, order='C')
-                dpos = - pos + pos[i]
-                phase_factor = np.exp(2j * np.pi * np.dot(dpos, q_G))
-                for j in range(num_atom):
-                    C_i += Z_mat[i, j] * phase_factor[j]
-                C[i, :,  i, :] -= C_i
-
+                q_K[is_zero] = q_dir_cart
+            # pb[K, i, a] = (q_K.Z_i)_a exp(2pi i pos_i.K)
+            pb = self._get_py_phase_born(q_K, K_list)
+            C[i] = np.einsum('k,kia,kjb->iajb',
+                             self._get_py_dielectric_factors(q_K),
+                             pb, pb.conj())
+            for j in range(num_atom):
+                C[i, j, :, j, :] -= self._dd_q0[j]
         return C
 
-    def _get_G_list(self, rec_lat, g_rad=100):
-        # g_rad must be greater than 0 for broadcasting.
-        n = g_rad * 2 + 1
-        G = np.zeros((n ** 3, 3), dtype='double', order='C')
-        pts = np.arange(-g_rad, g_rad + 1)
-        grid = np.meshgrid(pts, pts, pts)
-        for i in range(3):
-            G[:, i] = grid[i].ravel()
-        return np.dot(G, rec_lat.T)
+    def _get_py_dipole_dipole_q0(self):
+        G_list = self._G_list[
+            np.linalg.norm(self._G_list, axis=1) >= self._symprec]
+        pb = self._get_py_phase_born(G_list, G_list)
+        return np.einsum('k,kia,kb->iab',
+                         self._get_py_dielectric_factors(G_list),
+                         pb, pb.conj().sum(axis=1))
+
+    def _get_py_phase_born(self, q_born_vectors, q_phase_vectors):
+        pos = self._pcell.get_positions()
+        q_born = np.einsum('kx,ixa->kia', q_born_vectors, self._born)
+        phase = np.exp(2j * np.pi * np.dot(q_phase_vectors, pos.T))
+        return q_born * phase[:, :, None]
+
+    def _get_py_dielectric_factors(self, q_vectors):
+        volume = self._pcell.get_volume()
+        return (self._unit_conversion * 4.0 * np.pi / volume /
+                np.einsum('kx,xy,ky->k', q_vectors, self._dielectric,
+                          q_vectors))
+
+    def _get_G_list(self, G_cutoff, g_rad=100):
+        """G-vectors in Cartesian coordinates whose norms < G_cutoff
+
+        Since |n_i| = |G.a_i| <= |G||a_i|, the integer grid of each axis
+        is limited by G_cutoff |a_i| up to g_rad.
+        """
+        lattice = self._pcell.get_cell()
+        rec_lat = np.linalg.inv(lattice) # column vectors
+        n_max = np.minimum(
+            np.ceil(G_cutoff * np.linalg.norm(lattice, axis=1)).astype(int),
+            g_rad)
+        grid = np.meshgrid(*[np.arange(-n, n + 1) for n in n_max])
+        G = np.array([grid[i].ravel() for i in range(3)], dtype='double').T
+        G_vec_list = np.dot(G, rec_lat.T)
+        G_norm = np.sqrt(((G_vec_list) ** 2).sum(axis=1))
+        return np.array(G_vec_list[G_norm < G_cutoff],
+                        dtype='double', order='C')
 
     def _get_charge_sum(self, num_atom, q, born):
         nac_q = np.zeros((num_atom, num_atom, 3, 3), dtype='double', order='C')
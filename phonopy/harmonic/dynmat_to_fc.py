@@ -36,7 +36,8 @@ import numpy as np
 from phonopy.structure.atoms import PhonopyAtoms as Atoms
 from phonopy.structure.symmetry import Symmetry
 from phonopy.structure.cells import get_supercell
-from phonopy.harmonic.force_constants import distribute_force_constants
+from phonopy.harmonic.force_constants import _get_fc_compact_maps
+from phonopy.harmonic.phase_factors import get_phase_factors
 
 def get_commensurate_points(supercell_matrix): # wrt primitive cell
     rec_primitive = Atoms(numbers=[1],
@@ -53,17 +54,25 @@ class DynmatToForceConstants(object):
                  supercell,
                  frequencies=None,
                  eigenvectors=None,
+                 is_full_fc=True,
                  symprec=1e-5):
+        """
+        is_full_fc: With False, force constants are returned in the compact
+            shape of (num_patom, num_satom, 3, 3).
+        """
         self._primitive = primitive
         self._supercell = supercell
         supercell_matrix = np.linalg.inv(self._primitive.get_primitive_matrix())
         supercell_matrix = np.rint(supercell_matrix).astype('intc')
         self._commensurate_points = get_commensurate_points(supercell_matrix)
-        (self._shortest_vectors,
-         self._multiplicity) = primitive.get_smallest_vectors()
         self._dynmat = None
-        n = self._supercell.get_number_of_atoms()
-        self._force_constants = np.zeros((n, n, 3, 3),
+        self._is_full_fc = is_full_fc
+        n_s = self._supercell.get_number_of_atoms()
+        if is_full_fc:
+            n_p = n_s
+        else:
+            n_p = self._primitive.get_number_of_atoms()
+        self._force_constants = np.zeros((n_p, n_s, 3, 3),
                                          dtype='double', order='C')
         itemsize = self._force_constants.itemsize
         self._dtype_complex = ("c%d" % (itemsize * 2))
@@ -73,7 +82,6 @@ class DynmatToForceConstants(object):
 
     def run(self):
         self._inverse_transformation()
-        self._distribute_force_constants()
 
     def get_force_constants(self):
         return self._force_constants
@@ -89,59 +97,56 @@ class DynmatToForceConstants(object):
                                eigenvectors_at_qpoints=None,
                                dynmat=None):
         if dynmat is None:
-            dm = []
-            for frequencies, eigvecs in zip(frequencies_at_qpoints,
-                                            eigenvectors_at_qpoints):
-                eigvals = frequencies ** 2 * np.sign(frequencies)
-                dm.append(
-                    np.dot(np.dot(eigvecs, np.diag(eigvals)), eigvecs.T.conj()))
+            frequencies = np.array(frequencies_at_qpoints, dtype='double')
+            eigvecs = np.array(eigenvectors_at_qpoints,
+                               dtype=self._dtype_complex)
+            eigvals = frequencies ** 2 * np.sign(frequencies)
+            dm = np.matmul(eigvecs * eigvals[:, None, :],
+                           eigvecs.conj().transpose(0, 2, 1))
         else:
             dm = dynmat
 
         self._dynmat = np.array(dm, dtype=self._dtype_complex, order='C')
 
     def _inverse_transformation(self):
+        """Force constants from dynamical matrices at commensurate points
+
+        fc[i, j] = sqrt(m_i m_j) / N sum_q D_ij(q) exp(-2pi i q.r_ij)
+        where the sum over q is a contraction with the phase factor table
+        for the atoms j belonging to each atom in primitive cell.
+        """
         s2p = self._primitive.get_supercell_to_primitive_map()
-        p2s = self._primitive.get_primitive_to_supercell_map()
         p2p = self._primitive.get_primitive_to_primitive_map()
+        s2pp = np.array([p2p[i] for i in s2p], dtype='intc')
 
-        fc = self._force_constants
         m = self._primitive.get_masses()
-        N = (self._supercell.get_number_of_atoms() /
-             self._primitive.get_number_of_atoms())
+        num_patom = self._primitive.get_number_of_atoms()
+        N = self._supercell.get_number_of_atoms() / num_patom
+        num_qpoints = len(self._commensurate_points)
+        dynmat = self._dynmat.reshape(num_qpoints, num_patom, 3, num_patom, 3)
+        # exp(-2pi i q.r)
+        phase_factors = get_phase_factors(self._primitive,
+                                          self._commensurate_points).conj()
 
-        for p_i, s_i in enumerate(p2s):
-            for s_j, p_j in enumerate([p2p[i] for i in s2p]):
-                coef = np.sqrt(m[p_i] * m[p_j]) / N
-                fc[s_i, s_j] = self._sum_q(p_i, s_j, p_j) * coef
+        fc = np.zeros((num_patom, len(s2pp), 3, 3), dtype='double')
+        for p_j in range(num_patom):
+            atoms = np.where(s2pp == p_j)[0]
+            sum_q = np.einsum('qsp,qpab->psab',
+                              phase_factors[:, atoms, :],
+                              dynmat[:, :, :, p_j, :])
+            coef = np.sqrt(m * m[p_j]) / N
+            fc[:, atoms] = sum_q.real * coef[:, None, None, None]
 
-    def _distribute_force_constants(self):
-        s2p = self._primitive.get_supercell_to_primitive_map()
-        p2s = self._primitive.get_primitive_to_supercell_map()
-        positions = self._supercell.get_scaled_positions()
-        lattice = self._supercell.get_cell().T
-        diff = positions - positions[p2s[0]]
-        trans = np.array(diff[np.where(s2p == p2s[0])[0]],
-                         dtype='double', order='C')
-        rotations = np.array([np.eye(3, dtype='intc')] * len(trans),
-                             dtype='intc', order='C')
-        distribute_force_constants(self._force_constants,
-                                   range(self._supercell.get_number_of_atoms()),
-                                   p2s,
-                                   lattice,
-                                   positions,
-                                   rotations,
-                                   trans,
-                                   1e-5)
-
-    def _sum_q(self, p_i, s_j, p_j):
-        multi = self._multiplicity[s_j, p_i]
-        pos = self._shortest_vectors[s_j, p_i, :multi]
-        sum_q = np.zeros((3, 3), dtype=self._dtype_complex, order='C')
-        phases = -2j * np.pi * np.dot(self._commensurate_points, pos.T)
-        phase_factors = np.exp(phases).sum(axis=1) / multi
-        for i, coef in enumerate(phase_factors):
-            sum_q += self._dynmat[i,
-                                  (p_i * 3):(p_i * 3 + 3),
-                                  (p_j * 3):(p_j * 3 + 3)] * coef
-        return sum_q.real
+        if self._is_full_fc:
+            self._force_constants[:] = self._distribute_force_constants(fc)
+        else:
+            self._force_constants[:] = fc
+
+    def _distribute_force_constants(self, fc):
+        """Full force constants from compact ones by pure translations"""
+        _, s2pp, nsym_list, inv_trans_perms = _get_fc_compact_maps(
+            self._supercell.get_cell().T,
+            self._supercell.get_scaled_positions(),
+            self._primitive,
+            1e-5)
+        return fc[s2pp[:, None], inv_trans_perms[nsym_list]]
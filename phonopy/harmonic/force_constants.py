@@ -58,7 +58,9 @@ def get_fc2(supercell,
             dataset,
             atom_list=None,
             decimals=None,
-            computation_algorithm="svd"):
+            computation_algorithm="svd",
+            is_compact_fc=False,
+            nprocs=None):
     """
     Bare force_constants is returned.
 
@@ -72,11 +74,32 @@ def get_fc2(supercell,
       i: Atom index of finitely displaced atom.
       j: Atom index at which force on the atom is measured.
       a, b: Cartesian direction indices = (0, 1, 2) for i and j, respectively
+
+    With is_compact_fc=True, only the rows of the atoms in atom_list
+    are stored, i.e., the shape is (len(atom_list), num_atom, 3, 3).
+    Typically atom_list is the primitive-to-supercell map, which gives
+    the compact force constants used in DynamicalMatrix.
+
+    With nprocs > 1, symmetrically independent displaced atoms are
+    solved in parallel by nprocs threads.
     """
 
-    force_constants = np.zeros((supercell.get_number_of_atoms(),
-                                supercell.get_number_of_atoms(),
-                                3, 3), dtype='double')
+    num_atom = supercell.get_number_of_atoms()
+    if is_compact_fc:
+        if atom_list is None:
+            atom_list = np.arange(num_atom)
+        force_constants = _get_compact_fc2(supercell,
+                                           symmetry,
+                                           dataset,
+                                           atom_list,
+                                           computation_algorithm,
+                                           nprocs=nprocs)
+        if decimals:
+            return force_constants.round(decimals=decimals)
+        else:
+            return force_constants
+
+    force_constants = np.zeros((num_atom, num_atom, 3, 3), dtype='double')
 
     # Fill force_constants[ displaced_atoms, all_atoms_in_supercell ]
     atom_list_done = _get_force_constants_disps(
@@ -84,7 +107,8 @@ def get_fc2(supercell,
         supercell,
         dataset,
         symmetry,
-        computation_algorithm=computation_algorithm)
+        computation_algorithm=computation_algorithm,
+        nprocs=nprocs)
 
     # Distribute non-equivalent force constants to those equivalent
     symprec = symmetry.get_symmetry_tolerance()
@@ -92,16 +116,18 @@ def get_fc2(supercell,
     trans = symmetry.get_symmetry_operations()['translations']
     positions = supercell.get_scaled_positions()
     lattice = np.array(supercell.get_cell().T, dtype='double', order='C')
+    permutations = symmetry.get_atom_permutations()
 
     if atom_list is None:
         distribute_force_constants(force_constants,
-                                   range(supercell.get_number_of_atoms()),
+                                   range(num_atom),
                                    atom_list_done,
                                    lattice,
                                    positions,
                                    rotations,
                                    trans,
-                                   symprec)
+                                   symprec,
+                                   permutations=permutations)
     else:
         distribute_force_constants(force_constants,
                                    atom_list,
@@ -110,36 +136,155 @@ def get_fc2(supercell,
                                    positions,
                                    rotations,
                                    trans,
-                                   symprec)
+                                   symprec,
+                                   permutations=permutations)
 
     if decimals:
         return force_constants.round(decimals=decimals)
     else:
         return force_constants
 
+def get_sparse_fc2(supercell,
+                   primitive,
+                   symmetry,
+                   dataset,
+                   cutoff_radius=None,
+                   decimals=None,
+                   computation_algorithm="svd"):
+    """Force constants of the pairs within cutoff_radius
+
+    The rows of the displaced atoms are solved one by one, and only the
+    elements of the atoms within cutoff_radius are kept and rotated into
+    the rows of the atoms in primitive cell. Therefore no dense force
+    constants are allocated, and the memory is that of the pairs plus
+    one row of (num_atom, 3, 3).
+
+    Returns SparseForceConstants.
+    """
+    from phonopy.harmonic.sparse_force_constants import SparseForceConstants
+
+    num_atom = supercell.get_number_of_atoms()
+    symprec = symmetry.get_symmetry_tolerance()
+    p2s_map = primitive.get_primitive_to_supercell_map()
+    rotations = symmetry.get_symmetry_operations()['rotations']
+    lattice = np.array(supercell.get_cell().T, dtype='double', order='C')
+    permutations = symmetry.get_atom_permutations()
+    inv_permutations = symmetry.get_atom_permutations(is_inverse=True)
+    reduced_bases = get_reduced_bases(supercell.get_cell(), tolerance=symprec)
+    positions = np.dot(supercell.get_positions(),
+                       np.linalg.inv(reduced_bases))
+
+    disp_atom_list = np.unique([x['number'] for x in dataset['first_atoms']])
+    map_atoms, map_syms = _get_sym_mappings_from_permutations(
+        permutations[:, p2s_map], disp_atom_list)
+
+    # Rows of the displaced atoms reduced to the atoms within cutoff_radius
+    rows = {}
+    for atom in np.unique(map_atoms):
+        first_atoms = [x for x in dataset['first_atoms']
+                       if x['number'] == atom]
+        fc_row = np.zeros((1, num_atom, 3, 3), dtype='double')
+        _get_force_constants_disps(fc_row,
+                                   supercell,
+                                   {'natom': num_atom,
+                                    'first_atoms': first_atoms},
+                                   symmetry,
+                                   atom_list=[atom],
+                                   computation_algorithm=computation_algorithm)
+        if cutoff_radius is None:
+            atoms = np.arange(num_atom)
+        else:
+            distances = _get_shortest_distances_in_PBC(positions[atom],
+                                                       positions,
+                                                       reduced_bases)
+            atoms = np.where(distances <= cutoff_radius + symprec)[0]
+        rows[atom] = (atoms, fc_row[0, atoms])
+
+    p_atoms = []
+    s_atoms = []
+    fc_pairs = []
+    for i, (map_atom, map_sym) in enumerate(zip(map_atoms, map_syms)):
+        atoms, fc_disp = rows[map_atom]
+        r_cart = similarity_transformation(lattice, rotations[map_sym])
+        p_atoms.append(np.full(len(atoms), i, dtype='intc'))
+        s_atoms.append(inv_permutations[map_sym, atoms])
+        # P' = R^-1 P R
+        fc_pairs.append(np.matmul(np.matmul(r_cart.T, fc_disp), r_cart))
+
+    fc_pairs = np.concatenate(fc_pairs)
+    if decimals:
+        fc_pairs = fc_pairs.round(decimals=decimals)
+    return SparseForceConstants(fc_pairs,
+                                primitive,
+                                cutoff_radius=cutoff_radius,
+                                pairs=(np.concatenate(p_atoms),
+                                       np.concatenate(s_atoms)))
+
 def cutoff_force_constants(force_constants,
                            supercell,
                            cutoff_radius,
-                           symprec=1e-5):
+                           symprec=1e-5,
+                           atom_list=None):
+    """
+    atom_list: Atom indices in supercell of the rows of force_constants.
+        This has to be given for compact force constants.
+    """
     num_atom = supercell.get_number_of_atoms()
+    if atom_list is None:
+        atom_list = range(num_atom)
     reduced_bases = get_reduced_bases(supercell.get_cell(), tolerance=symprec)
     positions = np.dot(supercell.get_positions(),
                        np.linalg.inv(reduced_bases))
-    for i in range(num_atom):
-        pos_i = positions[i]
-        for j in range(num_atom):
-            pos_j = positions[j]
-            min_distance = _get_shortest_distance_in_PBC(pos_i,
-                                                         pos_j,
-                                                         reduced_bases)
-            if min_distance > cutoff_radius:
-                force_constants[i, j] = 0.0
+    for i_fc, i in enumerate(atom_list):
+        min_distances = _get_shortest_distances_in_PBC(positions[i],
+                                                       positions,
+                                                       reduced_bases)
+        force_constants[i_fc, min_distances > cutoff_radius] = 0.0
 
 
 def symmetrize_force_constants(force_constants, iteration=3):
-    for i in range(iteration):
-        set_permutation_symmetry(force_constants)
-        set_translational_invariance(force_constants)
+    """Index permutation and translational symmetries are imposed in place
+
+    This gives the same result as iterating set_permutation_symmetry and
+    set_translational_invariance.
+    """
+    p2s_map, s2pp_map, nsym_list, inv_trans_perms = _get_fc_full_maps(
+        force_constants.shape[1])
+    fc = _get_c_double_array(force_constants)
+    import phonopy._phonopy as phonoc
+    phonoc.perm_trans_symmetrize_fc(fc,
+                                    p2s_map,
+                                    s2pp_map,
+                                    nsym_list,
+                                    inv_trans_perms,
+                                    iteration)
+    if fc is not force_constants:
+        force_constants[:] = fc
+
+def symmetrize_compact_force_constants(force_constants,
+                                       supercell,
+                                       primitive,
+                                       iteration=3,
+                                       symprec=1e-5):
+    """symmetrize_force_constants for compact force constants
+
+    force_constants: shape=(num_patom, num_satom, 3, 3)
+    """
+    p2s_map, s2pp_map, nsym_list, inv_trans_perms = _get_fc_compact_maps(
+        supercell.get_cell().T,
+        supercell.get_scaled_positions(),
+        primitive,
+        symprec)
+    fc = _get_c_double_array(force_constants)
+    import phonopy._phonopy as phonoc
+    phonoc.perm_trans_symmetrize_fc(fc,
+                                    p2s_map,
+                                    s2pp_map,
+                                    nsym_list,
+                                    inv_trans_perms,
+                                    iteration)
+    if fc is not force_constants:
+        force_constants[:] = fc
 
 def distribute_force_constants(force_constants,
                                atom_list,
@@ -148,13 +293,19 @@ def distribute_force_constants(force_constants,
                                positions, # scaled (fractional)
                                rotations, # scaled (fractional)
                                trans, # scaled (fractional)
-                               symprec):
+                               symprec,
+                               permutations=None):
+    """
+    permutations: Atom permutations by the symmetry operations as
+        returned by Symmetry.get_atom_permutations. Computed if None.
+    """
     if True:
-        permutations = _compute_all_sg_permutations(positions,
-                                                    rotations,
-                                                    trans,
-                                                    lattice,
-                                                    symprec)
+        if permutations is None:
+            permutations = _compute_all_sg_permutations(positions,
+                                                        rotations,
+                                                        trans,
+                                                        lattice,
+                                                        symprec)
 
         map_atoms, map_syms = _get_sym_mappings_from_permutations(
             permutations, atom_list_done)
@@ -221,25 +372,42 @@ def solve_force_constants(force_constants,
                           supercell,
                           site_symmetry,
                           symprec,
-                          computation_algorithm="svd"):
+                          computation_algorithm="svd",
+                          atom_list=None,
+                          rot_map_syms=None):
+    """
+    atom_list: Atom indices in supercell of the first index of
+        force_constants. None means force_constants is the full array.
+    rot_map_syms: Atom permutations by site_symmetry as returned by
+        get_positions_sent_by_rot_inv. Computed if None.
+    """
+    if atom_list is None:
+        fc_index = disp_atom_number
+    else:
+        fc_index = list(atom_list).index(disp_atom_number)
+
     if computation_algorithm == "regression":
         fc_info = _solve_force_constants_regression(
             force_constants,
+            fc_index,
             disp_atom_number,
             displacements,
             sets_of_forces,
             supercell,
             site_symmetry,
-            symprec)
+            symprec,
+            rot_map_syms=rot_map_syms)
         return fc_info
     else:
         _solve_force_constants_svd(force_constants,
+                                   fc_index,
                                    disp_atom_number,
                                    displacements,
                                    sets_of_forces,
                                    supercell,
                                    site_symmetry,
-                                   symprec)
+                                   symprec,
+                                   rot_map_syms=rot_map_syms)
         return None
 
 def get_positions_sent_by_rot_inv(lattice, # column vectors
@@ -334,11 +502,7 @@ def set_tensor_symmetry(force_constants,
     cart_rot = np.array([similarity_transformation(lattice, rot)
                          for rot in rotations])
 
-    mapa = _get_atom_indices_by_symmetry(lattice,
-                                         positions,
-                                         rotations,
-                                         translations,
-                                         symprec)
+    mapa = symmetry.get_atom_permutations()
     fc_new = np.zeros_like(force_constants)
     indep_atoms = symmetry.get_independent_atoms()
 
@@ -366,14 +530,16 @@ def set_tensor_symmetry(force_constants,
                                positions,
                                rotations,
                                translations,
-                               symprec)
+                               symprec,
+                               permutations=mapa)
 
     force_constants[:] = fc_new
 
 def set_tensor_symmetry_PJ(force_constants,
                            lattice,
                            positions,
-                           symmetry):
+                           symmetry,
+                           primitive=None):
     """
     Full force constants are symmetrized using crystal symmetry.
     This method extracts symmetrically equivalent sets of atomic pairs and
@@ -381,30 +547,36 @@ def set_tensor_symmetry_PJ(force_constants,
 
     Since get_force_constants_disps may include crystal symmetry, this method
     is usually meaningless.
+
+    Compact force constants, shape=(num_patom, num_satom, 3, 3), are
+    symmetrized when primitive is given.
     """
 
     rotations = symmetry.get_symmetry_operations()['rotations']
-    translations = symmetry.get_symmetry_operations()['translations']
-    symprec = symmetry.get_symmetry_tolerance()
-
-    N = len(rotations)
-
-    mapa = _get_atom_indices_by_symmetry(lattice,
-                                         positions,
-                                         rotations,
-                                         translations,
-                                         symprec)
-    cart_rot = np.array([similarity_transformation(lattice, rot).T
-                         for rot in rotations])
-    cart_rot_inv = np.array([np.linalg.inv(rot) for rot in cart_rot])
-    fcm = np.array([force_constants[mapa[n],:,:,:][:,mapa[n],:,:]
-                    for n in range(N)])
-    s = np.transpose(np.array([np.dot(cart_rot[n],
-                                      np.dot(fcm[n], cart_rot_inv[n]))
-                               for n in range(N)]), (0, 2, 3, 1, 4))
-    force_constants[:] = np.array(np.average(s, axis=0),
-                                  dtype='double',
-                                  order='C')
+    cart_rot = np.array([similarity_transformation(lattice, rot)
+                         for rot in rotations], dtype='double', order='C')
+    if primitive is None:
+        p2s_map, s2pp_map, nsym_list, inv_trans_perms = _get_fc_full_maps(
+            len(positions))
+    else:
+        p2s_map, s2pp_map, nsym_list, inv_trans_perms = _get_fc_compact_maps(
+            lattice,
+            positions,
+            primitive,
+            symmetry.get_symmetry_tolerance())
+
+    fc = _get_c_double_array(force_constants)
+    import phonopy._phonopy as phonoc
+    phonoc.set_tensor_symmetry_fc(fc,
+                                  p2s_map,
+                                  s2pp_map,
+                                  nsym_list,
+                                  inv_trans_perms,
+                                  cart_rot,
+                                  np.array(symmetry.get_atom_permutations(),
+                                           dtype='intc', order='C'))
+    if fc is not force_constants:
+        force_constants[:] = fc
 
 def set_translational_invariance(force_constants,
                                  translational_symmetry_type=1):
@@ -480,6 +652,10 @@ def rotational_invariance(force_constants,
     abc = "xyz"
 
     for pi, p in enumerate(p2s):
+        if fc.shape[0] == fc.shape[1]:
+            i_fc = p
+        else: # compact force constants
+            i_fc = pi
         for i in range(3):
             mat = np.zeros((3, 3), dtype='double')
             for s in range(supercell.get_number_of_atoms()):
@@ -488,8 +664,8 @@ def rotational_invariance(force_constants,
                 v = np.dot(vecs.sum(axis=0) / m, primitive.get_cell())
                 for j in range(3):
                     for k in range(3):
-                        mat[j, k] += (fc[p, s, i, j] * v[k] -
-                                      fc[p, s, i, k] * v[j])
+                        mat[j, k] += (fc[i_fc, s, i, j] * v[k] -
+                                      fc[i_fc, s, i, k] * v[j])
 
             print("Atom %d %s" % (p + 1, abc[i]))
             for vec in mat:
@@ -533,35 +709,27 @@ def show_drift_force_constants(force_constants, name="force constants"):
 # Local methods #
 #################
 def _solve_force_constants_svd(force_constants,
+                               fc_index,
                                disp_atom_number,
                                displacements,
                                sets_of_forces,
                                supercell,
                                site_symmetry,
-                               symprec):
-    lattice = supercell.get_cell().T
-    positions = supercell.get_scaled_positions()
-    pos_center = positions[disp_atom_number].copy()
-    positions -= pos_center
-    rot_map_syms = get_positions_sent_by_rot_inv(lattice,
-                                                 positions,
-                                                 site_symmetry,
-                                                 symprec)
-    site_sym_cart = [similarity_transformation(lattice, sym)
-                     for sym in site_symmetry]
-    rot_disps = get_rotated_displacement(displacements, site_sym_cart)
+                               symprec,
+                               rot_map_syms=None):
+    rot_disps, combined_forces = _get_rotated_displacements_and_forces(
+        disp_atom_number,
+        displacements,
+        sets_of_forces,
+        supercell,
+        site_symmetry,
+        symprec,
+        rot_map_syms=rot_map_syms)
     inv_displacements = np.linalg.pinv(rot_disps)
 
-    for i in range(supercell.get_number_of_atoms()):
-        combined_forces = []
-        for forces in sets_of_forces:
-            combined_forces.append(
-                get_rotated_forces(forces[rot_map_syms[:, i]],
-                                   site_sym_cart))
-
-        combined_forces = np.reshape(combined_forces, (-1, 3))
-        force_constants[disp_atom_number, i] = -np.dot(
-            inv_displacements, combined_forces)
+    # Solved for all atoms at once by (3, M) x (num_atom, M, 3)
+    force_constants[fc_index] = -np.matmul(inv_displacements,
+                                           combined_forces)
 
 # KL(m).
 # This is very similar, but instead of using inverse displacement
@@ -569,67 +737,102 @@ def _solve_force_constants_svd(force_constants,
 # Force is "plotted" versus displacement and the slope is
 # calculated, together with its standard deviation.
 def _solve_force_constants_regression(force_constants,
+                                      fc_index,
                                       disp_atom_number,
                                       displacements,
                                       sets_of_forces,
                                       supercell,
                                       site_symmetry,
-                                      symprec):
-    fc_errors = np.zeros((3, 3), dtype='double')
-    lattice = supercell.get_cell().T
-    positions = supercell.get_scaled_positions()
-    pos_center = positions[disp_atom_number].copy()
-    positions -= pos_center
-    rot_map_syms = get_positions_sent_by_rot_inv(lattice,
-                                                 positions,
-                                                 site_symmetry,
-                                                 symprec)
-    site_sym_cart = [similarity_transformation(lattice, sym)
-                     for sym in site_symmetry]
-    rot_disps = get_rotated_displacement(displacements, site_sym_cart)
-    inv_displacements = np.linalg.pinv(rot_disps)
-
-    for i in range(supercell.get_number_of_atoms()):
-        combined_forces = []
-        for forces in sets_of_forces:
-            combined_forces.append(
-                get_rotated_forces(forces[rot_map_syms[:, i]],
-                                   site_sym_cart))
+                                      symprec,
+                                      rot_map_syms=None):
+    rot_disps, combined_forces = _get_rotated_displacements_and_forces(
+        disp_atom_number,
+        displacements,
+        sets_of_forces,
+        supercell,
+        site_symmetry,
+        symprec,
+        rot_map_syms=rot_map_syms)
 
-        combined_forces = np.reshape(combined_forces, (-1, 3))
-        # KL(m).
-        # We measure the Fi-Xj slope (linear regression), see:
+    # KL(m).
+    # We measure the Fi-Xj slope (linear regression), see:
 # stackoverflow.com/questions/9990789/how-to-force-zero-interception-in-linear-regression
 # en.wikipedia.org/wiki/Simple_linear_regression#Linear_regression_without_the_intercept_term
 # http://courses.washington.edu/qsci483/Lectures/20.pdf
-        for x in range(3):
-            for y in range(3):
-                xLin = rot_disps.T[x]
-                yLin = combined_forces.T[y]
-                force_constants[disp_atom_number,i,x,y] = \
-                      -np.dot(xLin,yLin) / np.dot(xLin,xLin)
-                if len(xLin)<=1:
-                    # no chances for a fitting error, we have just one value
-                    err = 0
-                else:
-                    variance = np.dot(yLin,yLin)/np.dot(xLin,xLin) - \
-                                  force_constants[disp_atom_number,i,x,y]**2
-                    if variance<0 and variance>-1e-10:
-                       # in numerics, it happens. This is "numerical zero"
-                       err = 0
-                    else:
-                       err = np.sqrt(variance) / ( len(xLin)-1 )
-                fc_errors[x,y] += err
+    # xx[x] = xLin.xLin, xy[i, x, y] = xLin.yLin, yy[i, y] = yLin.yLin
+    # for all atoms i at once.
+    xx = (rot_disps ** 2).sum(axis=0)
+    xy = np.matmul(rot_disps.T, combined_forces)
+    yy = (combined_forces ** 2).sum(axis=1)
+    fc = -xy / xx[:, None]
+    force_constants[fc_index] = fc
+
+    num_points = len(rot_disps)
+    if num_points <= 1:
+        # no chances for a fitting error, we have just one value
+        return np.zeros((3, 3), dtype='double')
+
+    variance = yy[:, None, :] / xx[None, :, None] - fc ** 2
+    # in numerics, it happens. This is "numerical zero"
+    variance[(variance < 0) & (variance > -1e-10)] = 0
+    err = np.sqrt(variance) / (num_points - 1)
+
+    return err.sum(axis=0)
+
+def _get_rotated_displacements_and_forces(disp_atom_number,
+                                          displacements,
+                                          sets_of_forces,
+                                          supercell,
+                                          site_symmetry,
+                                          symprec,
+                                          rot_map_syms=None):
+    """
+    Displacements and forces are rotated by site-symmetry operations
+    of the displaced atom.
+
+    Returns
+    -------
+    rot_disps: shape=(M, 3)
+    combined_forces: shape=(num_atom, M, 3)
+        where M = len(displacements) * len(site_symmetry). Forces on all
+        atoms are rotated at once, e.g., combined_forces[i, k * n + s] is
+        R_s F_k[j] where atom j is sent to atom i by R_s.
+    """
+    lattice = supercell.get_cell().T
+    if rot_map_syms is None:
+        positions = supercell.get_scaled_positions()
+        positions -= positions[disp_atom_number]
+        rot_map_syms = get_positions_sent_by_rot_inv(lattice,
+                                                     positions,
+                                                     site_symmetry,
+                                                     symprec)
+    site_sym_cart = np.array([similarity_transformation(lattice, sym)
+                              for sym in site_symmetry],
+                             dtype='double', order='C')
+    rot_disps = get_rotated_displacement(displacements, site_sym_cart)
+
+    # forces[k, s, i, :] = F_k[rot_map_syms[s, i]]
+    forces = np.array(sets_of_forces, dtype='double')[:, rot_map_syms]
+    # (k, s, i, 3) x (s, 3, 3) -> (k, s, i, 3) -> (i, k, s, 3)
+    rot_forces = np.matmul(forces, site_sym_cart.transpose(0, 2, 1))
+    combined_forces = np.reshape(rot_forces.transpose(2, 0, 1, 3),
+                                 (supercell.get_number_of_atoms(), -1, 3))
 
-    return fc_errors
+    return rot_disps, combined_forces
 
 def _get_force_constants_disps(force_constants,
                                supercell,
                                dataset,
                                symmetry,
-                               computation_algorithm="svd"):
+                               atom_list=None,
+                               computation_algorithm="svd",
+                               nprocs=None):
     """
     Phi = -F / d
+
+    atom_list: Atom indices in supercell of the first index of
+        force_constants. None means force_constants is the full array.
+    nprocs: Number of threads to solve displaced atoms in parallel.
     """
 
     """
@@ -649,28 +852,45 @@ def _get_force_constants_disps(force_constants,
     """
     symprec = symmetry.get_symmetry_tolerance()
     disp_atom_list = np.unique([x['number'] for x in dataset['first_atoms']])
-    for disp_atom_number in disp_atom_list:
-        disps = []
-        sets_of_forces = []
-
-        for x in dataset['first_atoms']:
-            if x['number'] != disp_atom_number:
-                continue
-            disps.append(x['displacement'])
-            sets_of_forces.append(x['forces'])
-
-        site_symmetry = symmetry.get_site_symmetry(disp_atom_number)
-
-        fc_info = solve_force_constants(
+    disps = dict([(i, []) for i in disp_atom_list])
+    sets_of_forces = dict([(i, []) for i in disp_atom_list])
+    for x in dataset['first_atoms']:
+        disps[x['number']].append(x['displacement'])
+        sets_of_forces[x['number']].append(x['forces'])
+
+    def solve(disp_atom_number):
+        site_symmetry, rot_map_syms = _get_site_symmetry_permutations(
+            symmetry, disp_atom_number)
+        return solve_force_constants(
             force_constants,
             disp_atom_number,
-            disps,
-            sets_of_forces,
+            disps[disp_atom_number],
+            sets_of_forces[disp_atom_number],
             supercell,
             site_symmetry,
             symprec,
-            computation_algorithm=computation_algorithm)
+            computation_algorithm=computation_algorithm,
+            atom_list=atom_list,
+            rot_map_syms=rot_map_syms)
+
+    # Permutation table is computed here once, not in threads.
+    symmetry.get_atom_permutations()
+
+    # Rows of different displaced atoms are independent. Threads are
+    # used because the work is done in numpy, which releases the GIL,
+    # and force_constants is shared without copy.
+    if nprocs is not None and nprocs > 1 and len(disp_atom_list) > 1:
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(processes=min(nprocs, len(disp_atom_list)))
+        try:
+            fc_infos = pool.map(solve, disp_atom_list)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        fc_infos = [solve(i) for i in disp_atom_list]
 
+    for fc_info in fc_infos:
         if fc_info is not None:
             # KL(m)
             fc_errors = fc_info
@@ -684,6 +904,68 @@ def _get_force_constants_disps(force_constants,
 
     return disp_atom_list
 
+def _get_site_symmetry_permutations(symmetry, atom_number):
+    """
+    Site-symmetry operations of an atom and the atom permutations by
+    them are looked up in the permutation table of space group.
+
+    Returns
+    -------
+    site_symmetry: Rotations of the operations that leave the atom
+        at the same site. Same as Symmetry.get_site_symmetry.
+    rot_map_syms: Inverse permutations of those operations, i.e.,
+        atom rot_map_syms[s, i] is sent to atom i. Same as
+        get_positions_sent_by_rot_inv.
+    """
+    permutations = symmetry.get_atom_permutations()
+    site_ops = np.where(permutations[:, atom_number] == atom_number)[0]
+    rotations = symmetry.get_symmetry_operations()['rotations']
+    rot_map_syms = symmetry.get_atom_permutations(is_inverse=True)[site_ops]
+    return np.array(rotations[site_ops], dtype='intc'), rot_map_syms
+
+def _get_compact_fc2(supercell,
+                     symmetry,
+                     dataset,
+                     atom_list,
+                     computation_algorithm="svd",
+                     nprocs=None):
+    """
+    Force constants of shape (len(atom_list), num_atom, 3, 3)
+
+    Rows of the displaced atoms are solved into a temporary array and
+    are rotated into the rows of atom_list without allocating the full
+    (num_atom, num_atom, 3, 3) array.
+    """
+
+    num_atom = supercell.get_number_of_atoms()
+    disp_atom_list = np.unique([x['number'] for x in dataset['first_atoms']])
+    fc_done = np.zeros((len(disp_atom_list), num_atom, 3, 3), dtype='double')
+    _get_force_constants_disps(fc_done,
+                               supercell,
+                               dataset,
+                               symmetry,
+                               atom_list=disp_atom_list,
+                               computation_algorithm=computation_algorithm,
+                               nprocs=nprocs)
+    force_constants = np.zeros((len(atom_list), num_atom, 3, 3),
+                               dtype='double')
+
+    rotations = symmetry.get_symmetry_operations()['rotations']
+    lattice = np.array(supercell.get_cell().T, dtype='double', order='C')
+    permutations = symmetry.get_atom_permutations()
+    map_atoms, map_syms = _get_sym_mappings_from_permutations(
+        permutations, disp_atom_list)
+    done_index = dict([(j, i) for i, j in enumerate(disp_atom_list)])
+    for i, atom in enumerate(atom_list):
+        r_cart = similarity_transformation(lattice, rotations[map_syms[atom]])
+        fc_disp = fc_done[done_index[map_atoms[atom]]]
+        # P' = R^-1 P R
+        force_constants[i] = np.matmul(
+            np.matmul(r_cart.T, fc_disp[permutations[map_syms[atom]]]),
+            r_cart)
+
+    return force_constants
+
 def _distribute_fc2_part(force_constants,
                          positions,
                          atom_disp,
@@ -769,42 +1051,81 @@ def _average_force_constants_by_sitesym(fc_new,
 
     return num_sitesym
 
-def _get_atom_indices_by_symmetry(lattice,
-                                  positions,
-                                  rotations,
-                                  translations,
-                                  symprec):
-    # To understand this method, understanding numpy broadcasting is mandatory.
-
-    K = len(positions)
-    # positions[K, 3]
-    # dot()[K, N, 3] where N is number of sym opts.
-    # translation[N, 3] is added to the last two dimenstions after dot().
-    rpos = np.dot(positions, np.transpose(rotations, (0, 2, 1))) + translations
-
-    # np.tile(rpos, (K, 1, 1, 1))[K(2), K(1), N, 3]
-    # by adding one dimension in front of [K(1), N, 3].
-    # np.transpose(np.tile(rpos, (K, 1, 1, 1)), (2, 1, 0, 3))[N, K(1), K(2), 3]
-    diff = positions - np.transpose(np.tile(rpos, (K, 1, 1, 1)), (2, 1, 0, 3))
-    diff -= np.rint(diff)
-    diff = np.dot(diff, lattice.T)
-    # m[N, K(1), K(2)]
-    m = (np.sqrt(np.sum(diff ** 2, axis=3)) < symprec)
-    # index_array[K(1), K(2)]
-    index_array = np.tile(np.arange(K, dtype='intc'), (K, 1))
-    # Understanding numpy boolean array indexing (extract True elements)
-    # mapa[N, K(1)]
-    mapa = np.array([index_array[mr] for mr in m])
-    return mapa
-
-def _get_shortest_distance_in_PBC(pos_i, pos_j, reduced_bases):
-    distances = []
-    for k in (-1, 0, 1):
-        for l in (-1, 0, 1):
-            for m in (-1, 0, 1):
-                diff = pos_j + np.array([k, l, m]) - pos_i
-                distances.append(np.linalg.norm(np.dot(diff, reduced_bases)))
-    return np.min(distances)
+def _get_c_double_array(force_constants):
+    """Force constants as C-contiguous double array for C functions
+
+    The array itself is returned when it already fulfills the condition,
+    otherwise a copy is returned, which has to be copied back by the
+    caller.
+    """
+    if (force_constants.dtype == np.dtype('double') and
+        force_constants.flags.c_contiguous and
+        force_constants.flags.aligned and
+        force_constants.flags.writeable):
+        return force_constants
+    return np.array(force_constants, dtype='double', order='C')
+
+def _get_fc_full_maps(num_satom):
+    """Atom mappings of full force constants passed to C functions
+
+    Returns p2s_map, s2pp_map, nsym_list and inv_trans_perms, where
+    element (i, j) of full force constants is found at
+    fc[s2pp_map[i], inv_trans_perms[nsym_list[i], j]]. For full force
+    constants, these are identities.
+    """
+    identity = np.arange(num_satom, dtype='intc')
+    return (identity,
+            identity,
+            np.zeros(num_satom, dtype='intc'),
+            np.array([identity], dtype='intc'))
+
+def _get_fc_compact_maps(lattice, # column vectors
+                         positions,
+                         primitive,
+                         symprec):
+    """Atom mappings of compact force constants passed to C functions
+
+    See _get_fc_full_maps. nsym_list[i] is the pure translation of the
+    supercell by the primitive lattice that sends atom
+    p2s_map[s2pp_map[i]] to atom i, and inv_trans_perms are the inverse
+    permutations of atoms by the pure translations.
+    """
+    p2s_map = primitive.get_primitive_to_supercell_map()
+    s2p_map = primitive.get_supercell_to_primitive_map()
+    p2p_map = primitive.get_primitive_to_primitive_map()
+    s2pp_map = np.array([p2p_map[i] for i in s2p_map], dtype='intc')
+
+    trans_atoms = np.where(s2p_map == p2s_map[0])[0]
+    translations = positions[trans_atoms] - positions[p2s_map[0]]
+    rotations = np.tile(np.eye(3, dtype='intc'), (len(translations), 1, 1))
+    trans_perms = _compute_all_sg_permutations(positions,
+                                               rotations,
+                                               translations,
+                                               np.array(lattice,
+                                                        dtype='double',
+                                                        order='C'),
+                                               symprec)
+    nsym_list = np.zeros(len(positions), dtype='intc')
+    for i, perm in enumerate(trans_perms):
+        nsym_list[perm[p2s_map]] = i
+    inv_trans_perms = np.array(np.argsort(trans_perms, axis=1),
+                               dtype='intc', order='C')
+
+    return (np.array(p2s_map, dtype='intc'),
+            s2pp_map,
+            nsym_list,
+            inv_trans_perms)
+
+def _get_shortest_distances_in_PBC(pos_i, positions, reduced_bases):
+    """Shortest distances from pos_i to positions under PBC
+
+    Positions are given in the coordinates of reduced_bases.
+    """
+    lattice_points = np.array(list(np.ndindex(3, 3, 3))) - 1
+    diffs = (positions[:, None, :] + lattice_points[None, :, :] -
+             pos_i)
+    distances = np.sqrt(np.sum(np.dot(diffs, reduced_bases) ** 2, axis=2))
+    return np.min(distances, axis=1)
 
 def _get_atom_mapping_by_symmetry(atom_list_done,
                                   atom_number,
@@ -0,0 +1,171 @@
+# Copyright (C) 2017 Atsushi Togo
+# All rights reserved.
+#
+# This file is part of phonopy.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+#   notice, this list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in
+#   the documentation and/or other materials provided with the
+#   distribution.
+#
+# * Neither the name of the phonopy project nor the names of its
+#   contributors may be used to endorse or promote products derived
+#   from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import numpy as np
+from phonopy.harmonic.force_constants import (
+    solve_force_constants, similarity_transformation,
+    _get_site_symmetry_permutations)
+
+
+class IncrementalForceConstants(object):
+    """Force constants updated as displacement calculations are added
+
+    Displacements and forces are accumulated per displaced atom and the
+    solved rows of the displaced atoms are kept. When new displacements
+    are added, only the displaced atoms of them are solved again and
+    only the rows of the atoms that are sent from those atoms by
+    symmetry operations are updated. Rows of atoms that are not
+    equivalent to any displaced atom are left zero until displacements
+    of the equivalent atoms arrive. When all displacements in dataset
+    are added, the force constants are equal to those by get_fc2.
+
+    atom_list: Atom indices in supercell of the rows of force
+        constants. None means all atoms, i.e., full force constants.
+        Compact force constants are obtained by the
+        primitive-to-supercell map.
+    """
+
+    def __init__(self,
+                 supercell,
+                 symmetry,
+                 atom_list=None,
+                 computation_algorithm="svd"):
+        self._supercell = supercell
+        self._symmetry = symmetry
+        self._computation_algorithm = computation_algorithm
+
+        num_atom = supercell.get_number_of_atoms()
+        if atom_list is None:
+            self._atom_list = np.arange(num_atom, dtype='intc')
+        else:
+            self._atom_list = np.array(atom_list, dtype='intc')
+        self._force_constants = np.zeros(
+            (len(self._atom_list), num_atom, 3, 3), dtype='double', order='C')
+
+        lattice = supercell.get_cell().T
+        rotations = symmetry.get_symmetry_operations()['rotations']
+        self._rots_cartesian = np.array(
+            [similarity_transformation(lattice, r) for r in rotations],
+            dtype='double', order='C')
+        self._permutations = symmetry.get_atom_permutations()
+
+        self._displacements = {}
+        self._sets_of_forces = {}
+        self._fc_disps = {}
+        self._updated_atoms = set()
+        # Displaced atoms from which rows of force constants are made
+        self._map_atoms = np.zeros(len(self._atom_list), dtype='intc') - 1
+
+    def add_displacements(self, first_atoms):
+        """Add displacement calculations
+
+        first_atoms: List of dicts of 'number', 'displacement' and
+            'forces' in the same format as 'first_atoms' of displacement
+            dataset.
+        """
+        for disp in first_atoms:
+            atom = disp['number']
+            if atom not in self._displacements:
+                self._displacements[atom] = []
+                self._sets_of_forces[atom] = []
+            self._displacements[atom].append(disp['displacement'])
+            self._sets_of_forces[atom].append(disp['forces'])
+            self._updated_atoms.add(atom)
+
+    def run(self):
+        """Update force constants by the displacements added after last run
+
+        Returns indices of the rows of force constants that are updated.
+        """
+        for atom in sorted(self._updated_atoms):
+            self._solve(atom)
+
+        is_done = np.zeros(self._permutations.shape[1], dtype='bool')
+        is_done[list(self._fc_disps)] = True
+        # First symmetry operation that sends an atom to a displaced atom
+        is_mapped = is_done[self._permutations[:, self._atom_list]]
+        map_syms = np.argmax(is_mapped, axis=0)
+        map_atoms = self._permutations[map_syms, self._atom_list]
+        map_atoms[~is_mapped.any(axis=0)] = -1
+
+        is_updated = np.zeros_like(is_done)
+        is_updated[list(self._updated_atoms)] = True
+        rows = np.where((map_atoms > -1) &
+                        (is_updated[map_atoms] |
+                         (map_atoms != self._map_atoms)))[0]
+        for i in rows:
+            r_cart = self._rots_cartesian[map_syms[i]]
+            fc_disp = self._fc_disps[map_atoms[i]]
+            # P' = R^-1 P R
+            self._force_constants[i] = np.matmul(
+                np.matmul(r_cart.T,
+                          fc_disp[self._permutations[map_syms[i]]]),
+                r_cart)
+
+        self._map_atoms = np.array(map_atoms, dtype='intc')
+        self._updated_atoms = set()
+
+        return rows
+
+    def get_force_constants(self):
+        return self._force_constants
+
+    def get_atom_list(self):
+        return self._atom_list
+
+    def get_displaced_atoms(self):
+        """Displaced atoms whose rows of force constants are solved"""
+        return np.array(sorted(self._fc_disps), dtype='intc')
+
+    def is_complete(self):
+        """Whether all rows of force constants are obtained"""
+        return (self._map_atoms > -1).all()
+
+    def _solve(self, atom):
+        num_atom = self._supercell.get_number_of_atoms()
+        fc_disp = np.zeros((1, num_atom, 3, 3), dtype='double')
+        site_symmetry, rot_map_syms = _get_site_symmetry_permutations(
+            self._symmetry, atom)
+        solve_force_constants(
+            fc_disp,
+            atom,
+            self._displacements[atom],
+            self._sets_of_forces[atom],
+            self._supercell,
+            site_symmetry,
+            self._symmetry.get_symmetry_tolerance(),
+            computation_algorithm=self._computation_algorithm,
+            atom_list=[atom],
+            rot_map_syms=rot_map_syms)
+        self._fc_disps[atom] = fc_disp[0]
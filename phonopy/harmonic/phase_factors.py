@@ -0,0 +1,93 @@
+# Copyright (C) 2017 Atsushi Togo
+# All rights reserved.
+#
+# This file is part of phonopy.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+#   notice, this list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in
+#   the documentation and/or other materials provided with the
+#   distribution.
+#
+# * Neither the name of the phonopy project nor the names of its
+#   contributors may be used to endorse or promote products derived
+#   from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import weakref
+import numpy as np
+
+# Phase factors of the latest sets of q-points for each primitive cell
+# {primitive: [(qpoints, phase_factors), ...]}. Entries are dropped
+# together with the primitive cell.
+_phase_factors_cache = weakref.WeakKeyDictionary()
+_phase_factors_cache_size = 4
+
+
+def clear_phase_factors_cache():
+    """Release the cached phase factors of all primitive cells"""
+    _phase_factors_cache.clear()
+
+def get_phase_factors(primitive, qpoints):
+    """Phase factors of atomic pairs reduced over equivalent vectors
+
+    phase_factors[q, j, i] = sum_m exp(2 pi i q.r_m) / multi
+    where r_m (m = 1..multi) are the smallest vectors from atom i in
+    primitive cell to atom j in supercell in the reduced coordinates of
+    primitive cell. Phase factors with the opposite sign are obtained
+    by the complex conjugate.
+
+    The results for the latest few sets of q-points are cached for each
+    primitive cell as long as the primitive cell exists, and returned as
+    read-only arrays, so that transformations repeated over the same set
+    of q-points are reduced to products of arrays. The cache is released
+    by clear_phase_factors_cache.
+
+    shape=(num_qpoints, num_satom, num_patom), dtype=complex
+    """
+    _qpoints = np.array(np.reshape(qpoints, (-1, 3)),
+                        dtype='double', order='C')
+    cache = _phase_factors_cache.setdefault(primitive, [])
+    for i, (q_set, phase_factors) in enumerate(cache):
+        if q_set.shape == _qpoints.shape and (q_set == _qpoints).all():
+            cache.append(cache.pop(i))
+            return phase_factors
+
+    phase_factors = _get_phase_factors(primitive, _qpoints)
+    phase_factors.flags.writeable = False
+    cache.append((_qpoints, phase_factors))
+    if len(cache) > _phase_factors_cache_size:
+        cache.pop(0)
+    return phase_factors
+
+def _get_phase_factors(primitive, qpoints):
+    svecs, multiplicity = primitive.get_smallest_vectors()
+    max_multi = multiplicity.max()
+    vectors = svecs[:, :, :max_multi]
+    weights = ((np.arange(max_multi) < multiplicity[:, :, None]) /
+               multiplicity[:, :, None].astype('double'))
+    dtype = "c%d" % (np.dtype('double').itemsize * 2)
+    phase_factors = np.zeros((len(qpoints),) + multiplicity.shape,
+                             dtype=dtype, order='C')
+    for i, q in enumerate(qpoints):
+        phase_factors[i] = np.sum(
+            np.exp(2j * np.pi * np.dot(vectors, q)) * weights, axis=2)
+    return phase_factors
@@ -0,0 +1,163 @@
+# Copyright (C) 2017 Atsushi Togo
+# All rights reserved.
+#
+# This file is part of phonopy.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+#   notice, this list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in
+#   the documentation and/or other materials provided with the
+#   distribution.
+#
+# * Neither the name of the phonopy project nor the names of its
+#   contributors may be used to endorse or promote products derived
+#   from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import copy
+import numpy as np
+
+
+class SparseForceConstants(object):
+    """Force constants of atomic pairs within a cutoff radius
+
+    Only the force constants between atoms in primitive cell and atoms
+    in supercell whose shortest distance under the periodic boundary
+    condition, given by the smallest vectors of primitive cell, is
+    within cutoff_radius are stored as a list of pairs. Pairs whose
+    force constants are zero are not stored. Therefore the memory and
+    the work to build dynamical matrices scale with the number of
+    neighbors instead of supercell size. To keep this scaling, the pairs
+    have to be given directly (see get_sparse_fc2), since dense force
+    constants already take O(num_patom * num_satom) memory. The smallest
+    vectors held by primitive cell, which are used for the cutoff and
+    the phase factors, are still stored for all pairs of atoms.
+
+    force_constants: Force constants in the full shape of
+        (num_satom, num_satom, 3, 3) or in the compact shape of
+        (num_patom, num_satom, 3, 3). When pairs is given, those of the
+        pairs in the shape of (num_pairs, 3, 3).
+    cutoff_radius: Cutoff radius in the same unit as the lattice.
+        None means all pairs with non-zero force constants are kept.
+    pairs: Indices of atoms in primitive cell and those in supercell of
+        the pairs of force_constants, each of shape=(num_pairs,).
+    """
+
+    def __init__(self,
+                 force_constants,
+                 primitive,
+                 cutoff_radius=None,
+                 pairs=None):
+        self._pcell = primitive
+        self._cutoff_radius = cutoff_radius
+        self._num_patom = primitive.get_number_of_atoms()
+        self._num_satom = len(primitive.get_supercell_to_primitive_map())
+
+        self._p_atoms = None
+        self._s_atoms = None
+        self._force_constants = None
+        if pairs is None:
+            self._set_pairs_from_dense(force_constants)
+        else:
+            self._set_pairs(np.array(pairs[0], dtype='intc'),
+                            np.array(pairs[1], dtype='intc'),
+                            np.array(force_constants, dtype='double'))
+
+    def get_cutoff_radius(self):
+        return self._cutoff_radius
+
+    def get_number_of_pairs(self):
+        return len(self._p_atoms)
+
+    def get_pairs(self):
+        """Atom indices of pairs
+
+        Returns indices of atoms in primitive cell and those in
+        supercell, each of shape=(num_pairs,). Pairs are sorted by the
+        atoms in primitive cell and then by the primitive cell atoms to
+        which the supercell atoms belong.
+        """
+        return self._p_atoms, self._s_atoms
+
+    def get_force_constants(self):
+        """Force constants of pairs, shape=(num_pairs, 3, 3)"""
+        return self._force_constants
+
+    def get_compact_force_constants(self):
+        """Dense force constants of shape (num_patom, num_satom, 3, 3)"""
+        fc = np.zeros((self._num_patom, self._num_satom, 3, 3),
+                      dtype='double', order='C')
+        fc[self._p_atoms, self._s_atoms] = self._force_constants
+        return fc
+
+    def get_scaled(self, factor):
+        """Copy whose force constants are multiplied by factor"""
+        sparse_fc = copy.copy(self)
+        sparse_fc._force_constants = self._force_constants * factor
+        return sparse_fc
+
+    def _set_pairs_from_dense(self, force_constants):
+        p2s_map = self._pcell.get_primitive_to_supercell_map()
+        if force_constants.shape[1] != self._num_satom:
+            raise ValueError("Force constants are inconsistent with "
+                             "supercell.")
+        if force_constants.shape[0] == self._num_satom:
+            fc_rows = p2s_map
+        elif force_constants.shape[0] == self._num_patom:
+            fc_rows = np.arange(self._num_patom)
+        else:
+            raise ValueError("Force constants are inconsistent with "
+                             "primitive cell and supercell.")
+
+        # Row by row not to copy dense force constants
+        p_atoms = []
+        s_atoms = []
+        fc_pairs = []
+        for i, row in enumerate(fc_rows):
+            atoms = np.nonzero(
+                (np.abs(force_constants[row]) > 0).any(axis=(1, 2)))[0]
+            p_atoms.append(np.full(len(atoms), i, dtype='intc'))
+            s_atoms.append(atoms)
+            fc_pairs.append(force_constants[row, atoms])
+        self._set_pairs(np.array(np.concatenate(p_atoms), dtype='intc'),
+                        np.array(np.concatenate(s_atoms), dtype='intc'),
+                        np.concatenate(fc_pairs).reshape(-1, 3, 3))
+
+    def _set_pairs(self, p_atoms, s_atoms, force_constants):
+        s2p_map = self._pcell.get_supercell_to_primitive_map()
+        p2p_map = self._pcell.get_primitive_to_primitive_map()
+
+        if self._cutoff_radius is not None:
+            svecs, _ = self._pcell.get_smallest_vectors()
+            vectors = np.dot(svecs[s_atoms, p_atoms, 0],
+                             self._pcell.get_cell())
+            distances = np.sqrt(np.sum(vectors ** 2, axis=-1))
+            is_pair = (distances <= self._cutoff_radius)
+            p_atoms = p_atoms[is_pair]
+            s_atoms = s_atoms[is_pair]
+            force_constants = force_constants[is_pair]
+
+        s2pp = np.array([p2p_map[i] for i in s2p_map], dtype='intc')
+        order = np.lexsort((s_atoms, s2pp[s_atoms], p_atoms))
+        self._p_atoms = np.array(p_atoms[order], dtype='intc')
+        self._s_atoms = np.array(s_atoms[order], dtype='intc')
+        self._force_constants = np.array(force_constants[order],
+                                         dtype='double', order='C')
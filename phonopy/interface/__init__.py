@@ -33,7 +33,8 @@
 # POSSIBILITY OF SUCH DAMAGE.
 
 import os
-from phonopy.file_IO import parse_disp_yaml, write_FORCE_SETS
+from phonopy.file_IO import (parse_disp_yaml, write_FORCE_SETS,
+                             parse_FORCE_SETS, get_force_sets_format)
 
 def read_crystal_structure(filename=None,
                            interface_mode=None,
@@ -180,9 +181,12 @@ def create_FORCE_SETS(interface_mode,
                       symprec=1e-5,
                       is_wien2k_p1=False,
                       force_sets_zero_mode=False,
-                      disp_filename='disp.yaml',
+                      disp_filename=None,
                       force_sets_filename='FORCE_SETS',
                       log_level=0):
+    if disp_filename is None:
+        disp_filename = get_disp_filename()
+
     if (interface_mode is None or
         interface_mode == 'vasp' or
         interface_mode == 'abinit' or
@@ -191,7 +195,11 @@ def create_FORCE_SETS(interface_mode,
         interface_mode == 'siesta' or
         interface_mode == 'cp2k' or
         interface_mode == 'crystal'):
-        disp_dataset = parse_disp_yaml(filename=disp_filename)
+        if get_force_sets_format(disp_filename) == 'text':
+            disp_dataset = parse_disp_yaml(filename=disp_filename)
+        else:
+            # Displacement dataset in HDF5 or npz (forces are unused)
+            disp_dataset = parse_FORCE_SETS(filename=disp_filename)
         num_atoms = disp_dataset['natom']
         num_displacements = len(disp_dataset['first_atoms'])
         if force_sets_zero_mode:
@@ -242,6 +250,21 @@ def create_FORCE_SETS(interface_mode,
 
     return 0
 
+def get_disp_filename(is_hdf5=False):
+    """Find file of displacement dataset written by phonopy -d
+
+    disp.yaml is used unless only disp.hdf5 exists. With is_hdf5=True,
+    disp.hdf5 is preferred.
+    """
+    if is_hdf5:
+        candidates = ('disp.hdf5', 'disp.yaml')
+    else:
+        candidates = ('disp.yaml', 'disp.hdf5')
+    for filename in candidates:
+        if os.path.exists(filename):
+            return filename
+    return 'disp.yaml'
+
 def get_force_sets(interface_mode,
                    num_atoms,
                    num_displacements,
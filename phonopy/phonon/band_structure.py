@@ -34,6 +34,8 @@
 
 import numpy as np
 from phonopy.units import VaspToTHz
+from phonopy.phonon.solver import solve_phonons, solve_dynamical_matrices
+from phonopy.phonon.yaml_format import BandYamlFormatter
 
 def estimate_band_connection(prev_eigvecs, eigvecs, prev_band_order):
     metric = np.abs(np.dot(prev_eigvecs.conjugate().T, eigvecs))
@@ -83,7 +85,8 @@ class BandStructure(object):
                  is_eigenvectors=False,
                  is_band_connection=False,
                  group_velocity=None,
-                 factor=VaspToTHz):
+                 factor=VaspToTHz,
+                 use_lapack_solver=False):
         self._dynamical_matrix = dynamical_matrix
         self._cell = dynamical_matrix.get_primitive()
         self._supercell = dynamical_matrix.get_supercell()
@@ -93,6 +96,7 @@ class BandStructure(object):
         if is_band_connection:
             self._is_eigenvectors = True
         self._group_velocity = group_velocity
+        self._use_lapack_solver = use_lapack_solver
 
         self._paths = [np.array(path) for path in paths]
         self._distances = []
@@ -206,6 +210,14 @@ class BandStructure(object):
             text.append('')
             w.write("\n".join(text))
 
+            formatter = BandYamlFormatter(
+                natom * 3,
+                frequency_format="    frequency: %15.10f",
+                qpoint_format=("- q-position: [ %12.7f, %12.7f, %12.7f ]\n"
+                               "  distance: %12.7f\n"
+                               "  band:\n"),
+                is_group_velocity=(self._group_velocities is not None),
+                is_eigenvectors=(self._eigenvectors is not None))
             for i in range(len(self._paths)):
                 qpoints = self._paths[i]
                 distances = self._distances[i]
@@ -228,7 +240,8 @@ class BandStructure(object):
                                                            frequencies,
                                                            eigenvectors,
                                                            group_velocities,
-                                                           _labels)))
+                                                           _labels,
+                                                           formatter)))
 
     def _get_q_segment_yaml(self,
                             qpoints,
@@ -236,36 +249,21 @@ class BandStructure(object):
                             frequencies,
                             eigenvectors,
                             group_velocities,
-                            labels):
-        natom = self._cell.get_number_of_atoms()
+                            labels,
+                            formatter):
+        blocks = formatter.get_blocks(
+            frequencies,
+            group_velocities=group_velocities,
+            eigenvectors=eigenvectors,
+            qpoint_values=np.c_[qpoints, distances])
+        if labels is not None:
+            label_indices = [0, len(blocks) - 1][:len(blocks)]
+            for j, label in zip(label_indices, labels):
+                blocks[j] = blocks[j].replace(
+                    "\n  band:\n", "\n  label: \'%s\'\n  band:\n" % label, 1)
         text = []
-        for j in range(len(qpoints)):
-            q = qpoints[j]
-            text.append("- q-position: [ %12.7f, %12.7f, %12.7f ]" % tuple(q))
-            text.append("  distance: %12.7f" % distances[j])
-            if labels is not None:
-                if j == 0:
-                    text.append("  label: \'%s\'" % labels[0])
-                elif j == len(qpoints) - 1:
-                    text.append("  label: \'%s\'" % labels[1])
-            text.append("  band:")
-            for k, freq in enumerate(frequencies[j]):
-                text.append("  - # %d" % (k + 1))
-                text.append("    frequency: %15.10f" % freq)
-
-                if group_velocities is not None:
-                    gv = group_velocities[j, k]
-                    text.append("    group_velocity: "
-                                "[ %13.7f, %13.7f, %13.7f ]" % tuple(gv))
-
-                if eigenvectors is not None:
-                    text.append("    eigenvector:")
-                    for l in range(natom):
-                        text.append("    - # atom %d" % (l + 1))
-                        for m in (0, 1, 2):
-                            text.append("      - [ %17.14f, %17.14f ]" %
-                                        (eigenvectors[j, l * 3 + m, k].real,
-                                         eigenvectors[j, l * 3 + m, k].imag))
+        for block in blocks:
+            text.append(block)
             text.append('')
         text.append('')
 
@@ -323,25 +321,34 @@ class BandStructure(object):
             self._group_velocity.set_q_points(path)
             gv = self._group_velocity.get_group_velocity()
 
+        eigvals_all, eigvecs_all = solve_phonons(
+            self._dynamical_matrix,
+            path,
+            is_eigenvectors=self._is_eigenvectors,
+            use_lapack_solver=self._use_lapack_solver)
+        if is_nac:
+            # q_direction is used at Gamma point, i.e., |q| < 1e-4 on
+            # band paths.
+            q_direction = np.subtract(path[0], path[-1])
+            for i in np.where((np.abs(path) < 1e-4).all(axis=1))[0]:
+                self._dynamical_matrix.set_dynamical_matrix(
+                    path[i], q_direction=q_direction)
+                dm = self._dynamical_matrix.get_dynamical_matrix()
+                eigvals, eigvecs = solve_dynamical_matrices(
+                    dm[None],
+                    is_eigenvectors=self._is_eigenvectors,
+                    use_lapack_solver=self._use_lapack_solver)
+                eigvals_all[i] = eigvals[0]
+                if self._is_eigenvectors:
+                    eigvecs_all[i] = eigvecs[0]
+
         for i, q in enumerate(path):
             self._shift_point(q)
             distances_on_path.append(self._distance)
 
-            if is_nac:
-                q_direction = None
-                if (np.abs(q) < 0.0001).all(): # For Gamma point
-                    q_direction = path[0] - path[-1]
-                self._dynamical_matrix.set_dynamical_matrix(
-                    q, q_direction=q_direction)
-            else:
-                self._dynamical_matrix.set_dynamical_matrix(q)
-            dm = self._dynamical_matrix.get_dynamical_matrix()
-
+            eigvals = eigvals_all[i]
             if self._is_eigenvectors:
-                eigvals, eigvecs = np.linalg.eigh(dm)
-                eigvals = eigvals.real
-            else:
-                eigvals = np.linalg.eigvalsh(dm).real
+                eigvecs = eigvecs_all[i]
 
             if self._is_band_connection:
                 if i == 0:
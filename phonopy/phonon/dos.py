@@ -141,6 +141,9 @@ class NormalDistribution(object):
     def __init__(self, sigma):
         self._sigma = sigma
 
+    def get_sigma(self):
+        return self._sigma
+
     def calc(self, x):
         return 1.0 / np.sqrt(2 * np.pi) / self._sigma * \
             np.exp(-x**2 / 2.0 / self._sigma**2)
@@ -171,8 +174,8 @@ def run_tetrahedron_method_dos(mesh,
                         dtype='double')
     else:
         _coef = np.array(coef, dtype='double', order='C')
-    arr_shape = frequencies.shape + (len(frequency_points), _coef.shape[1])
-    dos = np.zeros(arr_shape, dtype='double')
+    # Accumulated over grid points in C
+    dos = np.zeros((len(frequency_points), _coef.shape[1]), dtype='double')
 
     phonoc.tetrahedron_method_dos(dos,
                                   mesh,
@@ -183,13 +186,163 @@ def run_tetrahedron_method_dos(mesh,
                                   grid_mapping_table,
                                   relative_grid_address)
     if coef is None:
-        return dos[:,:,:,0].sum(axis=0).sum(axis=0) / np.prod(mesh)
+        return dos[:, 0] / np.prod(mesh)
+    else:
+        return dos / np.prod(mesh)
+
+def run_smearing_method_dos(frequency_points,
+                            frequencies,
+                            weights,
+                            smearing_function,
+                            coef=None,
+                            max_chunk_elements=2 ** 22):
+    """DOS by smearing method on frequency points
+
+    Smearing function is evaluated for frequency points and all phonon
+    modes as a (num_freqs, num_qpoints * num_band) array, and is
+    contracted with weights (and coef) by matrix product. Frequency
+    points are divided into chunks so that the array is smaller than
+    max_chunk_elements.
+
+    frequencies: shape=(num_qpoints, num_band)
+    weights: Weights of q-points, shape=(num_qpoints,)
+    coef: Weights of bands such as squared eigenvectors,
+        shape=(num_qpoints, num_coef, num_band)
+
+    Returns
+    -------
+    Weighted sum of smearing functions, which is not divided by sum of
+    weights. shape=(num_freqs,) or (num_freqs, num_coef) with coef.
+    """
+    freqs = np.ravel(frequencies)
+    num_band = np.shape(frequencies)[1]
+    if coef is None:
+        w = np.repeat(np.array(weights, dtype='double'), num_band)
+        dos = np.zeros(len(frequency_points), dtype='double')
+    else:
+        _coef = np.array(coef, dtype='double') * np.reshape(weights,
+                                                            (-1, 1, 1))
+        w = _coef.transpose(0, 2, 1).reshape(len(freqs), -1)
+        dos = np.zeros((len(frequency_points), w.shape[1]), dtype='double')
+
+    chunk_size = max(1, max_chunk_elements // max(1, len(freqs)))
+    for i in range(0, len(frequency_points), chunk_size):
+        f = np.reshape(frequency_points[i:(i + chunk_size)], (-1, 1))
+        dos[i:(i + chunk_size)] = np.dot(smearing_function.calc(freqs - f), w)
+
+    return dos
+
+def run_histogram_method_dos(frequency_points,
+                             frequencies,
+                             weights,
+                             smearing_function,
+                             bin_width,
+                             coef=None):
+    """DOS by convolution of histogram of modes with smearing function
+
+    Weights of phonon modes are deposited on the two nearest nodes of a
+    uniform frequency grid with spacing bin_width by linear
+    interpolation, which costs O(num_modes). The histogram is convolved
+    with the smearing function sampled on the grid by FFT, and the
+    result is linearly interpolated at frequency points. The
+    discretisation error is of the order of (bin_width / sigma) ** 2.
+
+    Parameters and returns are the same as run_smearing_method_dos.
+    """
+    freqs = np.ravel(frequencies)
+    num_band = np.shape(frequencies)[1]
+    w = np.repeat(np.array(weights, dtype='double'), num_band)
+    if coef is None:
+        w_coef = w[:, None]
+    else:
+        w_coef = (np.array(coef, dtype='double').transpose(0, 2, 1).reshape(
+            len(freqs), -1) * w[:, None])
+
+    f_min = min(freqs.min(), np.min(frequency_points)) - bin_width
+    f_max = max(freqs.max(), np.max(frequency_points)) + bin_width
+    num_nodes = int(np.ceil((f_max - f_min) / bin_width)) + 2
+    x = (freqs - f_min) / bin_width
+    i_node = np.floor(x).astype(int)
+    frac = x - i_node
+
+    # Smearing function at distances between nodes, -(n-1)...(n-1)
+    kernel = smearing_function.calc(
+        np.arange(-(num_nodes - 1), num_nodes) * bin_width)
+    num_fft = 1
+    while num_fft < 3 * num_nodes - 2:
+        num_fft *= 2
+    kernel_fft = np.fft.rfft(kernel, num_fft)
+
+    nodes = f_min + np.arange(num_nodes) * bin_width
+    dos = np.zeros((len(frequency_points), w_coef.shape[1]), dtype='double')
+    for i in range(w_coef.shape[1]):
+        hist = (np.bincount(i_node, weights=w_coef[:, i] * (1 - frac),
+                            minlength=num_nodes) +
+                np.bincount(i_node + 1, weights=w_coef[:, i] * frac,
+                            minlength=num_nodes))[:num_nodes]
+        conv = np.fft.irfft(np.fft.rfft(hist, num_fft) * kernel_fft, num_fft)
+        dos[:, i] = np.interp(frequency_points,
+                              nodes,
+                              conv[(num_nodes - 1):(2 * num_nodes - 1)])
+
+    if coef is None:
+        return dos[:, 0]
+    else:
+        return dos
+
+def get_eigenvector_projections(eigenvectors,
+                                direction=None,
+                                xyz_projection=False):
+    """Squared eigenvectors projected onto atoms used as PDOS weights
+
+    eigenvectors: shape=(num_qpoints, num_band, num_band)
+    direction: Projection direction in Cartesian coordinates
+    xyz_projection: Squared eigenvectors are not summed over x, y, z.
+
+    Returns
+    -------
+    shape=(num_qpoints, num_atom, num_band) or
+          (num_qpoints, num_band, num_band) for xyz_projection=True
+    """
+    if xyz_projection:
+        return np.abs(eigenvectors) ** 2
+
+    num_atom = eigenvectors.shape[1] // 3
+    i_x = np.arange(num_atom, dtype='int') * 3
+    i_y = np.arange(num_atom, dtype='int') * 3 + 1
+    i_z = np.arange(num_atom, dtype='int') * 3 + 2
+    if direction is None:
+        eigvecs2 = np.abs(eigenvectors[:, i_x, :]) ** 2
+        eigvecs2 += np.abs(eigenvectors[:, i_y, :]) ** 2
+        eigvecs2 += np.abs(eigenvectors[:, i_z, :]) ** 2
     else:
-        return dos.sum(axis=0).sum(axis=0) / np.prod(mesh)
+        d = np.array(direction, dtype='double')
+        d /= np.linalg.norm(direction)
+        proj_eigvecs = eigenvectors[:, i_x, :] * d[0]
+        proj_eigvecs += eigenvectors[:, i_y, :] * d[1]
+        proj_eigvecs += eigenvectors[:, i_z, :] * d[2]
+        eigvecs2 = np.abs(proj_eigvecs) ** 2
+    return eigvecs2
 
 class Dos(object):
-    def __init__(self, mesh_object, sigma=None, tetrahedron_method=False):
+    def __init__(self,
+                 mesh_object,
+                 sigma=None,
+                 tetrahedron_method=False,
+                 method=None,
+                 bin_width=None):
+        """
+        method: With 'histogram', DOS by smearing method is computed by
+            run_histogram_method_dos, whose cost is nearly linear in the
+            number of modes. Otherwise run_smearing_method_dos is used.
+            This is ignored with tetrahedron_method=True.
+        bin_width: Bin width of the histogram with method='histogram'.
+            The error of DOS is of the order of (bin_width / sigma) ** 2.
+            Default is sigma / 20.
+        """
         self._mesh_object = mesh_object
+        self._method = method
+        self._bin_width = bin_width
         self._frequencies = mesh_object.get_frequencies()
         self._weights = mesh_object.get_weights()
         if tetrahedron_method:
@@ -204,10 +357,16 @@ class Dos(object):
             self._tetrahedron_mesh = None
 
         self._frequency_points = None
+        self._adaptive_tolerance = None
         self._sigma = sigma
         self.set_draw_area()
         self.set_smearing_function('Normal')
 
+        # Mode frequencies sorted for dos_at
+        self._sorted_frequencies = None
+        self._sorted_weights = None
+        self._sorted_coef = None
+
     def set_smearing_function(self, function_name):
         """
         function_name ==
@@ -225,7 +384,14 @@ class Dos(object):
     def set_draw_area(self,
                       freq_min=None,
                       freq_max=None,
-                      freq_pitch=None):
+                      freq_pitch=None,
+                      adaptive_tolerance=None):
+        """
+        adaptive_tolerance: With a value, the frequency points of the
+            uniform grid are refined by bisecting intervals where DOS at
+            the middle deviates from the linear interpolation by more
+            than adaptive_tolerance times the maximum of DOS.
+        """
 
         f_min = self._frequencies.min()
         f_max = self._frequencies.max()
@@ -250,22 +416,161 @@ class Dos(object):
         self._frequency_points = np.arange(f_min,
                                            f_max + f_delta * 0.1,
                                            f_delta)
+        self._adaptive_tolerance = adaptive_tolerance
+
+    def _run_smearing_method_dos(self, weights, coef=None):
+        if self._method == 'histogram':
+            if self._bin_width is None:
+                bin_width = self._sigma / 20
+            else:
+                bin_width = self._bin_width
+            return run_histogram_method_dos(self._frequency_points,
+                                            self._frequencies,
+                                            weights,
+                                            self._smearing_function,
+                                            bin_width,
+                                            coef=coef)
+        else:
+            return run_smearing_method_dos(self._frequency_points,
+                                           self._frequencies,
+                                           weights,
+                                           self._smearing_function,
+                                           coef=coef)
+
+    def _run_adaptive(self, max_level=8):
+        """Frequency points are refined where DOS varies quickly
+
+        Intervals are bisected at most max_level times. Returns DOS at
+        the refined frequency points, which are stored in
+        self._frequency_points.
+        """
+        freq_points = self._frequency_points
+        values = self.dos_at(freq_points)
+        for i in range(max_level):
+            if len(freq_points) < 2:
+                break
+            mid_points = (freq_points[1:] + freq_points[:-1]) / 2
+            mid_values = self.dos_at(mid_points)
+            total = np.reshape(values, (-1, len(freq_points))).sum(axis=0)
+            mid_total = np.reshape(
+                mid_values, (-1, len(mid_points))).sum(axis=0)
+            deviations = np.abs(mid_total - (total[1:] + total[:-1]) / 2)
+            is_refined = (deviations >
+                          self._adaptive_tolerance * np.abs(total).max())
+            if not is_refined.any():
+                break
+            freq_points = np.concatenate(
+                (freq_points, mid_points[is_refined]))
+            values = np.concatenate(
+                (values, mid_values[..., is_refined]), axis=-1)
+            order = np.argsort(freq_points, kind='mergesort')
+            freq_points = freq_points[order]
+            values = values[..., order]
+
+        self._frequency_points = freq_points
+        return values
+
+    def _get_dos_at(self, frequencies, coef=None):
+        """Weighted sum of DOS divided by sum of weights at frequencies
+
+        Returns shape=(num_freqs,) or (num_freqs, num_coef) with coef.
+        """
+        freqs = np.array(frequencies, dtype='double').ravel()
+        if self._tetrahedron_mesh is not None:
+            return self._get_tetrahedron_method_dos(freqs, coef=coef)
+
+        if self._sorted_frequencies is None:
+            self._set_sorted_modes(coef)
+
+        if isinstance(self._smearing_function, NormalDistribution):
+            # exp(-50) is negligible.
+            cutoff = self._smearing_function.get_sigma() * 10
+        else:
+            cutoff = None
+
+        if coef is None:
+            dos = np.zeros(len(freqs), dtype='double')
+        else:
+            dos = np.zeros((len(freqs), coef.shape[1]), dtype='double')
+
+        # Only modes within cutoff from chunks of sorted frequencies
+        order = np.argsort(freqs)
+        chunk_size = 100
+        for i in range(0, len(freqs), chunk_size):
+            indices = order[i:(i + chunk_size)]
+            if cutoff is None:
+                i_min, i_max = 0, len(self._sorted_frequencies)
+            else:
+                i_min, i_max = np.searchsorted(
+                    self._sorted_frequencies,
+                    [freqs[indices[0]] - cutoff, freqs[indices[-1]] + cutoff])
+            if i_max == i_min:
+                continue
+            if coef is None:
+                _coef = None
+            else:
+                _coef = self._sorted_coef[i_min:i_max, :, None]
+            dos[indices] = run_smearing_method_dos(
+                freqs[indices],
+                self._sorted_frequencies[i_min:i_max, None],
+                self._sorted_weights[i_min:i_max],
+                self._smearing_function,
+                coef=_coef)
+
+        return dos / np.sum(self._weights)
+
+    def _set_sorted_modes(self, coef):
+        num_band = self._frequencies.shape[1]
+        frequencies = self._frequencies.ravel()
+        order = np.argsort(frequencies)
+        self._sorted_frequencies = np.array(frequencies[order],
+                                            dtype='double')
+        self._sorted_weights = np.array(
+            np.repeat(self._weights, num_band)[order], dtype='double')
+        if coef is not None:
+            # (num_qpoints, num_coef, num_band) -> (num_modes, num_coef)
+            self._sorted_coef = np.array(
+                coef.transpose(0, 2, 1).reshape(len(frequencies), -1)[order],
+                dtype='double')
+
+    def _get_tetrahedron_method_dos(self, frequency_points, coef=None):
+        mesh = self._mesh_object.get_mesh_numbers()
+        cell = self._mesh_object.get_dynamical_matrix().get_primitive()
+        reciprocal_lattice = np.linalg.inv(cell.get_cell())
+        tm = TetrahedronMethod(reciprocal_lattice, mesh=mesh)
+        return run_tetrahedron_method_dos(
+            mesh,
+            frequency_points,
+            self._frequencies,
+            self._mesh_object.get_grid_address(),
+            self._mesh_object.get_grid_mapping_table(),
+            tm.get_tetrahedra(),
+            coef=coef)
 
 class TotalDos(Dos):
-    def __init__(self, mesh_object, sigma=None, tetrahedron_method=False):
+    def __init__(self,
+                 mesh_object,
+                 sigma=None,
+                 tetrahedron_method=False,
+                 method=None,
+                 bin_width=None):
         Dos.__init__(self,
                      mesh_object,
                      sigma=sigma,
-                     tetrahedron_method=tetrahedron_method)
+                     tetrahedron_method=tetrahedron_method,
+                     method=method,
+                     bin_width=bin_width)
         self._dos = None
         self._freq_Debye = None
         self._Debye_fit_coef = None
         self._openmp_thm = True
 
     def run(self):
-        if self._tetrahedron_mesh is None:
-            self._dos = np.array([self._get_density_of_states_at_freq(f)
-                                  for f in self._frequency_points])
+        if self._adaptive_tolerance is not None:
+            self._dos = self._run_adaptive()
+        elif self._tetrahedron_mesh is None:
+            self._dos = (self._run_smearing_method_dos(self._weights) /
+                         np.sum(self._weights))
         else:
             if self._openmp_thm:
                 self._run_tetrahedron_method_dos()
@@ -277,17 +582,16 @@ class TotalDos(Dos):
                     self._dos += np.sum(iw * self._weights[i], axis=1)
 
     def _run_tetrahedron_method_dos(self):
-        mesh = self._mesh_object.get_mesh_numbers()
-        cell = self._mesh_object.get_dynamical_matrix().get_primitive()
-        reciprocal_lattice = np.linalg.inv(cell.get_cell())
-        tm = TetrahedronMethod(reciprocal_lattice, mesh=mesh)
-        self._dos = run_tetrahedron_method_dos(
-            mesh,
-            self._frequency_points,
-            self._frequencies,
-            self._mesh_object.get_grid_address(),
-            self._mesh_object.get_grid_mapping_table(),
-            tm.get_tetrahedra())
+        self._dos = self._get_tetrahedron_method_dos(self._frequency_points)
+
+    def dos_at(self, frequencies):
+        """Total DOS at frequencies
+
+        DOS is computed on demand at arbitrary frequencies, e.g., much
+        denser than frequency points. With smearing method, only phonon
+        modes near the frequencies are summed for normal distribution.
+        """
+        return self._get_dos_at(frequencies)
 
     def get_dos(self):
         """
@@ -361,11 +665,6 @@ class TotalDos(Dos):
                         self._dos,
                         comment=comment)
 
-    def _get_density_of_states_at_freq(self, f):
-        return np.sum(np.dot(
-            self._weights, self._smearing_function.calc(self._frequencies - f))
-            ) /  np.sum(self._weights)
-
 
 class PartialDos(Dos):
     def __init__(self,
@@ -373,37 +672,29 @@ class PartialDos(Dos):
                  sigma=None,
                  tetrahedron_method=False,
                  direction=None,
-                 xyz_projection=False):
+                 xyz_projection=False,
+                 method=None,
+                 bin_width=None):
         Dos.__init__(self,
                      mesh_object,
                      sigma=sigma,
-                     tetrahedron_method=tetrahedron_method)
+                     tetrahedron_method=tetrahedron_method,
+                     method=method,
+                     bin_width=bin_width)
         self._eigenvectors = self._mesh_object.get_eigenvectors()
         self._partial_dos = None
 
-        if xyz_projection:
-            self._eigvecs2 = np.abs(self._eigenvectors) ** 2
-        else:
-            num_atom = self._frequencies.shape[1] // 3
-            i_x = np.arange(num_atom, dtype='int') * 3
-            i_y = np.arange(num_atom, dtype='int') * 3 + 1
-            i_z = np.arange(num_atom, dtype='int') * 3 + 2
-            if direction is None:
-                self._eigvecs2 = np.abs(self._eigenvectors[:, i_x, :]) ** 2
-                self._eigvecs2 += np.abs(self._eigenvectors[:, i_y, :]) ** 2
-                self._eigvecs2 += np.abs(self._eigenvectors[:, i_z, :]) ** 2
-            else:
-                d = np.array(direction, dtype='double')
-                d /= np.linalg.norm(direction)
-                proj_eigvecs = self._eigenvectors[:, i_x, :] * d[0]
-                proj_eigvecs += self._eigenvectors[:, i_y, :] * d[1]
-                proj_eigvecs += self._eigenvectors[:, i_z, :] * d[2]
-                self._eigvecs2 = np.abs(proj_eigvecs) ** 2
+        self._eigvecs2 = get_eigenvector_projections(
+            self._eigenvectors,
+            direction=direction,
+            xyz_projection=xyz_projection)
 
         self._openmp_thm = True
 
     def run(self):
-        if self._tetrahedron_mesh is None:
+        if self._adaptive_tolerance is not None:
+            self._partial_dos = self._run_adaptive()
+        elif self._tetrahedron_mesh is None:
             self._run_smearing_method()
         else:
             if self._openmp_thm:
@@ -412,15 +703,9 @@ class PartialDos(Dos):
                 self._run_tetrahedron_method()
 
     def _run_smearing_method(self):
-        num_pdos = self._eigvecs2.shape[1]
-        num_freqs = len(self._frequency_points)
-        self._partial_dos = np.zeros((num_pdos, num_freqs), dtype='double')
         weights = self._weights / float(np.sum(self._weights))
-        for i, freq in enumerate(self._frequency_points):
-            amplitudes = self._smearing_function.calc(self._frequencies - freq)
-            for j in range(self._partial_dos.shape[0]):
-                self._partial_dos[j, i]= np.dot(
-                    weights, self._eigvecs2[:, j, :] * amplitudes).sum()
+        pdos = self._run_smearing_method_dos(weights, coef=self._eigvecs2)
+        self._partial_dos = np.array(pdos.T, dtype='double', order='C')
 
     def _run_tetrahedron_method(self):
         num_pdos = self._eigvecs2.shape[1]
@@ -433,20 +718,18 @@ class PartialDos(Dos):
             self._partial_dos += np.dot(iw * w, self._eigvecs2[i].T).T
 
     def _run_tetrahedron_method_dos(self):
-        mesh = self._mesh_object.get_mesh_numbers()
-        cell = self._mesh_object.get_dynamical_matrix().get_primitive()
-        reciprocal_lattice = np.linalg.inv(cell.get_cell())
-        tm = TetrahedronMethod(reciprocal_lattice, mesh=mesh)
-        pdos = run_tetrahedron_method_dos(
-            mesh,
-            self._frequency_points,
-            self._frequencies,
-            self._mesh_object.get_grid_address(),
-            self._mesh_object.get_grid_mapping_table(),
-            tm.get_tetrahedra(),
-            coef=self._eigvecs2)
+        pdos = self._get_tetrahedron_method_dos(self._frequency_points,
+                                                coef=self._eigvecs2)
         self._partial_dos = pdos.T
 
+    def dos_at(self, frequencies):
+        """Partial DOS at frequencies, shape=(num_pdos, num_freqs)
+
+        See TotalDos.dos_at.
+        """
+        return np.array(self._get_dos_at(frequencies, coef=self._eigvecs2).T,
+                        dtype='double', order='C')
+
     def get_partial_dos(self):
         """
         frequency_points: Sampling frequencies
@@ -494,3 +777,103 @@ class PartialDos(Dos):
         write_partial_dos(self._frequency_points,
                           self._partial_dos,
                           comment=comment)
+
+
+class DosReducer(object):
+    """Base class of DOS reducers of StreamingMesh
+
+    Contributions of chunks of q-points are accumulated on the given
+    frequency points. Since phonons are not stored for the whole mesh,
+    frequency_points has to be given in advance.
+    """
+    def __init__(self,
+                 frequency_points,
+                 sigma,
+                 smearing_function='Normal'):
+        self._frequency_points = np.array(frequency_points, dtype='double')
+        self._sigma = sigma
+        if smearing_function == 'Cauchy':
+            self._smearing_function = CauchyDistribution(sigma)
+        else:
+            self._smearing_function = NormalDistribution(sigma)
+        self._sum_weights = 0
+
+    def is_eigenvectors(self):
+        return False
+
+
+class TotalDosReducer(DosReducer):
+    def __init__(self,
+                 frequency_points,
+                 sigma,
+                 smearing_function='Normal'):
+        DosReducer.__init__(self,
+                            frequency_points,
+                            sigma,
+                            smearing_function=smearing_function)
+        self._dos = np.zeros(len(self._frequency_points), dtype='double')
+
+    def accumulate(self, frequencies, eigenvectors, weights):
+        self._dos += run_smearing_method_dos(self._frequency_points,
+                                             frequencies,
+                                             weights,
+                                             self._smearing_function)
+        self._sum_weights += np.sum(weights)
+
+    def finalize(self):
+        self._dos /= self._sum_weights
+
+    def get_dos(self):
+        return self._frequency_points, self._dos
+
+    def write(self):
+        write_total_dos(self._frequency_points,
+                        self._dos,
+                        comment="Sigma = %f" % self._sigma)
+
+
+class PartialDosReducer(DosReducer):
+    def __init__(self,
+                 frequency_points,
+                 sigma,
+                 smearing_function='Normal',
+                 direction=None,
+                 xyz_projection=False):
+        DosReducer.__init__(self,
+                            frequency_points,
+                            sigma,
+                            smearing_function=smearing_function)
+        self._direction = direction
+        self._xyz_projection = xyz_projection
+        self._partial_dos = None
+
+    def is_eigenvectors(self):
+        return True
+
+    def accumulate(self, frequencies, eigenvectors, weights):
+        eigvecs2 = get_eigenvector_projections(
+            eigenvectors,
+            direction=self._direction,
+            xyz_projection=self._xyz_projection)
+        if self._partial_dos is None:
+            self._partial_dos = np.zeros(
+                (eigvecs2.shape[1], len(self._frequency_points)),
+                dtype='double')
+        self._partial_dos += run_smearing_method_dos(
+            self._frequency_points,
+            frequencies,
+            weights,
+            self._smearing_function,
+            coef=eigvecs2).T
+        self._sum_weights += np.sum(weights)
+
+    def finalize(self):
+        self._partial_dos /= self._sum_weights
+
+    def get_partial_dos(self):
+        return self._frequency_points, self._partial_dos
+
+    def write(self):
+        write_partial_dos(self._frequency_points,
+                          self._partial_dos,
+                          comment="Sigma = %f" % self._sigma)
@@ -37,6 +37,7 @@ from phonopy.units import VaspToTHz
 from phonopy.harmonic.derivative_dynmat import DerivativeOfDynamicalMatrix
 from phonopy.harmonic.force_constants import similarity_transformation
 from phonopy.phonon.degeneracy import degenerate_sets
+from phonopy.phonon.solver import iter_phonon_chunks
 
 def get_group_velocity(q, # q-point
                        dynamical_matrix,
@@ -136,14 +137,16 @@ class GroupVelocity(object):
         return self._group_velocity
 
     def _set_group_velocity(self):
-        gv = [self._set_group_velocity_at_q(q) for q in self._q_points]
+        gv = []
+        for i, eigvals, eigvecs in iter_phonon_chunks(self._dynmat,
+                                                      self._q_points,
+                                                      is_eigenvectors=True):
+            for j in range(len(eigvals)):
+                gv.append(self._set_group_velocity_at_q(
+                    self._q_points[i + j], eigvals[j], eigvecs[j]))
         self._group_velocity = np.array(gv)
 
-    def _set_group_velocity_at_q(self, q):
-        self._dynmat.set_dynamical_matrix(q)
-        dm = self._dynmat.get_dynamical_matrix()
-        eigvals, eigvecs = np.linalg.eigh(dm)
-        eigvals = eigvals.real
+    def _set_group_velocity_at_q(self, q, eigvals, eigvecs):
         freqs = np.sqrt(abs(eigvals)) * np.sign(eigvals) * self._factor
         gv = np.zeros((len(freqs), 3), dtype='double')
         deg_sets = degenerate_sets(freqs)
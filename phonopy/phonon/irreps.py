@@ -1050,6 +1050,7 @@ class IrReps(object):
                  factor=VaspToTHz,
                  symprec=1e-5,
                  degeneracy_tolerance=1e-5,
+                 symmetry=None,
                  log_level=0):
         self._is_little_cogroup = is_little_cogroup
         self._nac_q_direction = nac_q_direction
@@ -1063,11 +1064,14 @@ class IrReps(object):
         self._dynamical_matrix = dynamical_matrix
         self._ddm = DerivativeOfDynamicalMatrix(dynamical_matrix)
         self._character_table = None
+        if symmetry is None:
+            self._symmetry = Symmetry(self._primitive, symprec=self._symprec)
+        else:
+            self._symmetry = symmetry
 
     def run(self):
         self._set_eigenvectors(self._dynamical_matrix)
-        self._symmetry_dataset = Symmetry(self._primitive,
-                                          symprec=self._symprec).get_dataset()
+        self._symmetry_dataset = self._symmetry.get_dataset()
 
         if not self._is_primitive_cell():
             print('')
@@ -1077,7 +1081,8 @@ class IrReps(object):
             return False
         
         (self._rotations_at_q,
-         self._translations_at_q) = self._get_rotations_at_q()
+         self._translations_at_q,
+         self._permutations_at_q) = self._get_rotations_at_q()
 
         self._g = len(self._rotations_at_q)
 
@@ -1160,20 +1165,26 @@ class IrReps(object):
     def _get_rotations_at_q(self):
         rotations_at_q = []
         trans_at_q = []
-        for r, t in zip(self._symmetry_dataset['rotations'],
-                        self._symmetry_dataset['translations']):
+        perms_at_q = []
+        for r, t, perm in zip(self._symmetry_dataset['rotations'],
+                              self._symmetry_dataset['translations'],
+                              self._symmetry.get_atom_permutations()):
 
             # Using r is used instead of np.linalg.inv(r)
             diff = np.dot(self._q, r) - self._q 
 
             if (abs(diff - np.rint(diff)) < self._symprec).all():
                 rotations_at_q.append(r)
+                t = t.copy()
                 for i in range(3):
                     if np.abs(t[i] - 1) < self._symprec:
                         t[i] = 0.0
                 trans_at_q.append(t)
+                perms_at_q.append(perm)
 
-        return np.array(rotations_at_q), np.array(trans_at_q)
+        return (np.array(rotations_at_q),
+                np.array(trans_at_q),
+                np.array(perms_at_q))
 
     def _get_conventional_rotations(self):
         rotations = self._rotations_at_q.copy()
@@ -1200,13 +1211,14 @@ class IrReps(object):
     def _get_ground_matrix(self):
         matrices = []
         
-        for (r, t) in zip(self._rotations_at_q,
-                          self._translations_at_q):
+        for (r, t, perm) in zip(self._rotations_at_q,
+                                self._translations_at_q,
+                                self._permutations_at_q):
     
             lat = self._primitive.get_cell().T
             r_cart = similarity_transformation(lat, r)
     
-            perm_mat = self._get_modified_permutation_matrix(r, t)
+            perm_mat = self._get_modified_permutation_matrix(r, t, perm)
             matrices.append(np.kron(perm_mat, r_cart))
 
         return np.array(matrices)
@@ -1219,31 +1231,28 @@ class IrReps(object):
             irrep_dims.append(len(irrep_Rs[0]))
         return np.array(characters), np.array(irrep_dims)
 
-    def _get_modified_permutation_matrix(self, r, t):
+    def _get_modified_permutation_matrix(self, r, t, perm):
+        """perm[i] is the atom to which atom i is sent by (r, t)."""
         num_atom = self._primitive.get_number_of_atoms()
         pos = self._primitive.get_scaled_positions()
         matrix = np.zeros((num_atom, num_atom), dtype=complex)
-        for i, p1 in enumerate(pos):
-            p_rot = np.dot(r, p1) + t
-            for j, p2 in enumerate(pos):
-                diff = p_rot - p2
-                if (abs(diff - np.rint(diff)) < self._symprec).all():
-                    # For this phase factor, see
-                    # Dynamics of perfect crystals by G. Venkataraman et al.,
-                    # pp132 Eq. (3.22).
-                    # It is assumed that dynamical matrix is built without
-                    # considering internal atomic positions, so
-                    # the phase factors of eigenvectors are shifted in
-                    # _get_irreps().
-                    phase_factor = np.dot(
-                        self._q, np.dot(np.linalg.inv(r), p2 - p_rot))
-                    
-                    # This phase factor comes from non-pure-translation of
-                    # each symmetry opration.
-                    if self._is_little_cogroup:
-                        phase_factor += np.dot(t, self._q)
-                        
-                    matrix[j, i] = np.exp(2j * np.pi * phase_factor)
+        p_rot = np.dot(pos, r.T) + t
+        # For this phase factor, see
+        # Dynamics of perfect crystals by G. Venkataraman et al.,
+        # pp132 Eq. (3.22).
+        # It is assumed that dynamical matrix is built without
+        # considering internal atomic positions, so
+        # the phase factors of eigenvectors are shifted in
+        # _get_irreps().
+        phase_factors = np.dot(pos[perm] - p_rot,
+                               np.dot(np.linalg.inv(r).T, self._q))
+
+        # This phase factor comes from non-pure-translation of
+        # each symmetry opration.
+        if self._is_little_cogroup:
+            phase_factors += np.dot(t, self._q)
+
+        matrix[perm, np.arange(num_atom)] = np.exp(2j * np.pi * phase_factors)
 
         return matrix
     
@@ -35,6 +35,10 @@
 import numpy as np
 from phonopy.units import VaspToTHz
 from phonopy.structure.grid_points import GridPoints
+from phonopy.phonon.yaml_format import BandYamlFormatter
+from phonopy.phonon.solver import (solve_phonons, solve_phonons_in_pool,
+                                   iter_phonon_chunks, get_chunk_size,
+                                   eigenvalues_to_frequencies)
 
 class MeshBase(object):
     def __init__(self,
@@ -46,10 +50,13 @@ class MeshBase(object):
                  is_eigenvectors=False,
                  is_gamma_center=False,
                  rotations=None, # Point group operations in real space
-                 factor=VaspToTHz):
+                 factor=VaspToTHz,
+                 chunk_size=None):
         self._mesh = np.array(mesh, dtype='intc')
         self._is_eigenvectors = is_eigenvectors
         self._factor = factor
+        # Number of q-points whose dynamical matrices are solved at once
+        self._chunk_size = chunk_size
         self._cell = dynamical_matrix.get_primitive()
         self._dynamical_matrix = dynamical_matrix
 
@@ -109,7 +116,9 @@ class Mesh(MeshBase):
                  group_velocity=None,
                  rotations=None, # Point group operations in real space
                  factor=VaspToTHz,
-                 use_lapack_solver=False):
+                 use_lapack_solver=False,
+                 chunk_size=None,
+                 nprocs=None):
         MeshBase.__init__(self,
                           dynamical_matrix,
                           mesh,
@@ -119,11 +128,14 @@ class Mesh(MeshBase):
                           is_eigenvectors=is_eigenvectors,
                           is_gamma_center=is_gamma_center,
                           rotations=rotations,
-                          factor=factor)
+                          factor=factor,
+                          chunk_size=chunk_size)
 
         self._group_velocity = group_velocity
         self._group_velocities = None
         self._use_lapack_solver = use_lapack_solver
+        # Number of processes used to solve phonons at ir-q-points
+        self._nprocs = nprocs
 
         self._q_count = 0
 
@@ -164,98 +176,89 @@ class Mesh(MeshBase):
         """
         return self._eigenvectors
 
-    def write_hdf5(self):
-        import h5py
-        with h5py.File('mesh.hdf5', 'w') as w:
-            w.create_dataset('mesh', data=self._mesh)
-            w.create_dataset('qpoint', data=self._qpoints)
-            w.create_dataset('weight', data=self._weights)
-            w.create_dataset('frequency', data=self._frequencies)
-            if self._eigenvectors is not None:
-                w.create_dataset('eigenvector', data=self._eigenvectors)
+    def write_hdf5(self,
+                   filename='mesh.hdf5',
+                   compression=None,
+                   compression_opts=None):
+        writer = MeshHdf5Writer(self,
+                                filename=filename,
+                                is_eigenvectors=(self._eigenvectors
+                                                 is not None),
+                                compression=compression,
+                                compression_opts=compression_opts)
+        size = get_chunk_size(self._frequencies.shape[1],
+                              chunk_size=self._chunk_size)
+        try:
+            for i in range(0, len(self._qpoints), size):
+                if self._eigenvectors is None:
+                    eigvecs = None
+                else:
+                    eigvecs = self._eigenvectors[i:(i + size)]
+                writer.accumulate(self._frequencies[i:(i + size)],
+                                  eigvecs,
+                                  self._weights[i:(i + size)])
             if self._group_velocities is not None:
-                w.create_dataset('group_velocity', data=self._group_velocities)
+                writer.write_dataset('group_velocity',
+                                     self._group_velocities)
+        finally:
+            writer.finalize()
 
     def write_yaml(self):
-        w = open('mesh.yaml', 'w')
-        eigenvalues = self._eigenvalues
         natom = self._cell.get_number_of_atoms()
         rec_lattice = np.linalg.inv(self._cell.get_cell()) # column vectors
-
-        w.write("mesh: [ %5d, %5d, %5d ]\n" % tuple(self._mesh))
-        w.write("nqpoint: %-7d\n" % self._qpoints.shape[0])
-        w.write("reciprocal_lattice:\n")
-        for vec, axis in zip(rec_lattice.T, ('a*', 'b*', 'c*')):
-            w.write("- [ %12.8f, %12.8f, %12.8f ] # %2s\n" %
-                    (tuple(vec) + (axis,)))
-        w.write("natom:   %-7d\n" % natom)
-        w.write(str(self._cell))
-        w.write("\n")
-        w.write("phonon:\n")
-
-        for i, q in enumerate(self._qpoints):
-            w.write("- q-position: [ %12.7f, %12.7f, %12.7f ]\n" % tuple(q))
-            w.write("  weight: %-5d\n" % self._weights[i])
-            w.write("  band:\n")
-
-            for j, freq in enumerate(self._frequencies[i]):
-                w.write("  - # %d\n" % (j + 1))
-                w.write("    frequency:  %15.10f\n" % freq)
-
-                if self._group_velocities is not None:
-                    w.write("    group_velocity: ")
-                    w.write("[ %13.7f, %13.7f, %13.7f ]\n" %
-                            tuple(self._group_velocities[i, j]))
-
-                if self._is_eigenvectors:
-                    w.write("    eigenvector:\n")
-                    for k in range(natom):
-                        w.write("    - # atom %d\n" % (k+1))
-                        for l in (0,1,2):
-                            w.write("      - [ %17.14f, %17.14f ]\n" %
-                                    (self._eigenvectors[i,k*3+l,j].real,
-                                     self._eigenvectors[i,k*3+l,j].imag))
+        formatter = BandYamlFormatter(
+            natom * 3,
+            frequency_format="    frequency:  %15.10f",
+            qpoint_format=("- q-position: [ %12.7f, %12.7f, %12.7f ]\n"
+                           "  weight: %-5d\n"
+                           "  band:\n"),
+            end="\n\n",
+            is_group_velocity=(self._group_velocities is not None),
+            is_eigenvectors=self._is_eigenvectors)
+
+        with open('mesh.yaml', 'w') as w:
+            w.write("mesh: [ %5d, %5d, %5d ]\n" % tuple(self._mesh))
+            w.write("nqpoint: %-7d\n" % self._qpoints.shape[0])
+            w.write("reciprocal_lattice:\n")
+            for vec, axis in zip(rec_lattice.T, ('a*', 'b*', 'c*')):
+                w.write("- [ %12.8f, %12.8f, %12.8f ] # %2s\n" %
+                        (tuple(vec) + (axis,)))
+            w.write("natom:   %-7d\n" % natom)
+            w.write(str(self._cell))
             w.write("\n")
+            w.write("phonon:\n")
 
-    def _set_phonon(self):
-        num_band = self._cell.get_number_of_atoms() * 3
-        num_qpoints = len(self._qpoints)
+            if self._is_eigenvectors:
+                eigvecs = self._eigenvectors
+            else:
+                eigvecs = None
+            for text in formatter.iter_texts(
+                    self._frequencies,
+                    group_velocities=self._group_velocities,
+                    eigenvectors=eigvecs,
+                    qpoint_values=np.c_[self._qpoints, self._weights]):
+                w.write(text)
 
-        self._eigenvalues = np.zeros((num_qpoints, num_band), dtype='double')
-        self._frequencies = np.zeros_like(self._eigenvalues)
-        if self._is_eigenvectors or self._use_lapack_solver:
-            dtype = "c%d" % (np.dtype('double').itemsize * 2)
-            self._eigenvectors = np.zeros(
-                (num_qpoints, num_band, num_band,), dtype=dtype)
-
-        if self._use_lapack_solver:
-            from phono3py.phonon.solver import get_phonons_at_qpoints
-            get_phonons_at_qpoints(self._frequencies,
-                                   self._eigenvectors,
-                                   self._dynamical_matrix,
-                                   self._qpoints,
-                                   self._factor,
-                                   nac_q_direction=None,
-                                   lapack_zheev_uplo='L')
-            self._eigenvalues = np.array(self._frequencies ** 2 *
-                                         np.sign(self._frequencies),
-                                         dtype='double',
-                                         order='C') / self._factor ** 2
-            if not self._is_eigenvectors:
-                self._eigenvalues = None
+    def _set_phonon(self):
+        if self._nprocs is not None and self._nprocs > 1:
+            (self._eigenvalues,
+             self._eigenvectors) = solve_phonons_in_pool(
+                 self._dynamical_matrix,
+                 self._qpoints,
+                 self._nprocs,
+                 is_eigenvectors=self._is_eigenvectors,
+                 chunk_size=self._chunk_size,
+                 use_lapack_solver=self._use_lapack_solver)
         else:
-            for i, q in enumerate(self._qpoints):
-                self._dynamical_matrix.set_dynamical_matrix(q)
-                dm = self._dynamical_matrix.get_dynamical_matrix()
-                if self._is_eigenvectors:
-                    eigvals, self._eigenvectors[i] = np.linalg.eigh(dm)
-                    self._eigenvalues[i] = eigvals.real
-                else:
-                    self._eigenvalues[i] = np.linalg.eigvalsh(dm).real
-            self._frequencies = np.array(np.sqrt(abs(self._eigenvalues)) *
-                                         np.sign(self._eigenvalues),
-                                         dtype='double',
-                                         order='C') * self._factor
+            (self._eigenvalues,
+             self._eigenvectors) = solve_phonons(
+                 self._dynamical_matrix,
+                 self._qpoints,
+                 is_eigenvectors=self._is_eigenvectors,
+                 chunk_size=self._chunk_size,
+                 use_lapack_solver=self._use_lapack_solver)
+        self._frequencies = eigenvalues_to_frequencies(
+            self._eigenvalues, factor=self._factor)
 
     def _set_group_velocities(self, group_velocity):
         group_velocity.set_q_points(self._qpoints)
@@ -271,7 +274,8 @@ class IterMesh(MeshBase):
                  is_eigenvectors=False,
                  is_gamma_center=False,
                  rotations=None, # Point group operations in real space
-                 factor=VaspToTHz):
+                 factor=VaspToTHz,
+                 chunk_size=None):
         MeshBase.__init__(self,
                           dynamical_matrix,
                           mesh,
@@ -281,9 +285,14 @@ class IterMesh(MeshBase):
                           is_eigenvectors=is_eigenvectors,
                           is_gamma_center=is_gamma_center,
                           rotations=rotations,
-                          factor=factor)
+                          factor=factor,
+                          chunk_size=chunk_size)
 
         self._q_count = 0
+        self._chunks = None
+        self._chunk_start = 0
+        self._chunk_eigenvalues = None
+        self._chunk_eigenvectors = None
 
     def __iter__(self):
         return self
@@ -295,17 +304,268 @@ class IterMesh(MeshBase):
         if self._q_count == len(self._qpoints):
             raise StopIteration
         else:
-            q = self._qpoints[self._q_count]
-            self._dynamical_matrix.set_dynamical_matrix(q)
-            dm = self._dynamical_matrix.get_dynamical_matrix()
+            # Dynamical matrices are solved chunk by chunk, and only
+            # phonons of the current chunk are kept.
+            if self._chunks is None:
+                self._chunks = iter_phonon_chunks(
+                    self._dynamical_matrix,
+                    self._qpoints,
+                    is_eigenvectors=self._is_eigenvectors,
+                    chunk_size=self._chunk_size)
+            i = self._q_count - self._chunk_start
+            if (self._chunk_eigenvalues is None or
+                i == len(self._chunk_eigenvalues)):
+                (self._chunk_start,
+                 self._chunk_eigenvalues,
+                 self._chunk_eigenvectors) = next(self._chunks)
+                i = 0
+            self._eigenvalues = self._chunk_eigenvalues[i]
             if self._is_eigenvectors:
-                eigvals, self._eigenvectors = np.linalg.eigh(dm)
-                self._eigenvalues = eigvals.real
-            else:
-                self._eigenvalues = np.linalg.eigvalsh(dm).real
-            self._frequencies = np.array(np.sqrt(abs(self._eigenvalues)) *
-                                         np.sign(self._eigenvalues),
-                                         dtype='double',
-                                         order='C') * self._factor
+                self._eigenvectors = self._chunk_eigenvectors[i]
+            self._frequencies = eigenvalues_to_frequencies(
+                self._eigenvalues, factor=self._factor)
             self._q_count += 1
             return self._frequencies, self._eigenvectors
+
+
+class StreamingMesh(MeshBase):
+    """Sampling mesh whose phonons are consumed by reducers chunk by chunk
+
+    Phonons at irreducible q-points are solved chunk by chunk (see
+    phonopy.phonon.solver.iter_phonon_chunks). Each chunk is passed to
+    the registered reducers and then discarded, so eigenvectors are
+    never stored for the whole mesh. Frequencies are kept.
+
+    A reducer has the following methods:
+
+    is_eigenvectors(): Return True if eigenvectors are needed.
+    accumulate(frequencies, eigenvectors, weights):
+        frequencies: shape=(len(chunk), num_band)
+        eigenvectors: shape=(len(chunk), num_band, num_band) or None
+        weights: shape=(len(chunk),)
+    finalize(): Called after the last chunk.
+
+    Reducers are found in dos.py (TotalDosReducer, PartialDosReducer),
+    thermal_properties.py (ThermalPropertiesReducer),
+    thermal_displacement.py (ThermalDisplacementsReducer,
+    ThermalDisplacementMatricesReducer) and moment.py
+    (PhononMomentReducer). Direction dependent quantities such as
+    projected DOS and thermal displacements need the mesh without
+    symmetrization, i.e., is_mesh_symmetry=False.
+
+    """
+    def __init__(self,
+                 dynamical_matrix,
+                 mesh,
+                 shift=None,
+                 is_time_reversal=True,
+                 is_mesh_symmetry=True,
+                 is_gamma_center=False,
+                 rotations=None, # Point group operations in real space
+                 factor=VaspToTHz,
+                 use_lapack_solver=False,
+                 chunk_size=None):
+        MeshBase.__init__(self,
+                          dynamical_matrix,
+                          mesh,
+                          shift=shift,
+                          is_time_reversal=is_time_reversal,
+                          is_mesh_symmetry=is_mesh_symmetry,
+                          is_eigenvectors=False,
+                          is_gamma_center=is_gamma_center,
+                          rotations=rotations,
+                          factor=factor,
+                          chunk_size=chunk_size)
+        self._use_lapack_solver = use_lapack_solver
+        self._reducers = []
+
+    def add_reducer(self, reducer):
+        self._reducers.append(reducer)
+
+    def get_reducers(self):
+        return self._reducers
+
+    def run(self):
+        self._is_eigenvectors = any([r.is_eigenvectors()
+                                     for r in self._reducers])
+        num_band = self._cell.get_number_of_atoms() * 3
+        self._frequencies = np.zeros((len(self._qpoints), num_band),
+                                     dtype='double')
+        for i, eigvals, eigvecs in iter_phonon_chunks(
+                self._dynamical_matrix,
+                self._qpoints,
+                is_eigenvectors=self._is_eigenvectors,
+                chunk_size=self._chunk_size,
+                use_lapack_solver=self._use_lapack_solver):
+            freqs = eigenvalues_to_frequencies(eigvals, factor=self._factor)
+            weights = self._weights[i:(i + len(freqs))]
+            self._frequencies[i:(i + len(freqs))] = freqs
+            for reducer in self._reducers:
+                reducer.accumulate(freqs, eigvecs, weights)
+
+        for reducer in self._reducers:
+            reducer.finalize()
+
+
+class MeshHdf5Writer(object):
+    """Writer of mesh.hdf5 filled chunk by chunk of q-points
+
+    Frequencies and eigenvectors are stored in chunked and (optionally)
+    compressed datasets. HDF5 chunks of eigenvectors are made per
+    q-point. Rows are written every time accumulate is called, so this
+    can be used as a reducer of StreamingMesh, where eigenvectors of
+    the whole mesh are never kept in memory.
+
+    mesh_object: Mesh, StreamingMesh, etc
+    compression: Compression filter of h5py, e.g., 'gzip' or 'lzf'.
+        None (default) gives uncompressed datasets.
+
+    """
+    def __init__(self,
+                 mesh_object,
+                 filename='mesh.hdf5',
+                 is_eigenvectors=True,
+                 compression=None,
+                 compression_opts=None):
+        self._mesh_object = mesh_object
+        self._filename = filename
+        self._is_eigenvectors = is_eigenvectors
+        self._compression = compression
+        self._compression_opts = compression_opts
+        self._file = None
+        self._q_count = 0
+
+    def is_eigenvectors(self):
+        return self._is_eigenvectors
+
+    def accumulate(self, frequencies, eigenvectors, weights):
+        if self._file is None:
+            self._open()
+        n = len(frequencies)
+        self._file['frequency'][self._q_count:(self._q_count + n)] = (
+            frequencies)
+        if self._is_eigenvectors:
+            self._file['eigenvector'][self._q_count:(self._q_count + n)] = (
+                eigenvectors)
+        self._q_count += n
+
+    def write_dataset(self, name, data):
+        if self._file is None:
+            self._open()
+        self._file.create_dataset(name,
+                                  data=data,
+                                  compression=self._compression,
+                                  compression_opts=self._compression_opts)
+
+    def finalize(self):
+        if self._file is None:
+            self._open()
+        self._file.close()
+        self._file = None
+
+    def _open(self):
+        import h5py
+
+        mesh = self._mesh_object
+        num_qpoints = len(mesh.get_qpoints())
+        num_band = mesh.get_dynamical_matrix().get_dimension()
+        self._file = h5py.File(self._filename, 'w')
+        self._file.create_dataset('mesh', data=mesh.get_mesh_numbers())
+        self._file.create_dataset('qpoint', data=mesh.get_qpoints())
+        self._file.create_dataset('weight', data=mesh.get_weights())
+        self._file.create_dataset(
+            'frequency',
+            (num_qpoints, num_band),
+            dtype='double',
+            chunks=(min(num_qpoints, max(1, 2 ** 16 // num_band)), num_band),
+            compression=self._compression,
+            compression_opts=self._compression_opts)
+        if self._is_eigenvectors:
+            dtype = "c%d" % (np.dtype('double').itemsize * 2)
+            self._file.create_dataset(
+                'eigenvector',
+                (num_qpoints, num_band, num_band),
+                dtype=dtype,
+                chunks=(1, num_band, num_band),
+                compression=self._compression,
+                compression_opts=self._compression_opts)
+        self._q_count = 0
+
+
+class MeshHdf5Reader(object):
+    """Lazy reader of mesh.hdf5
+
+    Only the requested part of a dataset is read from the file, e.g.,
+
+    with MeshHdf5Reader('mesh.hdf5') as mesh:
+        eigvecs = mesh.get_eigenvectors(q_indices=slice(0, 10),
+                                        band_indices=[0, 1, 2])
+
+    Indices are given as an integer, a slice, or a sequence of
+    integers. Band indices of eigenvectors are those of the last axis.
+
+    """
+    def __init__(self, filename='mesh.hdf5'):
+        import h5py
+        self._file = h5py.File(filename, 'r')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self._file.close()
+
+    def get_mesh_numbers(self):
+        return self._file['mesh'][:]
+
+    def get_qpoints(self, q_indices=None):
+        return self._read('qpoint', q_indices, None)
+
+    def get_weights(self, q_indices=None):
+        return self._read('weight', q_indices, None)
+
+    def get_frequencies(self, q_indices=None, band_indices=None):
+        return self._read('frequency', q_indices, band_indices)
+
+    def get_eigenvectors(self, q_indices=None, band_indices=None):
+        if 'eigenvector' not in self._file:
+            return None
+        return self._read('eigenvector', q_indices, band_indices)
+
+    def get_group_velocities(self, q_indices=None, band_indices=None):
+        if 'group_velocity' not in self._file:
+            return None
+        if band_indices is None:
+            return self._read('group_velocity', q_indices, None)
+        else:
+            return self._read('group_velocity', q_indices, None)[
+                ..., band_indices, :]
+
+    def get_number_of_qpoints(self):
+        return self._file['qpoint'].shape[0]
+
+    def _read(self, name, q_indices, band_indices):
+        dataset = self._file[name]
+        if q_indices is None:
+            _q_indices = slice(None)
+        elif isinstance(q_indices, (int, np.integer, slice)):
+            _q_indices = q_indices
+        else:
+            # h5py accepts only increasing sequence of indices.
+            _q_indices, order = np.unique(q_indices, return_inverse=True)
+        if band_indices is None:
+            data = dataset[_q_indices]
+        else:
+            try:
+                data = dataset[_q_indices, ..., band_indices]
+            except TypeError:
+                # Only one sequence of indices is accepted by h5py.
+                data = dataset[_q_indices][..., band_indices]
+        if q_indices is None or isinstance(q_indices,
+                                           (int, np.integer, slice)):
+            return data
+        else:
+            return data[order]
@@ -92,3 +92,57 @@ class PhononMoment(object):
                     moment += freq ** order * w * projection
         self._moment = np.array([np.sum((moment / norm0)[i * 3:(i + 1) * 3])
                                  for i in range(len(moment) // 3)]) / 3
+
+
+class PhononMomentReducer(object):
+    """Phonon moment accumulated chunk by chunk of q-points
+
+    This is used as a reducer of StreamingMesh. If freq_max is None,
+    frequencies are not bounded from above.
+    """
+    def __init__(self,
+                 order=1,
+                 freq_min=None,
+                 freq_max=None,
+                 is_projection=False,
+                 tolerance=1e-8):
+        self._order = order
+        self._is_projection = is_projection
+        if freq_min is None:
+            self._fmin = tolerance
+        else:
+            self._fmin = freq_min - tolerance
+        if freq_max is None:
+            self._fmax = None
+        else:
+            self._fmax = freq_max + tolerance
+        self._sum_moment = 0
+        self._norm0 = 0
+        self._moment = None
+
+    def get_moment(self):
+        return self._moment
+
+    def is_eigenvectors(self):
+        return self._is_projection
+
+    def accumulate(self, frequencies, eigenvectors, weights):
+        condition = self._fmin < frequencies
+        if self._fmax is not None:
+            condition &= frequencies < self._fmax
+        w_norm = condition * weights[:, None]
+        w_moment = np.where(condition, frequencies, 1) ** self._order * w_norm
+        if self._is_projection:
+            projection = np.abs(eigenvectors) ** 2
+            self._norm0 += np.einsum('qcb,qb->c', projection, w_norm)
+            self._sum_moment += np.einsum('qcb,qb->c', projection, w_moment)
+        else:
+            self._norm0 += w_norm.sum()
+            self._sum_moment += w_moment.sum()
+
+    def finalize(self):
+        moment = self._sum_moment / self._norm0
+        if self._is_projection:
+            self._moment = moment.reshape(-1, 3).sum(axis=1) / 3
+        else:
+            self._moment = moment
@@ -35,6 +35,9 @@
 import numpy as np
 import cmath
 from phonopy.units import VaspToTHz
+from phonopy.phonon.solver import (eigenvalues_to_frequencies,
+                                   solve_dynamical_matrices)
+from phonopy.phonon.yaml_format import BandYamlFormatter
 
 class QpointsPhonon(object):
     def __init__(self,
@@ -44,7 +47,8 @@ class QpointsPhonon(object):
                  is_eigenvectors=False,
                  group_velocity=None,
                  write_dynamical_matrices=False,
-                 factor=VaspToTHz):
+                 factor=VaspToTHz,
+                 use_lapack_solver=False):
         cell = dynamical_matrix.get_primitive()
         self._natom = cell.get_number_of_atoms()
         self._masses = cell.get_masses()
@@ -59,6 +63,7 @@ class QpointsPhonon(object):
         self._group_velocity = group_velocity
         self._write_dynamical_matrix = write_dynamical_matrices
         self._factor = factor
+        self._use_lapack_solver = use_lapack_solver
 
         self._gv = None
         self._dm = None
@@ -86,47 +91,45 @@ class QpointsPhonon(object):
                 w.create_dataset('dynamical_matrix', data=self._dm)
 
     def write_yaml(self):
-        w = open('qpoints.yaml', 'w')
-        w.write("nqpoint: %-7d\n" % len(self._qpoints))
-        w.write("natom:   %-7d\n" % self._natom)
         rec_lattice = np.linalg.inv(self._lattice) # column vectors
-        w.write("reciprocal_lattice:\n")
-        for vec, axis in zip(rec_lattice.T, ('a*', 'b*', 'c*')):
-            w.write("- [ %12.8f, %12.8f, %12.8f ] # %2s\n" %
-                    (tuple(vec) + (axis,)))
-        w.write("phonon:\n")
-    
-        for i, q in enumerate(self._qpoints):
-            w.write("- q-position: [ %12.7f, %12.7f, %12.7f ]\n" % tuple(q))
-            if self._write_dynamical_matrix:
-                w.write("  dynamical_matrix:\n")
-                for row in self._dm[i]:
-                    w.write("  - [ ")
-                    for j, elem in enumerate(row):
-                        w.write("%15.10f, %15.10f" % (elem.real, elem.imag))
-                        if j == len(row) - 1:
-                            w.write(" ]\n")
-                        else:
-                            w.write(", ")
-            
-            w.write("  band:\n")
-            for j, freq in enumerate(self._frequencies[i]):
-                w.write("  - # %d\n" % (j + 1))
-                w.write("    frequency: %15.10f\n" % freq)
-    
-                if self._gv is not None:
-                    w.write("    group_velocity: [ %13.7f, %13.7f, %13.7f ]\n" %
-                            tuple(self._gv[i, j]))
-    
-                if self._is_eigenvectors:
-                    w.write("    eigenvector:\n")
-                    for k in range(self._natom):
-                        w.write("    - # atom %d\n" % (k + 1))
-                        for l in (0, 1, 2):
-                            w.write("      - [ %17.14f, %17.14f ]\n" %
-                                    (self._eigenvectors[i][k * 3 + l, j].real,
-                                     self._eigenvectors[i][k * 3 + l, j].imag))
-            w.write("\n")
+        num_band = self._natom * 3
+        qpoint_format = "- q-position: [ %12.7f, %12.7f, %12.7f ]\n"
+        qpoint_values = [self._qpoints]
+        if self._write_dynamical_matrix:
+            qpoint_format += "  dynamical_matrix:\n"
+            qpoint_format += "".join(
+                ["  - [ " + ", ".join(["%15.10f, %15.10f"] * num_band) +
+                 " ]\n"] * num_band)
+            dm = np.array(self._dm)
+            qpoint_values.append(
+                np.stack((dm.real, dm.imag), axis=-1).reshape(len(dm), -1))
+        qpoint_format += "  band:\n"
+        formatter = BandYamlFormatter(num_band,
+                                      frequency_format="    frequency: %15.10f",
+                                      qpoint_format=qpoint_format,
+                                      end="\n\n",
+                                      is_group_velocity=(self._gv is not None),
+                                      is_eigenvectors=self._is_eigenvectors)
+
+        with open('qpoints.yaml', 'w') as w:
+            w.write("nqpoint: %-7d\n" % len(self._qpoints))
+            w.write("natom:   %-7d\n" % self._natom)
+            w.write("reciprocal_lattice:\n")
+            for vec, axis in zip(rec_lattice.T, ('a*', 'b*', 'c*')):
+                w.write("- [ %12.8f, %12.8f, %12.8f ] # %2s\n" %
+                        (tuple(vec) + (axis,)))
+            w.write("phonon:\n")
+
+            if self._is_eigenvectors:
+                eigvecs = self._eigenvectors
+            else:
+                eigvecs = None
+            for text in formatter.iter_texts(
+                    self._frequencies,
+                    group_velocities=self._gv,
+                    eigenvectors=eigvecs,
+                    qpoint_values=np.hstack(qpoint_values)):
+                w.write(text)
 
     def _run(self):
         if self._group_velocity is not None:
@@ -134,38 +137,22 @@ class QpointsPhonon(object):
                 self._qpoints, perturbation=self._nac_q_direction)
             self._gv = self._group_velocity.get_group_velocity()
 
+        dms = self._get_dynamical_matrices()
         if self._write_dynamical_matrix:
-            self._dm = []
+            self._dm = dms
+        eigvals, self._eigenvectors = solve_dynamical_matrices(
+            dms,
+            is_eigenvectors=self._is_eigenvectors,
+            use_lapack_solver=self._use_lapack_solver)
+        self._frequencies = eigenvalues_to_frequencies(eigvals,
+                                                       factor=self._factor)
 
-        self._frequencies = []
-        if self._is_eigenvectors:
-            self._eigenvectors = []
-            
-        for q in self._qpoints:
-            dm = self._get_dynamical_matrix(q)
-            if self._write_dynamical_matrix:
-                self._dm.append(dm)
-            if self._is_eigenvectors:
-                eigvals, eigvecs = np.linalg.eigh(dm)
-                self._eigenvectors.append(eigvecs)
-            else:
-                eigvals = np.linalg.eigvalsh(dm)
-            eigvals = eigvals.real
-            self._frequencies.append(np.sqrt(np.abs(eigvals)) *
-                                     np.sign(eigvals) * self._factor)
-            
-        self._frequencies = np.array(self._frequencies,
-                                     dtype='double', order='C')
-        dtype = "c%d" % (np.dtype('double').itemsize * 2)
-        self._eigenvectors = np.array(self._eigenvectors,
-                                      dtype=dtype, order='C')
-                
-    def _get_dynamical_matrix(self, q):
-        if self._nac_q_direction is not None and (np.abs(q) < 1e-5).all():
-            self._dynamical_matrix.set_dynamical_matrix(
-                q, q_direction=self._nac_q_direction)
+    def _get_dynamical_matrices(self):
+        if self._dynamical_matrix.is_nac():
+            self._dynamical_matrix.set_dynamical_matrices(
+                self._qpoints, q_direction=self._nac_q_direction)
         else:
-            self._dynamical_matrix.set_dynamical_matrix(q)
-        return self._dynamical_matrix.get_dynamical_matrix()
+            self._dynamical_matrix.set_dynamical_matrices(self._qpoints)
+        return self._dynamical_matrix.get_dynamical_matrices()
         
             
@@ -0,0 +1,511 @@
+# Copyright (C) 2017 Atsushi Togo
+# All rights reserved.
+#
+# This file is part of phonopy.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+#   notice, this list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in
+#   the documentation and/or other materials provided with the
+#   distribution.
+#
+# * Neither the name of the phonopy project nor the names of its
+#   contributors may be used to endorse or promote products derived
+#   from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import copy
+import numpy as np
+from phonopy.units import VaspToTHz
+
+# Upper limit of memory used by a chunk of dynamical matrices (in bytes)
+# when chunk_size is not specified.
+default_chunk_memory = 2 ** 27
+
+
+def get_chunk_size(num_band, chunk_size=None):
+    """Number of q-points solved at once
+
+    When chunk_size is None, the number of q-points is chosen so that
+    a stack of complex dynamical matrices fits in default_chunk_memory.
+    """
+    if chunk_size is not None:
+        return max(1, int(chunk_size))
+    dm_size = num_band ** 2 * np.dtype('complex128').itemsize
+    return max(1, default_chunk_memory // dm_size)
+
+
+def eigenvalues_to_frequencies(eigenvalues, factor=VaspToTHz):
+    return np.array(np.sqrt(abs(eigenvalues)) * np.sign(eigenvalues),
+                    dtype='double', order='C') * factor
+
+
+def iter_phonon_chunks(dynamical_matrix,
+                       qpoints,
+                       is_eigenvectors=False,
+                       nac_q_direction=None,
+                       chunk_size=None,
+                       use_lapack_solver=False):
+    """Solve dynamical matrices chunk by chunk of q-points
+
+    Dynamical matrices of a chunk of q-points are stacked and
+    diagonalized by numpy.linalg.eigh (or eigvalsh) at once. With
+    use_lapack_solver=True, dynamical matrices are built and
+    diagonalized by LAPACK in C (see run_lapack_solver).
+
+    Yields
+    ------
+    (index of first q-point in chunk, eigenvalues, eigenvectors)
+       eigenvalues: shape=(len(chunk), num_band)
+       eigenvectors: shape=(len(chunk), num_band, num_band) or None
+    """
+    num_band = dynamical_matrix.get_dimension()
+    num_qpoints = len(qpoints)
+    size = get_chunk_size(num_band, chunk_size=chunk_size)
+    for i in range(0, num_qpoints, size):
+        if use_lapack_solver:
+            eigvals, eigvecs = run_lapack_solver(
+                dynamical_matrix,
+                qpoints[i:(i + size)],
+                nac_q_direction=nac_q_direction)
+            if not is_eigenvectors:
+                eigvecs = None
+        else:
+            dms = _get_dynamical_matrices(dynamical_matrix,
+                                          qpoints[i:(i + size)],
+                                          nac_q_direction)
+            eigvals, eigvecs = solve_dynamical_matrices(
+                dms, is_eigenvectors=is_eigenvectors)
+        yield i, eigvals, eigvecs
+
+
+def solve_phonons(dynamical_matrix,
+                  qpoints,
+                  is_eigenvectors=False,
+                  nac_q_direction=None,
+                  chunk_size=None,
+                  use_lapack_solver=False):
+    """Eigenvalues (and eigenvectors) of dynamical matrices at q-points
+
+    Returns
+    -------
+    (eigenvalues, eigenvectors)
+       eigenvalues: shape=(num_qpoints, num_band)
+       eigenvectors: shape=(num_qpoints, num_band, num_band) or None
+    """
+    num_band = dynamical_matrix.get_dimension()
+    num_qpoints = len(qpoints)
+    eigenvalues = np.zeros((num_qpoints, num_band), dtype='double')
+    if is_eigenvectors:
+        dtype = "c%d" % (np.dtype('double').itemsize * 2)
+        eigenvectors = np.zeros((num_qpoints, num_band, num_band),
+                                dtype=dtype)
+    else:
+        eigenvectors = None
+
+    for i, eigvals, eigvecs in iter_phonon_chunks(
+            dynamical_matrix,
+            qpoints,
+            is_eigenvectors=is_eigenvectors,
+            nac_q_direction=nac_q_direction,
+            chunk_size=chunk_size,
+            use_lapack_solver=use_lapack_solver):
+        eigenvalues[i:(i + len(eigvals))] = eigvals
+        if is_eigenvectors:
+            eigenvectors[i:(i + len(eigvals))] = eigvecs
+
+    return eigenvalues, eigenvectors
+
+
+def solve_phonons_in_pool(dynamical_matrix,
+                          qpoints,
+                          nprocs,
+                          is_eigenvectors=False,
+                          nac_q_direction=None,
+                          chunk_size=None,
+                          use_lapack_solver=False):
+    """Solve phonons at q-points by a pool of processes
+
+    q-points are split into chunks and each chunk is solved by
+    solve_phonons in one of nprocs worker processes. The arrays of
+    the dynamical matrix and its primitive cell, e.g., force constants
+    and smallest vectors, are copied once into shared memory arrays,
+    and each worker rebuilds the dynamical matrix on them. Therefore
+    force constants are not pickled for each worker even when worker
+    processes are spawned. Eigenvalues and eigenvectors are written by
+    the workers directly into shared memory arrays, so the results are
+    returned in the order of the q-points without being pickled.
+
+    To avoid oversubscription of cores by nprocs workers each running
+    multithreaded OpenMP or BLAS, the workers are limited to a single
+    thread (see _limit_worker_threads).
+
+    Returns
+    -------
+    Same as solve_phonons.
+    """
+    import multiprocessing
+    from multiprocessing.sharedctypes import RawArray
+
+    num_band = dynamical_matrix.get_dimension()
+    _qpoints = np.array(np.reshape(qpoints, (-1, 3)),
+                        dtype='double', order='C')
+    num_qpoints = len(_qpoints)
+    nprocs = max(1, min(int(nprocs), num_qpoints))
+    size = min(get_chunk_size(num_band, chunk_size=chunk_size),
+               (num_qpoints + nprocs - 1) // nprocs)
+    size = max(1, size)
+
+    shared_eigenvalues = RawArray('d', num_qpoints * num_band)
+    if is_eigenvectors:
+        shared_eigenvectors = RawArray('d', num_qpoints * num_band ** 2 * 2)
+    else:
+        shared_eigenvectors = None
+
+    light_dynamical_matrix, shared_arrays, shared_attributes = (
+        _get_light_dynamical_matrix(dynamical_matrix))
+    pool = multiprocessing.Pool(
+        processes=nprocs,
+        initializer=_init_pool_worker,
+        initargs=(light_dynamical_matrix,
+                  shared_arrays,
+                  shared_attributes,
+                  _qpoints,
+                  shared_eigenvalues,
+                  shared_eigenvectors,
+                  nac_q_direction,
+                  chunk_size,
+                  use_lapack_solver))
+    try:
+        pool.map(_solve_phonons_in_pool_worker,
+                 [(i, min(i + size, num_qpoints))
+                  for i in range(0, num_qpoints, size)])
+    finally:
+        # Workers are idle after map returns, and they are stopped also
+        # when map is interrupted.
+        pool.terminate()
+        pool.join()
+
+    eigenvalues, eigenvectors = _get_shared_phonon_arrays(
+        shared_eigenvalues, shared_eigenvectors, num_qpoints, num_band)
+    return eigenvalues, eigenvectors
+
+
+def solve_dynamical_matrices(dynamical_matrices,
+                             is_eigenvectors=False,
+                             use_lapack_solver=False,
+                             lapack_zheev_uplo='L',
+                             lapack_solver='zheevd'):
+    """Diagonalize a stack of dynamical matrices
+
+    Returns
+    -------
+    (eigenvalues, eigenvectors)
+       eigenvectors is None unless is_eigenvectors=True.
+    """
+    if use_lapack_solver:
+        lapackpy = _import_lapackpy()
+        use_lapack_solver = lapackpy is not None
+
+    if use_lapack_solver:
+        shape = dynamical_matrices.shape
+        eigvals = np.zeros(shape[:2], dtype='double')
+        eigvecs = np.array(dynamical_matrices, dtype='c16', order='C')
+        lapackpy.phonons_from_dynamical_matrices(
+            eigvals,
+            eigvecs.view(dtype='double'),
+            lapack_zheev_uplo,
+            _get_lapack_algorithm(lapack_solver))
+        if not is_eigenvectors:
+            eigvecs = None
+    elif is_eigenvectors:
+        eigvals, eigvecs = np.linalg.eigh(dynamical_matrices)
+    else:
+        eigvals = np.linalg.eigvalsh(dynamical_matrices)
+        eigvecs = None
+    return eigvals.real, eigvecs
+
+
+def run_lapack_solver(dynamical_matrix,
+                      qpoints,
+                      nac_q_direction=None,
+                      lapack_zheev_uplo='L',
+                      lapack_solver='zheevd'):
+    """Phonons at q-points by LAPACK zheev or zheevd called in C
+
+    Dynamical matrices are built and diagonalized at each q-point in
+    an OpenMP loop over q-points. NAC by Wang's method is included in
+    this loop. For Gonze's method, sparse force constants, or when
+    decimals of dynamical matrix are specified, dynamical matrices are
+    built in python and only diagonalization is done in C. If
+    phonopy._lapackpy is not built (it requires LAPACK library at
+    installation, see setup.py), numpy.linalg.eigh is used with a
+    warning.
+
+    lapack_zheev_uplo: 'L' or 'U'
+    lapack_solver: 'zheevd' or 'zheev'
+
+    Returns
+    -------
+    (eigenvalues, eigenvectors)
+       eigenvalues: shape=(num_qpoints, num_band)
+       eigenvectors: shape=(num_qpoints, num_band, num_band)
+    """
+    lapackpy = _import_lapackpy()
+    if lapackpy is None:
+        dms = _get_dynamical_matrices(dynamical_matrix,
+                                      qpoints,
+                                      nac_q_direction)
+        return solve_dynamical_matrices(dms, is_eigenvectors=True)
+
+    is_nac = dynamical_matrix.is_nac()
+    if ((is_nac and dynamical_matrix.get_nac_method() != 'wang') or
+        dynamical_matrix.is_sparse_fc() or
+        dynamical_matrix.get_decimals() is not None):
+        dms = _get_dynamical_matrices(dynamical_matrix,
+                                      qpoints,
+                                      nac_q_direction)
+        return solve_dynamical_matrices(dms,
+                                        is_eigenvectors=True,
+                                        use_lapack_solver=True,
+                                        lapack_zheev_uplo=lapack_zheev_uplo,
+                                        lapack_solver=lapack_solver)
+
+    _qpoints = np.array(np.reshape(qpoints, (-1, 3)),
+                        dtype='double', order='C')
+    num_band = dynamical_matrix.get_dimension()
+    primitive = dynamical_matrix.get_primitive()
+    svecs, multiplicity = dynamical_matrix.get_shortest_vectors()
+    fc_s2p_map, fc_p2s_map = dynamical_matrix.get_fc_index_maps()
+    rec_lattice = np.array(np.linalg.inv(primitive.get_cell()),
+                           dtype='double', order='C')
+    eigvals = np.zeros((len(_qpoints), num_band), dtype='double')
+    dtype = "c%d" % (np.dtype('double').itemsize * 2)
+    eigvecs = np.zeros((len(_qpoints), num_band, num_band), dtype=dtype)
+
+    if is_nac:
+        born = dynamical_matrix.get_born_effective_charges()
+        dielectric = dynamical_matrix.get_dielectric_constant()
+        nac_factor = dynamical_matrix.get_nac_factor()
+        if nac_q_direction is None:
+            q_dir = None
+        else:
+            q_dir = np.array(nac_q_direction, dtype='double', order='C')
+    else:
+        born = None
+        dielectric = None
+        nac_factor = 0
+        q_dir = None
+
+    lapackpy.phonons_at_qpoints(
+        eigvals,
+        eigvecs.view(dtype='double'),
+        _qpoints,
+        dynamical_matrix.get_force_constants(),
+        svecs,
+        multiplicity,
+        primitive.get_masses(),
+        fc_s2p_map,
+        fc_p2s_map,
+        born,
+        dielectric,
+        rec_lattice,
+        q_dir,
+        nac_factor,
+        dynamical_matrix.get_symprec(),
+        lapack_zheev_uplo,
+        _get_lapack_algorithm(lapack_solver))
+
+    return eigvals, eigvecs
+
+
+def _get_dynamical_matrices(dynamical_matrix, qpoints, nac_q_direction):
+    if dynamical_matrix.is_nac():
+        dynamical_matrix.set_dynamical_matrices(qpoints,
+                                                q_direction=nac_q_direction)
+    else:
+        dynamical_matrix.set_dynamical_matrices(qpoints)
+    return dynamical_matrix.get_dynamical_matrices()
+
+
+def _import_lapackpy():
+    try:
+        import phonopy._lapackpy as lapackpy
+    except ImportError:
+        import warnings
+        warnings.warn("phonopy._lapackpy is not built, and "
+                      "numpy.linalg.eigh is used instead of LAPACK solver. "
+                      "LAPACK library has to be found by setup.py "
+                      "to build it.")
+        return None
+    return lapackpy
+
+
+def _get_lapack_algorithm(lapack_solver):
+    if lapack_solver == 'zheevd':
+        return 'd'
+    elif lapack_solver == 'zheev':
+        return 'v'
+    else:
+        raise ValueError("lapack_solver has to be 'zheev' or 'zheevd'.")
+
+
+# Data given to each worker process of solve_phonons_in_pool
+_pool_worker_data = {}
+
+# Environment variables of numbers of OpenMP and BLAS threads
+_thread_number_variables = ('OMP_NUM_THREADS',
+                            'OPENBLAS_NUM_THREADS',
+                            'MKL_NUM_THREADS')
+
+
+def _get_light_dynamical_matrix(dynamical_matrix):
+    """Copy of dynamical matrix whose arrays are moved to shared memory
+
+    Arrays given as attributes of the dynamical matrix and its
+    primitive cell are copied into RawArrays once, and they are
+    removed from a shallow copy of the dynamical matrix. Arrays shared
+    by several attributes are copied only once.
+
+    Returns
+    -------
+    (light dynamical matrix, shared arrays, shared attributes)
+       shared arrays: List of (RawArray, dtype, shape)
+       shared attributes: List of (owner, attribute name, index of
+           shared arrays), where owner is None for dynamical matrix or
+           the attribute name of primitive cell.
+    """
+    from multiprocessing.sharedctypes import RawArray
+
+    light_dynamical_matrix = copy.copy(dynamical_matrix)
+    light_dynamical_matrix._dynamical_matrix = None
+    light_dynamical_matrix._dynamical_matrices = None
+    light_dynamical_matrix._pcell = copy.copy(dynamical_matrix._pcell)
+    shared_arrays = []
+    shared_attributes = []
+    array_indices = {}
+    for owner, obj in ((None, light_dynamical_matrix),
+                       ('_pcell', light_dynamical_matrix._pcell)):
+        for name, value in list(obj.__dict__.items()):
+            if (not isinstance(value, np.ndarray) or
+                value.dtype.hasobject or value.size == 0):
+                continue
+            if id(value) not in array_indices:
+                shared = RawArray('b', value.nbytes)
+                np.frombuffer(shared, dtype=value.dtype)[:] = value.ravel()
+                array_indices[id(value)] = len(shared_arrays)
+                shared_arrays.append((shared, value.dtype.str, value.shape))
+            setattr(obj, name, None)
+            shared_attributes.append((owner, name, array_indices[id(value)]))
+    return light_dynamical_matrix, shared_arrays, shared_attributes
+
+
+def _set_shared_arrays(light_dynamical_matrix,
+                       shared_arrays,
+                       shared_attributes):
+    arrays = [np.frombuffer(shared, dtype=dtype).reshape(shape)
+              for shared, dtype, shape in shared_arrays]
+    for owner, name, index in shared_attributes:
+        if owner is None:
+            obj = light_dynamical_matrix
+        else:
+            obj = getattr(light_dynamical_matrix, owner)
+        setattr(obj, name, arrays[index])
+
+
+def _init_pool_worker(light_dynamical_matrix,
+                      shared_arrays,
+                      shared_attributes,
+                      qpoints,
+                      shared_eigenvalues,
+                      shared_eigenvectors,
+                      nac_q_direction,
+                      chunk_size,
+                      use_lapack_solver):
+    _limit_worker_threads()
+    _set_shared_arrays(light_dynamical_matrix,
+                       shared_arrays,
+                       shared_attributes)
+    dynamical_matrix = light_dynamical_matrix
+    num_band = dynamical_matrix.get_dimension()
+    eigenvalues, eigenvectors = _get_shared_phonon_arrays(
+        shared_eigenvalues, shared_eigenvectors, len(qpoints), num_band)
+    _pool_worker_data.update({'dynamical_matrix': dynamical_matrix,
+                              'qpoints': qpoints,
+                              'eigenvalues': eigenvalues,
+                              'eigenvectors': eigenvectors,
+                              'nac_q_direction': nac_q_direction,
+                              'chunk_size': chunk_size,
+                              'use_lapack_solver': use_lapack_solver})
+
+
+def _limit_worker_threads():
+    """Run OpenMP and BLAS in a single thread in a pool worker
+
+    The environment variables take effect for libraries loaded after
+    this, e.g., in spawned worker processes. Thread pools of libraries
+    already loaded in forked worker processes are limited by
+    threadpoolctl when it is installed. Without threadpoolctl, BLAS
+    loaded by numpy in the parent process keeps its number of threads
+    in forked workers, and it has to be limited by setting the
+    environment variables before starting python.
+    """
+    for name in _thread_number_variables:
+        os.environ[name] = '1'
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        return
+    threadpool_limits(limits=1)
+
+
+def _solve_phonons_in_pool_worker(i_range):
+    i_start, i_end = i_range
+    data = _pool_worker_data
+    is_eigenvectors = data['eigenvectors'] is not None
+    for i, eigvals, eigvecs in iter_phonon_chunks(
+            data['dynamical_matrix'],
+            data['qpoints'][i_start:i_end],
+            is_eigenvectors=is_eigenvectors,
+            nac_q_direction=data['nac_q_direction'],
+            chunk_size=data['chunk_size'],
+            use_lapack_solver=data['use_lapack_solver']):
+        i_q = i_start + i
+        data['eigenvalues'][i_q:(i_q + len(eigvals))] = eigvals
+        if is_eigenvectors:
+            data['eigenvectors'][i_q:(i_q + len(eigvals))] = eigvecs
+    return i_start
+
+
+def _get_shared_phonon_arrays(shared_eigenvalues,
+                              shared_eigenvectors,
+                              num_qpoints,
+                              num_band):
+    eigenvalues = np.frombuffer(shared_eigenvalues, dtype='double').reshape(
+        num_qpoints, num_band)
+    if shared_eigenvectors is None:
+        eigenvectors = None
+    else:
+        dtype = "c%d" % (np.dtype('double').itemsize * 2)
+        eigenvectors = np.frombuffer(shared_eigenvectors, dtype=dtype).reshape(
+            num_qpoints, num_band, num_band)
+    return eigenvalues, eigenvectors
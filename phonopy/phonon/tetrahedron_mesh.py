@@ -115,9 +115,9 @@ class TetrahedronMesh(object):
                  grid_order=None,
                  lang='C'):
         self._cell = cell
-        self._frequencies = frequencies
+        self._frequencies = np.array(frequencies, dtype='double', order='C')
         self._mesh = np.array(mesh, dtype='intc')
-        self._grid_address = grid_address
+        self._grid_address = np.array(grid_address, dtype='intc', order='C')
         self._grid_mapping_table = grid_mapping_table
         self._lang = lang
         if lang == 'C':
@@ -151,12 +151,10 @@ class TetrahedronMesh(object):
             raise StopIteration
         else:
             gp = self._ir_grid_points[self._grid_point_count]
-            self._set_tetrahedra_frequencies(gp)
-            for ib, frequencies in enumerate(self._tetrahedra_frequencies):
-                self._tm.set_tetrahedra_omegas(frequencies)
-                self._tm.run(self._frequency_points, value=self._value)
-                iw = self._tm.get_integration_weight()
-                self._integration_weights[:, ib] = iw
+            if self._lang == 'C':
+                self._set_integration_weights_c(gp)
+            else:
+                self._set_integration_weights_py(gp)
             self._integration_weights /= np.prod(self._mesh)
             self._grid_point_count += 1
             return self._integration_weights
@@ -193,17 +191,45 @@ class TetrahedronMesh(object):
                                              dtype='double')
         reciprocal_lattice = np.linalg.inv(self._cell.get_cell())
         self._tm = TetrahedronMethod(reciprocal_lattice, mesh=self._mesh)
-        self._relative_grid_address = self._tm.get_tetrahedra()
+        self._relative_grid_address = np.array(self._tm.get_tetrahedra(),
+                                               dtype='intc', order='C')
 
     def _prepare(self):
-        ir_gp_indices = {}
-        for i, gp in enumerate(self._ir_grid_points):
-            ir_gp_indices[gp] = i
+        # Indices of ir-grid-points in self._ir_grid_points to which
+        # grid points are mapped
+        sorter = np.argsort(self._ir_grid_points)
+        indices = np.searchsorted(self._ir_grid_points,
+                                  self._grid_mapping_table,
+                                  sorter=sorter)
+        self._gp_ir_index = np.array(sorter[indices], dtype='intc')
+
+    def _set_integration_weights_c(self, gp):
+        """Integration weights of all bands at grid point in one call"""
+        try:
+            import phonopy._phonopy as phonoc
+        except ImportError:
+            self._set_integration_weights_py(gp)
+            return
+
+        phonoc.tetrahedron_mesh_integration_weights(
+            self._integration_weights,
+            self._frequency_points,
+            gp,
+            self._mesh,
+            self._grid_address,
+            self._gp_ir_index,
+            self._relative_grid_address,
+            self._frequencies,
+            self._value)
+
+    def _set_integration_weights_py(self, gp):
+        self._set_tetrahedra_frequencies(gp)
+        for ib, frequencies in enumerate(self._tetrahedra_frequencies):
+            self._tm.set_tetrahedra_omegas(frequencies)
+            self._tm.run(self._frequency_points, value=self._value)
+            iw = self._tm.get_integration_weight()
+            self._integration_weights[:, ib] = iw
 
-        self._gp_ir_index = np.zeros_like(self._grid_mapping_table)
-        for i, gp in enumerate(self._grid_mapping_table):
-            self._gp_ir_index[i] = ir_gp_indices[gp]
-        
     def _set_tetrahedra_frequencies(self, gp):
         self._tetrahedra_frequencies = get_tetrahedra_frequencies(
             gp,
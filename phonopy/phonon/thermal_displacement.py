@@ -293,6 +293,127 @@ class ThermalDisplacementMatrices(ThermalMotion):
                              m[1, 2], m[0, 2], m[0, 1], j + 1))
             w.write("\n".join(lines))
 
+class ThermalDisplacementsReducer(ThermalMotion):
+    """Mean square displacements accumulated chunk by chunk of q-points
+
+    This is used as a reducer of StreamingMesh with
+    is_mesh_symmetry=False. Temperatures have to be set before running
+    the mesh.
+    """
+    def __init__(self,
+                 masses,
+                 projection_direction=None,
+                 cutoff_frequency=None):
+        if projection_direction is None:
+            self._projection_direction = None
+        else:
+            self._projection_direction = (projection_direction /
+                                          np.linalg.norm(projection_direction))
+
+        ThermalMotion.__init__(self,
+                               masses,
+                               cutoff_frequency=cutoff_frequency)
+
+        self._displacements = None
+        self._sum_weights = 0
+
+    def get_thermal_displacements(self):
+        return (self._temperatures, self._displacements)
+
+    def is_eigenvectors(self):
+        return True
+
+    def accumulate(self, frequencies, eigenvectors, weights):
+        if self._projection_direction is not None:
+            masses = self._masses
+            shape = eigenvectors.shape
+            vecs2 = np.abs(np.dot(
+                eigenvectors.reshape(shape[0], -1, 3, shape[2]).swapaxes(2, 3),
+                self._projection_direction)) ** 2
+        else:
+            masses = self._masses3
+            vecs2 = np.abs(eigenvectors) ** 2
+        if self._displacements is None:
+            self._displacements = np.zeros(
+                (len(self._temperatures), len(masses)), dtype=float)
+
+        condition = frequencies > self._cutoff_frequency
+        freqs = np.where(condition, frequencies, 1)
+        w_vecs2 = vecs2 / masses[:, None] * weights[:, None, None]
+        for i, t in enumerate(self._temperatures):
+            Q2 = np.where(condition, self.get_Q2(freqs, t), 0)
+            self._displacements[i] += np.einsum('qcb,qb->c', w_vecs2, Q2)
+        self._sum_weights += np.sum(weights)
+
+    def finalize(self):
+        self._displacements /= self._sum_weights
+
+
+class ThermalDisplacementMatricesReducer(ThermalMotion):
+    """Thermal displacement matrices accumulated chunk by chunk of q-points
+
+    This is used as a reducer of StreamingMesh with
+    is_mesh_symmetry=False. Temperatures have to be set before running
+    the mesh.
+    """
+    def __init__(self,
+                 masses,
+                 cutoff_frequency=None,
+                 lattice=None): # column vectors in real space
+
+        ThermalMotion.__init__(self,
+                               masses,
+                               cutoff_frequency=cutoff_frequency)
+
+        self._disp_matrices = None
+        self._disp_matrices_cif = None
+        self._sum_weights = 0
+
+        if lattice is not None:
+            A = lattice
+            N = np.diag([np.linalg.norm(x) for x in np.linalg.inv(A)])
+            self._ANinv = np.linalg.inv(np.dot(A, N))
+        else:
+            self._ANinv = None
+
+    def get_thermal_displacement_matrices(self):
+        return (self._temperatures, self._disp_matrices)
+
+    def get_thermal_displacement_matrices_cif(self):
+        return (self._temperatures, self._disp_matrices_cif)
+
+    def is_eigenvectors(self):
+        return True
+
+    def accumulate(self, frequencies, eigenvectors, weights):
+        if self._disp_matrices is None:
+            self._disp_matrices = np.zeros(
+                (len(self._temperatures), len(self._masses), 3, 3),
+                dtype=complex)
+
+        shape = eigenvectors.shape
+        vecs = eigenvectors.reshape(shape[0], -1, 3, shape[2])
+        condition = frequencies > self._cutoff_frequency
+        freqs = np.where(condition, frequencies, 1)
+        np.seterr(over=self._np_overflow)
+        for i, t in enumerate(self._temperatures):
+            Q2 = np.where(condition, self.get_Q2(freqs, t), 0)
+            self._disp_matrices[i] += np.einsum(
+                'qb,qaib,qajb->aij', Q2 * weights[:, None], vecs, vecs.conj())
+        np.seterr(over=None)
+        self._sum_weights += np.sum(weights)
+
+    def finalize(self):
+        self._disp_matrices /= self._sum_weights
+        self._disp_matrices /= self._masses[None, :, None, None]
+
+        if self._ANinv is not None:
+            self._disp_matrices_cif = np.array(
+                [[np.dot(np.dot(self._ANinv, mat.real), self._ANinv.T)
+                  for mat in matrices] for matrices in self._disp_matrices],
+                dtype='double')
+
+
 class ThermalDistances(ThermalMotion):
     def __init__(self,
                  frequencies, # Have to be supplied in THz
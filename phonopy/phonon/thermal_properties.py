@@ -54,6 +54,37 @@ def mode_ZPE(temp, freqs):
 def mode_zero(temp, freqs):
     return 0
 
+def get_temperature_range(t_min=None, t_max=None, t_step=None):
+    """Temperatures from t_min to t_max by t_step in K"""
+    if t_min is None:
+        _t_min = 10
+    elif t_min < 0:
+        _t_min = 0
+    else:
+        _t_min = t_min
+
+    if t_max is None:
+        _t_max = 1000
+    elif t_max > _t_min:
+        _t_max = t_max
+    else:
+        _t_max = _t_min
+
+    if t_step is None:
+        _t_step = 10
+    elif t_step > 0:
+        _t_step = t_step
+    else:
+        _t_step = 10
+
+    return np.arange(_t_min, _t_max + _t_step / 2.0, _t_step, dtype='double')
+
+def get_temperatures(temperatures):
+    """Temperatures with negative values removed"""
+    t_array = np.array(temperatures)
+    condition = np.logical_not(t_array < 0)
+    return np.extract(condition, t_array)
+
 class ThermalPropertiesBase(object):
     def __init__(self,
                  frequencies,
@@ -180,34 +211,12 @@ class ThermalProperties(ThermalPropertiesBase):
         return self._high_T_entropy
 
     def set_temperature_range(self, t_min=None, t_max=None, t_step=None):
-        if t_min is None:
-            _t_min = 10
-        elif t_min < 0:
-            _t_min = 0
-        else:
-            _t_min = t_min
-
-        if t_max is None:
-            _t_max = 1000
-        elif t_max > _t_min:
-            _t_max = t_max
-        else:
-            _t_max = _t_min
-
-        if t_step is None:
-            _t_step = 10
-        elif t_step > 0:
-            _t_step = t_step
-        else:
-            _t_step = 10
-
-        self._temperatures = np.arange(_t_min, _t_max + _t_step / 2.0, _t_step,
-                                       dtype='double')
+        self._temperatures = get_temperature_range(t_min=t_min,
+                                                   t_max=t_max,
+                                                   t_step=t_step)
 
     def set_temperatures(self, temperatures):
-        t_array = np.array(temperatures)
-        condition = np.logical_not(t_array < 0)
-        self._temperatures = np.extract(condition, t_array)
+        self._temperatures = get_temperatures(temperatures)
 
     def plot(self, pyplot):
         temps, fe, entropy, cv = self._thermal_properties
@@ -383,3 +392,148 @@ class ThermalProperties(ThermalPropertiesBase):
             zp_energy += np.sum(positive_fs) * w / 2
         self._high_T_entropy = entropy * Kb / np.sum(self._weights) * EvTokJmol
         self._zero_point_energy = zp_energy / np.sum(self._weights) * EvTokJmol
+
+
+class ThermalPropertiesReducer(object):
+    """Thermal properties accumulated chunk by chunk of q-points
+
+    This is used as a reducer of StreamingMesh. Temperatures have to be
+    set by set_temperature_range or set_temperatures before running the
+    mesh. Results are given in the same units as ThermalProperties.
+    """
+    def __init__(self,
+                 is_projection=False,
+                 cutoff_frequency=None,
+                 pretend_real=False):
+        self._is_projection = is_projection
+        self._cutoff_frequency = cutoff_frequency
+        self._pretend_real = pretend_real
+        self._temperatures = None
+
+        self._props = None
+        self._projected_props = None
+        self._zero_point_energy = 0.0
+        self._high_T_entropy = 0.0
+        self._num_modes = 0
+        self._num_integrated_modes = 0
+        self._sum_weights = 0
+
+        self._thermal_properties = None
+        self._projected_thermal_properties = None
+
+    def get_temperatures(self):
+        return self._temperatures
+
+    def set_temperature_range(self, t_min=None, t_max=None, t_step=None):
+        self._temperatures = get_temperature_range(t_min=t_min,
+                                                   t_max=t_max,
+                                                   t_step=t_step)
+
+    def set_temperatures(self, temperatures):
+        self._temperatures = get_temperatures(temperatures)
+
+    def get_number_of_integrated_modes(self):
+        return self._num_integrated_modes
+
+    def get_number_of_modes(self):
+        return self._num_modes
+
+    def get_zero_point_energy(self):
+        return self._zero_point_energy
+
+    def get_high_T_entropy(self):
+        return self._high_T_entropy
+
+    def get_thermal_properties(self):
+        return self._thermal_properties
+
+    def get_projected_thermal_properties(self):
+        return self._projected_thermal_properties
+
+    def is_eigenvectors(self):
+        return self._is_projection
+
+    def accumulate(self, frequencies, eigenvectors, weights):
+        if self._pretend_real:
+            freqs = abs(frequencies)
+        elif self._cutoff_frequency is not None:
+            freqs = np.where(frequencies > self._cutoff_frequency,
+                             frequencies, -1)
+        else:
+            freqs = frequencies
+        freqs = np.array(freqs, dtype='double', order='C') * THzToEv
+        weights = np.array(weights, dtype='intc')
+        condition = freqs > 0
+        # Dummy value 1 is set to frequencies that are not integrated.
+        positive_fs = np.where(condition, freqs, 1)
+
+        if self._props is None:
+            self._props = np.zeros((len(self._temperatures), 3),
+                                   dtype='double')
+        self._sum_weights += weights.sum()
+        self._num_modes += freqs.shape[1] * weights.sum()
+        self._num_integrated_modes += np.sum(weights * condition.sum(axis=1))
+        self._zero_point_energy += np.dot(
+            weights, np.where(condition, positive_fs, 0).sum(axis=1)) / 2
+        self._high_T_entropy -= np.dot(
+            weights, np.where(condition, np.log(positive_fs), 0).sum(axis=1))
+
+        try:
+            import phonopy._phonopy as phonoc
+            props = np.zeros((len(self._temperatures), 3),
+                             dtype='double', order='C')
+            phonoc.thermal_properties(props,
+                                      self._temperatures,
+                                      freqs,
+                                      weights)
+            self._props += props * weights.sum()
+        except ImportError:
+            for i, t in enumerate(self._temperatures):
+                if t > 0:
+                    for j, func in enumerate((mode_F, mode_S, mode_cv)):
+                        vals = np.where(condition, func(t, positive_fs), 0)
+                        self._props[i, j] += np.dot(weights, vals.sum(axis=1))
+                    self._props[i, 0] -= np.dot(
+                        weights,
+                        np.where(condition, positive_fs, 0).sum(axis=1)) / 2
+
+        if self._is_projection:
+            self._accumulate_projection(condition,
+                                        positive_fs,
+                                        eigenvectors,
+                                        weights)
+
+    def finalize(self):
+        self._high_T_entropy *= Kb / self._sum_weights * EvTokJmol
+        self._zero_point_energy *= EvTokJmol / self._sum_weights
+        props = self._props / self._sum_weights * EvTokJmol
+        self._thermal_properties = [self._temperatures,
+                                    props[:, 0] + self._zero_point_energy,
+                                    props[:, 1] * 1000,
+                                    props[:, 2] * 1000]
+        if self._is_projection:
+            props = self._projected_props / self._sum_weights * EvTokJmol
+            self._projected_thermal_properties = [self._temperatures,
+                                                  props[:, 0],
+                                                  props[:, 1] * 1000,
+                                                  props[:, 2] * 1000]
+
+    def _accumulate_projection(self,
+                               condition,
+                               positive_fs,
+                               eigenvectors,
+                               weights):
+        num_band = positive_fs.shape[1]
+        if self._projected_props is None:
+            self._projected_props = np.zeros(
+                (len(self._temperatures), 3, num_band), dtype='double')
+        w_eigvecs2 = np.abs(eigenvectors) ** 2 * weights[:, None, None]
+        for i, t in enumerate(self._temperatures):
+            if t > 0:
+                funcs = (mode_F, mode_S, mode_cv)
+            else:
+                funcs = (mode_ZPE, mode_zero, mode_zero)
+            for j, func in enumerate(funcs):
+                vals = np.where(condition, func(t, positive_fs), 0)
+                self._projected_props[i, j] += np.einsum(
+                    'qcb,qb->c', w_eigvecs2, vals)
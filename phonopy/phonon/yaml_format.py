@@ -0,0 +1,284 @@
+# Copyright (C) 2017 Atsushi Togo
+# All rights reserved.
+#
+# This file is part of phonopy.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+#   notice, this list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in
+#   the documentation and/or other materials provided with the
+#   distribution.
+#
+# * Neither the name of the phonopy project nor the names of its
+#   contributors may be used to endorse or promote products derived
+#   from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import re
+import numpy as np
+
+
+class FixedWidthFormatter(object):
+    """Formatter of many texts that share one layout
+
+    The layout is given by a python format string whose conversion
+    specifiers are only "%W.Pf", "%Wd" and "%-Wd". Values of many texts
+    are formatted at once into the fixed-width fields of the layout,
+    floating point numbers by the C extension (format_fixed_width) and
+    integers from a table of their distinct values. When this is not
+    possible, e.g., a value does not fit in its field, the texts are
+    made by python string formatting. In both cases, the texts are
+    identical to those made by python string formatting.
+
+    """
+    def __init__(self, template):
+        self._template = template
+        self._parts = self._get_parts(template)
+        self._text = None
+        self._fields = None
+
+    def get_length(self):
+        """Length of a text when all values fit in their fields"""
+        return sum([len(x) if isinstance(x, str) else abs(x[0])
+                    for x in self._parts])
+
+    def format(self, values):
+        """Texts formatted with rows of values
+
+        values: shape=(num_texts, num_fields)
+
+        """
+        values = np.reshape(values, (len(values), -1))
+        text = self._format_fixed_width(values)
+        if text is None:
+            return [self._template % tuple(v) for v in values.tolist()]
+        else:
+            length = text.shape[1]
+            text = text.tobytes().decode('ascii')
+            return [text[(i * length):((i + 1) * length)]
+                    for i in range(len(values))]
+
+    def format_joined(self, values):
+        """Concatenated texts formatted with rows of values"""
+        values = np.reshape(values, (len(values), -1))
+        text = self._format_fixed_width(values)
+        if text is None:
+            return "".join([self._template % tuple(v)
+                            for v in values.tolist()])
+        else:
+            return text.tobytes().decode('ascii')
+
+    def _format_fixed_width(self, values):
+        try:
+            import phonopy._phonopy as phonoc
+        except ImportError:
+            return None
+
+        if self._fields is None:
+            self._set_fields()
+
+        text = np.empty((len(values), len(self._text)), dtype='uint8')
+        text[:] = self._text
+        offsets = np.arange(len(values), dtype='intp') * len(self._text)
+        for part, (i_values, positions) in self._fields.items():
+            width, precision = part
+            if precision is None:
+                if not self._format_integers(text,
+                                             values[:, i_values],
+                                             positions,
+                                             width):
+                    return None
+                continue
+            _values = np.array(values[:, i_values], dtype='double').ravel()
+            _positions = (offsets[:, None] + positions).ravel()
+            if not phonoc.format_fixed_width(text,
+                                             _values,
+                                             _positions,
+                                             width,
+                                             precision):
+                return None
+        return text
+
+    def _format_integers(self, text, values, positions, width):
+        if not np.all(values == np.rint(values)):
+            return False
+        if width < 0:
+            spec = "%%-%dd" % (-width)
+        else:
+            spec = "%%%dd" % width
+        numbers, indices = np.unique(values, return_inverse=True)
+        words = [spec % x for x in numbers.astype(int)]
+        if any([len(x) != abs(width) for x in words]):
+            return False
+        table = np.frombuffer("".join(words).encode('ascii'),
+                              dtype='uint8').reshape(len(words), -1)
+        chars = table[indices.reshape(values.shape)]
+        for i, position in enumerate(positions):
+            text[:, position:(position + abs(width))] = chars[:, i]
+        return True
+
+    def _set_fields(self):
+        text = []
+        fields = {}
+        i_value = 0
+        position = 0
+        for part in self._parts:
+            if isinstance(part, str):
+                text.append(part)
+                position += len(part)
+            else:
+                if part not in fields:
+                    fields[part] = ([], [])
+                fields[part][0].append(i_value)
+                fields[part][1].append(position)
+                text.append(" " * abs(part[0]))
+                position += abs(part[0])
+                i_value += 1
+
+        self._text = np.frombuffer("".join(text).encode('ascii'),
+                                   dtype='uint8')
+        self._fields = {}
+        for part, (i_values, positions) in fields.items():
+            self._fields[part] = (np.array(i_values, dtype='intp'),
+                                  np.array(positions, dtype='intp'))
+
+    def _get_parts(self, template):
+        """Layout: literals, (width, precision) and (width, None) of %d"""
+        parts = []
+        pattern = re.compile(r"%(-?\d+)(?:\.(\d+))?([fd])")
+        pos = 0
+        for m in pattern.finditer(template):
+            if m.start() > pos:
+                parts.append(template[pos:m.start()])
+            width = int(m.group(1))
+            if m.group(3) == 'f':
+                parts.append((width, int(m.group(2))))
+            else:
+                parts.append((width, None))
+            pos = m.end()
+        if pos < len(template):
+            parts.append(template[pos:])
+        return parts
+
+
+class BandYamlFormatter(object):
+    """Formatter of q-point entries of mesh.yaml, band.yaml and qpoints.yaml
+
+    A q-point entry is made of the lines of qpoint_format followed by
+    'band:' items of frequencies, group velocities, and eigenvectors,
+    and end. The texts are identical to those written line by line.
+
+    num_band: Number of bands
+    frequency_format: Line of frequency, e.g., "    frequency: %15.10f"
+    qpoint_format: Lines before the 'band:' items, e.g.,
+        "- q-position: [ %12.7f, %12.7f, %12.7f ]\n  band:\n"
+    end: Text after the last line of 'band:' items, e.g., "\n\n"
+
+    """
+    def __init__(self,
+                 num_band,
+                 frequency_format="    frequency: %15.10f",
+                 qpoint_format="",
+                 end="",
+                 is_group_velocity=False,
+                 is_eigenvectors=False):
+        self._num_band = num_band
+        self._is_group_velocity = is_group_velocity
+        self._is_eigenvectors = is_eigenvectors
+        self._formatter = FixedWidthFormatter(
+            qpoint_format + self._get_band_template(frequency_format) + end)
+
+    def iter_texts(self,
+                   frequencies,
+                   group_velocities=None,
+                   eigenvectors=None,
+                   qpoint_values=None):
+        """Concatenated entries of q-points made chunk by chunk"""
+        size = max(1, 2 ** 24 // self._formatter.get_length())
+        for i in range(0, len(frequencies), size):
+            s = slice(i, i + size)
+            values = self._get_values(
+                frequencies[s],
+                (None if group_velocities is None else group_velocities[s]),
+                (None if eigenvectors is None else eigenvectors[s]),
+                (None if qpoint_values is None else qpoint_values[s]))
+            yield self._formatter.format_joined(values)
+
+    def get_blocks(self,
+                   frequencies,
+                   group_velocities=None,
+                   eigenvectors=None,
+                   qpoint_values=None):
+        """Entries of q-points
+
+        frequencies: shape=(num_qpoints, num_band)
+        group_velocities: shape=(num_qpoints, num_band, 3)
+        eigenvectors: shape=(num_qpoints, num_band, num_band)
+        qpoint_values: Values of qpoint_format, shape=(num_qpoints, -1)
+
+        """
+        return self._formatter.format(self._get_values(frequencies,
+                                                       group_velocities,
+                                                       eigenvectors,
+                                                       qpoint_values))
+
+    def _get_values(self,
+                    frequencies,
+                    group_velocities,
+                    eigenvectors,
+                    qpoint_values):
+        num_qpoints = len(frequencies)
+        values = []
+        if qpoint_values is not None:
+            values.append(np.reshape(qpoint_values, (num_qpoints, -1)))
+        values.append(self._get_band_values(frequencies,
+                                            group_velocities,
+                                            eigenvectors))
+        return np.hstack(values)
+
+    def _get_band_values(self, frequencies, group_velocities, eigenvectors):
+        num_qpoints = len(frequencies)
+        values = [np.reshape(frequencies, (num_qpoints, -1, 1))]
+        if self._is_group_velocity:
+            values.append(np.reshape(group_velocities,
+                                     (num_qpoints, -1, 3)))
+        if self._is_eigenvectors:
+            eigvecs = np.swapaxes(eigenvectors, 1, 2)
+            values.append(np.reshape(
+                np.stack((eigvecs.real, eigvecs.imag), axis=-1),
+                (num_qpoints, self._num_band, -1)))
+        return np.reshape(np.concatenate(values, axis=2), (num_qpoints, -1))
+
+    def _get_band_template(self, frequency_format):
+        natom = self._num_band // 3
+        lines = []
+        for i in range(self._num_band):
+            lines.append("  - # %d" % (i + 1))
+            lines.append(frequency_format)
+            if self._is_group_velocity:
+                lines.append(
+                    "    group_velocity: [ %13.7f, %13.7f, %13.7f ]")
+            if self._is_eigenvectors:
+                lines.append("    eigenvector:")
+                for j in range(natom):
+                    lines.append("    - # atom %d" % (j + 1))
+                    lines += ["      - [ %17.14f, %17.14f ]"] * 3
+        return "\n".join(lines)
@@ -35,6 +35,7 @@
 import sys
 import numpy as np
 from phonopy.harmonic.dynmat_to_fc import get_commensurate_points
+from phonopy.harmonic.phase_factors import get_phase_factors
 from phonopy.units import AMU, kb_J
 from phonopy.structure.grid_points import get_qpoints
 
@@ -79,9 +80,6 @@ class VelocityQpoints(object):
         self._primitive = primitive
         self._velocities = velocities
 
-        (self._shortest_vectors,
-         self._multiplicity) = primitive.get_smallest_vectors()
-
         self._qpoints = None
         self._weights = None
 
@@ -130,20 +128,16 @@ class VelocityQpoints(object):
         q_array = np.reshape(q, (-1, 3))
         dtype = "c%d" % (np.dtype('double').itemsize * 2)
         v_q = np.zeros((v.shape[0], num_p, len(q_array), 3), dtype=dtype)
+        # exp(-2pi i q.r)
+        phase_factors = get_phase_factors(self._primitive, q_array).conj()
 
         for p_i, s_i in enumerate(p2s):
-            for s_j, s2p_j in enumerate(s2p):
-                if s2p_j == s_i:
-                    for q_i, pf in enumerate(
-                            self._get_phase_factor(p_i, s_j, q_array)):
-                        v_q[:, p_i, q_i, :] += pf * v[:, s_j, :]
+            atoms = np.where(s2p == s_i)[0]
+            v_q[:, p_i] = np.einsum('qs,tsx->tqx',
+                                    phase_factors[:, atoms, p_i],
+                                    v[:, atoms, :])
         return v_q
 
-    def _get_phase_factor(self, p_i, s_j, q_array):
-        multi = self._multiplicity[s_j, p_i]
-        pos = self._shortest_vectors[s_j, p_i, :multi]
-        return np.exp(-2j * np.pi * np.dot(q_array, pos.T)).sum(axis=1) / multi
-
 
 class AutoCorrelation(object):
     def __init__(self,
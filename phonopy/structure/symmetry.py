@@ -36,7 +36,8 @@ import sys
 import numpy as np
 import phonopy.structure.spglib as spg
 from phonopy.structure.atoms import PhonopyAtoms as Atoms
-from phonopy.harmonic.force_constants import similarity_transformation
+from phonopy.harmonic.force_constants import (similarity_transformation,
+                                              _compute_all_sg_permutations)
 
 class Symmetry(object):
     def __init__(self, cell, symprec=1e-5, is_symmetry=True):
@@ -68,6 +69,8 @@ class Symmetry(object):
         self._independent_atoms = None
         self._set_independent_atoms()
         self._map_operations = None
+        self._atom_permutations = None
+        self._inverse_atom_permutations = None
 
     def get_symmetry_operations(self):
         return self._symmetry_operations
@@ -105,6 +108,24 @@ class Symmetry(object):
             self._set_map_operations()
         return self._map_operations
 
+    def get_atom_permutations(self, is_inverse=False):
+        """Permutations of atoms by symmetry operations
+
+        permutations[i, j] is the index of the atom to which atom j is
+        sent by the i-th symmetry operation. With is_inverse=True, the
+        inverse permutations are returned, i.e., atom
+        inverse_permutations[i, j] is sent to atom j. Both are computed
+        at the first call and cached.
+
+        shape=(num_operations, num_atoms), dtype='intc'
+        """
+        if self._atom_permutations is None:
+            self._set_atom_permutations()
+        if is_inverse:
+            return self._inverse_atom_permutations
+        else:
+            return self._atom_permutations
+
     def get_site_symmetry(self, atom_number):
         positions = self._cell.get_scaled_positions()
         lattice = self._cell.get_cell()
@@ -247,6 +268,17 @@ class Symmetry(object):
                     break
         self._map_operations = map_operations
 
+    def _set_atom_permutations(self):
+        self._atom_permutations = _compute_all_sg_permutations(
+            self._cell.get_scaled_positions(),
+            self._symmetry_operations['rotations'],
+            self._symmetry_operations['translations'],
+            np.array(self._cell.get_cell().T, dtype='double', order='C'),
+            self._symprec)
+        self._inverse_atom_permutations = np.array(
+            np.argsort(self._atom_permutations, axis=1),
+            dtype='intc', order='C')
+
     def _set_nosym(self):
         translations = []
         rotations = []
@@ -54,6 +54,7 @@ class Unfolding(object):
         self._trans_s = None
         self._trans_p = None
         self._comm_points = None
+        self._phase_factors = None
         self._index_set = None
         self._freqs = None
         self._eigvecs = None
@@ -86,6 +87,7 @@ class Unfolding(object):
     def prepare(self):
         self._comm_points = get_commensurate_points(self._supercell_matrix)
         self._set_translations()
+        self._set_phase_factors()
         self._set_shifted_index_set()
         self._solve_phonon()
         self._weights = np.zeros(
@@ -117,6 +119,14 @@ class Unfolding(object):
         self._trans_p = np.dot(self._trans_s, self._supercell_matrix.T)
         self._N = len(self._trans_s)
 
+    def _set_phase_factors(self):
+        """exp(2pi i G.t) for commensurate points G and translations t
+
+        shape=(num_translations, num_commensurate_points)
+        """
+        self._phase_factors = np.exp(
+            2j * np.pi * np.dot(self._trans_p, self._comm_points.T))
+
     def _set_shifted_index_set(self):
         index_set = np.zeros((self._N, len(self._ideal_positions) * 3),
                              dtype='intc')
@@ -138,15 +148,14 @@ class Unfolding(object):
 
     def _get_unfolding_weight(self):
         eigvecs = self._eigvecs[self._q_index]
-        dtype = "c%d" % (np.dtype('double').itemsize * 2)
-        weights = np.zeros((eigvecs.shape[0], self._N), dtype=dtype)
-        for shift, indices in zip(self._trans_p, self._index_set):
-            dot_eigs = np.einsum(
-                'ij,ij->j', eigvecs.conj(), eigvecs[indices, :])
-            for i, G in enumerate(self._comm_points):
-                phase = np.exp(2j * np.pi * np.dot(G, shift))
-                weights[:, i] += dot_eigs * phase
-        weights /= self._N
+        # dot_eigs[shift, band], accumulated shift by shift not to make
+        # eigenvectors of all the shifts at once.
+        dot_eigs = np.zeros((self._N, eigvecs.shape[1]), dtype=eigvecs.dtype)
+        eigvecs_conj = eigvecs.conj()
+        for i, indices in enumerate(self._index_set):
+            dot_eigs[i] = np.einsum('ij,ij->j',
+                                    eigvecs_conj, eigvecs[indices, :])
+        weights = np.dot(dot_eigs.T, self._phase_factors) / self._N
 
         # # Strainghtforward norm calculation (equivalent speed)
         # for i, G in enumerate(self._comm_points):
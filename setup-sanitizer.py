@@ -41,6 +41,7 @@ include_dirs_phonopy = ['c/harmonic_h', 'c/kspclib_h'] + include_dirs_numpy
 sources_phonopy = ['c/_phonopy.c',
                    'c/harmonic/dynmat.c',
                    'c/harmonic/derivative_dynmat.c',
+                   'c/harmonic/fc_symmetry.c',
                    'c/kspclib/kgrid.c',
                    'c/kspclib/tetrahedron_method.c']
 
@@ -47,6 +47,7 @@ include_dirs_phonopy = ['c/harmonic_h', 'c/kspclib_h'] + include_dirs_numpy
 sources_phonopy = ['c/_phonopy.c',
                    'c/harmonic/dynmat.c',
                    'c/harmonic/derivative_dynmat.c',
+                   'c/harmonic/fc_symmetry.c',
                    'c/kspclib/kgrid.c',
                    'c/kspclib/tetrahedron_method.c']
 
@@ -70,6 +71,32 @@ extension_phonopy = Extension(
     sources=sources_phonopy)
 
 
+#######################
+# _lapackpy extension #
+#######################
+# LAPACK is linked to the phonon solver, which is used when
+# use_lapack_solver=True. The link arguments may be modified depending
+# on the LAPACK library installed, e.g., ['-lopenblas'] or those of
+# MKL. This extension is optional, i.e., phonopy is installed without
+# it if the build fails, e.g., when LAPACK library (liblapack) is not
+# found by the linker. Then use_lapack_solver=True falls back to
+# numpy.linalg.eigh with a warning.
+include_dirs_lapackpy = ['c/harmonic_h'] + include_dirs_numpy
+sources_lapackpy = ['c/_lapackpy.c',
+                    'c/harmonic/dynmat.c',
+                    'c/harmonic/phonon.c',
+                    'c/harmonic/lapack_wrapper.c']
+extra_link_args_lapackpy = extra_link_args_phonopy + ['-llapack',]
+
+extension_lapackpy = Extension(
+    'phonopy._lapackpy',
+    extra_compile_args=extra_compile_args_phonopy,
+    extra_link_args=extra_link_args_lapackpy,
+    include_dirs=include_dirs_lapackpy,
+    sources=sources_lapackpy,
+    optional=True)
+
+
 #####################
 # _spglib extension #
 #####################
@@ -111,7 +138,7 @@ extension_spglib = Extension(
              'c/spglib/spin.c',
              'c/spglib/symmetry.c'])
 
-ext_modules_phonopy = [extension_phonopy, extension_spglib]
+ext_modules_phonopy = [extension_phonopy, extension_lapackpy, extension_spglib]
 packages_phonopy = ['phonopy',
                     'phonopy.cui',
                     'phonopy.gruneisen',
@@ -0,0 +1,201 @@
+import unittest
+import os
+import numpy as np
+from phonopy import Phonopy
+from phonopy.interface.vasp import read_vasp
+from phonopy.file_IO import parse_FORCE_SETS, parse_BORN
+from phonopy.harmonic.derivative_dynmat import DerivativeOfDynamicalMatrix
+from phonopy.harmonic.dynamical_matrix import (DynamicalMatrix,
+                                               get_dynamical_matrix)
+from phonopy.harmonic.sparse_force_constants import SparseForceConstants
+from phonopy.harmonic.phase_factors import (
+    get_phase_factors, clear_phase_factors_cache, _phase_factors_cache)
+
+data_dir = os.path.dirname(os.path.abspath(__file__))
+
+class TestDynamicalMatrix(unittest.TestCase):
+    def setUp(self):
+        self._qpoints = [[0, 0, 0],
+                         [0.5, 0, 0],
+                         [0.5, 0.5, 0],
+                         [0.1, 0.2, 0.3],
+                         [0.5, 0.25, 0.75]]
+
+    def tearDown(self):
+        pass
+
+    def test_dynamical_matrices(self):
+        phonon = self._get_phonon()
+        dynmat = phonon.get_dynamical_matrix()
+        dynmat.set_dynamical_matrices(self._qpoints)
+        dms = dynmat.get_dynamical_matrices()
+        self.assertEqual(dms.shape, (len(self._qpoints), 6, 6))
+        for q, dm in zip(self._qpoints, dms):
+            dynmat.set_dynamical_matrix(q)
+            np.testing.assert_allclose(dm, dynmat.get_dynamical_matrix(),
+                                       atol=1e-12)
+            dynmat._set_py_dynamical_matrix(q)
+            np.testing.assert_allclose(dm, dynmat.get_dynamical_matrix(),
+                                       atol=1e-12)
+        dynmat._set_py_dynamical_matrices(np.array(self._qpoints,
+                                                   dtype='double'))
+        np.testing.assert_allclose(dms, dynmat.get_dynamical_matrices(),
+                                   atol=1e-12)
+
+    def test_dynamical_matrices_nac(self):
+        for method in ('wang', 'gonze'):
+            phonon = self._get_phonon(is_nac=True, nac_method=method)
+            dynmat = phonon.get_dynamical_matrix()
+            q_direction = [1, 0, 0]
+            dynmat.set_dynamical_matrices(self._qpoints,
+                                          q_direction=q_direction)
+            dms = dynmat.get_dynamical_matrices()
+            dynmat.set_dynamical_matrix(self._qpoints[0],
+                                        q_direction=q_direction)
+            np.testing.assert_allclose(dms[0], dynmat.get_dynamical_matrix())
+            for q, dm in zip(self._qpoints[1:], dms[1:]):
+                dynmat.set_dynamical_matrix(q)
+                np.testing.assert_allclose(dm, dynmat.get_dynamical_matrix(),
+                                           atol=1e-10)
+
+    def test_Gonze_dipole_dipole(self):
+        phonon = self._get_phonon(is_nac=True, nac_method='gonze')
+        dynmat = phonon.get_dynamical_matrix()
+        rec_lat = np.linalg.inv(phonon.get_primitive().get_cell())
+        q_carts = np.dot(self._qpoints, rec_lat.T)
+        np.testing.assert_allclose(dynmat._get_c_dipole_dipole_q0(),
+                                   dynmat._get_py_dipole_dipole_q0(),
+                                   atol=1e-10)
+        for q_direction in (None, np.array([1.0, 0, 0])):
+            np.testing.assert_allclose(
+                dynmat._get_c_dipole_dipole(q_carts, q_direction),
+                dynmat._get_py_dipole_dipole(q_carts, q_direction),
+                atol=1e-10)
+
+    def test_compact_fc(self):
+        for method in (None, 'wang', 'gonze'):
+            phonon = self._get_phonon(is_nac=(method is not None),
+                                      nac_method=method)
+            phonon_compact = self._get_phonon(is_nac=(method is not None),
+                                              nac_method=method,
+                                              is_compact_fc=True)
+            p2s = phonon.get_primitive().get_primitive_to_supercell_map()
+            fc_compact = phonon_compact.get_force_constants()
+            self.assertEqual(fc_compact.shape, (2, 64, 3, 3))
+            np.testing.assert_allclose(phonon.get_force_constants()[p2s],
+                                       fc_compact, atol=1e-12)
+            dynmat = phonon.get_dynamical_matrix()
+            dynmat_compact = phonon_compact.get_dynamical_matrix()
+            for q in self._qpoints[1:]:
+                dynmat.set_dynamical_matrix(q)
+                dynmat_compact.set_dynamical_matrix(q)
+                np.testing.assert_allclose(
+                    dynmat.get_dynamical_matrix(),
+                    dynmat_compact.get_dynamical_matrix(), atol=1e-10)
+                for lang in ('C', 'Py'):
+                    ddm = DerivativeOfDynamicalMatrix(dynmat)
+                    ddm.run(q, lang=lang)
+                    ddm_compact = DerivativeOfDynamicalMatrix(dynmat_compact)
+                    ddm_compact.run(q, lang=lang)
+                    np.testing.assert_allclose(
+                        ddm.get_derivative_of_dynamical_matrix(),
+                        ddm_compact.get_derivative_of_dynamical_matrix(),
+                        atol=1e-10)
+
+    def test_phase_factors(self):
+        primitive = self._get_phonon().get_primitive()
+        svecs, multiplicity = primitive.get_smallest_vectors()
+        phase_factors = get_phase_factors(primitive, self._qpoints)
+        self.assertEqual(phase_factors.shape, (len(self._qpoints), 64, 2))
+        self.assertTrue(phase_factors is
+                        get_phase_factors(primitive, self._qpoints))
+        self.assertFalse(phase_factors.flags.writeable)
+        for q, pf in zip(self._qpoints, phase_factors):
+            for j, i in ((0, 0), (5, 1), (37, 0), (63, 1)):
+                multi = multiplicity[j, i]
+                phases = np.exp(2j * np.pi * np.dot(svecs[j, i, :multi], q))
+                self.assertAlmostEqual(pf[j, i], phases.sum() / multi)
+
+        # Cached phase factors are not kept alive by the cache.
+        self.assertTrue(primitive in _phase_factors_cache)
+        clear_phase_factors_cache()
+        self.assertFalse(phase_factors is
+                         get_phase_factors(primitive, self._qpoints))
+        num_cached = len(_phase_factors_cache)
+        del primitive
+        import gc
+        gc.collect()
+        self.assertEqual(len(_phase_factors_cache), num_cached - 1)
+
+    def test_sparse_fc(self):
+        for is_compact_fc in (False, True):
+            phonon = self._get_phonon(is_compact_fc=is_compact_fc)
+            supercell = phonon.get_supercell()
+            primitive = phonon.get_primitive()
+            fc = phonon.get_force_constants()
+            sparse_fc = SparseForceConstants(fc, primitive)
+            self.assertEqual(sparse_fc.get_number_of_pairs(), 128)
+            p2s = primitive.get_primitive_to_supercell_map()
+            np.testing.assert_array_equal(
+                sparse_fc.get_compact_force_constants(),
+                fc[p2s] if not is_compact_fc else fc)
+            dynmat = get_dynamical_matrix(sparse_fc, supercell, primitive)
+            self.assertTrue(dynmat.is_sparse_fc())
+            dynmat_dense = phonon.get_dynamical_matrix()
+            dynmat.set_dynamical_matrices(self._qpoints)
+            dynmat_dense.set_dynamical_matrices(self._qpoints)
+            np.testing.assert_allclose(dynmat.get_dynamical_matrices(),
+                                       dynmat_dense.get_dynamical_matrices(),
+                                       atol=1e-12)
+
+            # Pairs within the cutoff radius give the same dynamical
+            # matrices as the force constants zeroed outside the radius.
+            phonon.set_force_constants_zero_with_radius(4.0, is_sparse=True)
+            dynmat = phonon.get_dynamical_matrix()
+            sparse_fc = dynmat.get_force_constants()
+            self.assertEqual(sparse_fc.get_number_of_pairs(), 14)
+            dynmat_dense = DynamicalMatrix(supercell,
+                                           primitive,
+                                           phonon.get_force_constants())
+            for q in self._qpoints:
+                dynmat.set_dynamical_matrix(q)
+                dynmat_dense.set_dynamical_matrix(q)
+                np.testing.assert_allclose(dynmat.get_dynamical_matrix(),
+                                           dynmat_dense.get_dynamical_matrix(),
+                                           atol=1e-12)
+
+            # Pairs solved directly from forces are the same.
+            self.assertTrue(phonon.get_force_constants() is not None)
+            phonon.produce_sparse_force_constants(4.0)
+            _sparse_fc = phonon.get_sparse_force_constants()
+            for pairs, _pairs in zip(sparse_fc.get_pairs(),
+                                     _sparse_fc.get_pairs()):
+                np.testing.assert_array_equal(pairs, _pairs)
+            np.testing.assert_allclose(sparse_fc.get_force_constants(),
+                                       _sparse_fc.get_force_constants(),
+                                       atol=1e-12)
+
+    def _get_phonon(self, is_nac=False, nac_method=None, is_compact_fc=False):
+        cell = read_vasp(os.path.join(data_dir, "../POSCAR_NaCl"))
+        phonon = Phonopy(cell,
+                         np.diag([2, 2, 2]),
+                         primitive_matrix=[[0, 0.5, 0.5],
+                                           [0.5, 0, 0.5],
+                                           [0.5, 0.5, 0]])
+        filename = os.path.join(data_dir, "../FORCE_SETS_NaCl")
+        force_sets = parse_FORCE_SETS(filename=filename)
+        phonon.set_displacement_dataset(force_sets)
+        phonon.produce_force_constants(is_compact_fc=is_compact_fc)
+        if is_nac:
+            filename_born = os.path.join(data_dir, "../BORN_NaCl")
+            nac_params = parse_BORN(phonon.get_primitive(),
+                                    filename=filename_born)
+            if nac_method is not None:
+                nac_params['method'] = nac_method
+            phonon.set_nac_params(nac_params)
+        return phonon
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestDynamicalMatrix)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,251 @@
+import unittest
+import os
+import numpy as np
+from phonopy import Phonopy
+from phonopy.interface.vasp import read_vasp
+from phonopy.file_IO import parse_FORCE_SETS
+from phonopy.harmonic.force_constants import (
+    get_fc2, get_positions_sent_by_rot_inv, set_tensor_symmetry,
+    set_tensor_symmetry_PJ, symmetrize_force_constants,
+    set_permutation_symmetry, set_translational_invariance,
+    _get_site_symmetry_permutations, _get_fc_compact_maps)
+from phonopy.harmonic.incremental_force_constants import (
+    IncrementalForceConstants)
+
+data_dir = os.path.dirname(os.path.abspath(__file__))
+
+class TestForceConstants(unittest.TestCase):
+    def setUp(self):
+        self._phonon = self._get_phonon()
+
+    def tearDown(self):
+        pass
+
+    def test_fc2(self):
+        phonon = self._phonon
+        fc = get_fc2(phonon.get_supercell(),
+                     phonon.get_symmetry(),
+                     phonon.get_displacement_dataset())
+        self.assertEqual(fc.shape, (64, 64, 3, 3))
+        np.testing.assert_allclose(fc.sum(axis=1), 0, atol=1e-2)
+
+        # Displaced atoms solved in parallel
+        fc_threads = get_fc2(phonon.get_supercell(),
+                             phonon.get_symmetry(),
+                             phonon.get_displacement_dataset(),
+                             nprocs=2)
+        np.testing.assert_allclose(fc, fc_threads, atol=1e-12)
+
+        # Linear regression gives the same force constants
+        fc_regression = get_fc2(phonon.get_supercell(),
+                                phonon.get_symmetry(),
+                                phonon.get_displacement_dataset(),
+                                computation_algorithm="regression")
+        np.testing.assert_allclose(fc, fc_regression, atol=1e-10)
+
+    def test_site_symmetry_permutations(self):
+        supercell = self._phonon.get_supercell()
+        symmetry = self._phonon.get_symmetry()
+        lattice = supercell.get_cell().T
+        permutations = symmetry.get_atom_permutations()
+        self.assertTrue(permutations is symmetry.get_atom_permutations())
+        self.assertEqual(permutations.shape,
+                         (len(symmetry.get_symmetry_operations()['rotations']),
+                          supercell.get_number_of_atoms()))
+        inverse_permutations = symmetry.get_atom_permutations(is_inverse=True)
+        for perm, perm_inv in zip(permutations, inverse_permutations):
+            np.testing.assert_array_equal(perm[perm_inv],
+                                          np.arange(len(perm)))
+        for atom_number in (0, 5, 37):
+            site_sym, rot_map_syms = _get_site_symmetry_permutations(
+                symmetry, atom_number)
+            np.testing.assert_array_equal(
+                site_sym, symmetry.get_site_symmetry(atom_number))
+            positions = supercell.get_scaled_positions()
+            positions -= positions[atom_number]
+            symprec = symmetry.get_symmetry_tolerance()
+            np.testing.assert_array_equal(
+                rot_map_syms,
+                get_positions_sent_by_rot_inv(lattice,
+                                              positions,
+                                              site_sym,
+                                              symprec))
+
+    def test_set_tensor_symmetry(self):
+        phonon = self._phonon
+        phonon.produce_force_constants()
+        fc = phonon.get_force_constants().copy()
+        supercell = phonon.get_supercell()
+        set_tensor_symmetry(fc,
+                            supercell.get_cell().T,
+                            supercell.get_scaled_positions(),
+                            phonon.get_symmetry())
+        np.testing.assert_allclose(fc, phonon.get_force_constants(),
+                                   atol=1e-2)
+        fc_sym = fc.copy()
+        set_tensor_symmetry(fc_sym,
+                            supercell.get_cell().T,
+                            supercell.get_scaled_positions(),
+                            phonon.get_symmetry())
+        np.testing.assert_allclose(fc, fc_sym, atol=1e-12)
+
+    def test_symmetrize_force_constants(self):
+        phonon = self._phonon
+        phonon.produce_force_constants()
+        fc = phonon.get_force_constants()
+        fc += np.random.RandomState(0).randn(*fc.shape) * 0.01
+        fc_ref = fc.copy()
+        for i in range(3):
+            set_permutation_symmetry(fc_ref)
+            set_translational_invariance(fc_ref)
+        fc_sym = fc.copy()
+        symmetrize_force_constants(fc_sym, iteration=3)
+        np.testing.assert_allclose(fc_sym, fc_ref, atol=1e-12)
+
+        # Compact force constants are symmetrized as the full force
+        # constants made of them by the pure translations.
+        supercell = phonon.get_supercell()
+        primitive = phonon.get_primitive()
+        p2s_map = primitive.get_primitive_to_supercell_map()
+        fc_compact = np.array(fc[p2s_map], dtype='double', order='C')
+        _, s2pp_map, nsym_list, inv_trans_perms = _get_fc_compact_maps(
+            supercell.get_cell().T,
+            supercell.get_scaled_positions(),
+            primitive,
+            1e-5)
+        fc_full = fc_compact[s2pp_map[:, None],
+                             inv_trans_perms[nsym_list]]
+        for i, j in enumerate(p2s_map):
+            np.testing.assert_array_equal(fc_full[j], fc_compact[i])
+
+        fc_ref = fc_full.copy()
+        symmetrize_force_constants(fc_ref)
+        phonon.set_force_constants(fc_compact.copy())
+        phonon.symmetrize_force_constants()
+        np.testing.assert_allclose(phonon.get_force_constants(),
+                                   fc_ref[p2s_map], atol=1e-12)
+
+        fc_ref = fc_full.copy()
+        set_tensor_symmetry_PJ(fc_ref,
+                               supercell.get_cell().T,
+                               supercell.get_scaled_positions(),
+                               phonon.get_symmetry())
+        phonon.set_force_constants(fc_compact.copy())
+        phonon.symmetrize_force_constants_by_space_group()
+        np.testing.assert_allclose(phonon.get_force_constants(),
+                                   fc_ref[p2s_map], atol=1e-12)
+
+    def test_symmetrize_force_constants_layout(self):
+        phonon = self._phonon
+        phonon.produce_force_constants()
+        fc = phonon.get_force_constants()
+        fc += np.random.RandomState(0).randn(*fc.shape) * 0.01
+        fc_ref = fc.copy()
+        symmetrize_force_constants(fc_ref)
+        fc_f = np.array(fc, order='F')
+        symmetrize_force_constants(fc_f)
+        np.testing.assert_allclose(fc_f, fc_ref, atol=1e-12)
+        fc_single = np.array(fc, dtype='float32')
+        symmetrize_force_constants(fc_single)
+        np.testing.assert_allclose(fc_single, fc_ref, atol=1e-5)
+
+        import phonopy._phonopy as phonoc
+        identity = np.arange(fc.shape[1], dtype='intc')
+        self.assertRaises(ValueError,
+                          phonoc.perm_trans_symmetrize_fc,
+                          np.array(fc, order='F'),
+                          identity,
+                          identity,
+                          np.zeros_like(identity),
+                          np.array([identity]),
+                          1)
+        self.assertRaises(ValueError,
+                          phonoc.perm_trans_symmetrize_fc,
+                          fc.copy(),
+                          identity.astype('int64'),
+                          identity,
+                          np.zeros_like(identity),
+                          np.array([identity]),
+                          1)
+
+    def test_incremental_force_constants(self):
+        phonon = self._phonon
+        supercell = phonon.get_supercell()
+        symmetry = phonon.get_symmetry()
+        dataset = phonon.get_displacement_dataset()
+        fc = get_fc2(supercell, symmetry, dataset)
+        p2s_map = phonon.get_primitive().get_primitive_to_supercell_map()
+        for atom_list in (None, p2s_map):
+            ifc = IncrementalForceConstants(supercell,
+                                            symmetry,
+                                            atom_list=atom_list)
+            for i, disp in enumerate(dataset['first_atoms']):
+                ifc.add_displacements([disp])
+                rows = ifc.run()
+                self.assertTrue(len(rows) > 0)
+                self.assertEqual(ifc.is_complete(),
+                                 i == len(dataset['first_atoms']) - 1)
+            if atom_list is None:
+                np.testing.assert_allclose(ifc.get_force_constants(), fc,
+                                           atol=1e-12)
+            else:
+                np.testing.assert_allclose(ifc.get_force_constants(),
+                                           fc[p2s_map], atol=1e-12)
+            self.assertEqual(len(ifc.run()), 0)
+
+        for is_compact_fc in (False, True):
+            phonon.produce_force_constants(is_compact_fc=is_compact_fc)
+            fc_ref = phonon.get_force_constants()
+            for disp in dataset['first_atoms']:
+                is_complete = phonon.update_force_constants(
+                    [disp], is_compact_fc=is_compact_fc)
+            self.assertTrue(is_complete)
+            np.testing.assert_allclose(phonon.get_force_constants(), fc_ref,
+                                       atol=1e-12)
+
+    def test_incremental_force_constants_unit_supercell(self):
+        # Compact and full force constants have the same shape here.
+        cell = read_vasp(os.path.join(data_dir, "../POSCAR_NaCl"))
+        phonon = Phonopy(cell, np.eye(3, dtype='intc'))
+        phonon.generate_displacements(distance=0.01)
+        dataset = phonon.get_displacement_dataset()
+        natom = cell.get_number_of_atoms()
+        for i, disp in enumerate(dataset['first_atoms']):
+            forces = np.zeros((natom, 3), dtype='double')
+            forces[disp['number']] = -disp['displacement']
+            forces[(disp['number'] + 1) % natom] = disp['displacement']
+            disp['forces'] = forces
+        phonon.produce_force_constants(is_compact_fc=True)
+        fc_ref = phonon.get_force_constants()
+        for disp in dataset['first_atoms']:
+            is_complete = phonon.update_force_constants(
+                [disp], is_compact_fc=True)
+        self.assertTrue(is_complete)
+        np.testing.assert_allclose(phonon.get_force_constants(), fc_ref,
+                                   atol=1e-12)
+
+        self.assertRaises(RuntimeError,
+                          phonon.update_force_constants,
+                          dataset['first_atoms'][:1])
+        self.assertRaises(RuntimeError,
+                          phonon.update_force_constants,
+                          dataset['first_atoms'][:1],
+                          computation_algorithm="regression",
+                          is_compact_fc=True)
+
+    def _get_phonon(self):
+        cell = read_vasp(os.path.join(data_dir, "../POSCAR_NaCl"))
+        phonon = Phonopy(cell,
+                         np.diag([2, 2, 2]),
+                         primitive_matrix=[[0, 0.5, 0.5],
+                                           [0.5, 0, 0.5],
+                                           [0.5, 0.5, 0]])
+        filename = os.path.join(data_dir, "../FORCE_SETS_NaCl")
+        force_sets = parse_FORCE_SETS(filename=filename)
+        phonon.set_displacement_dataset(force_sets)
+        return phonon
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestForceConstants)
+    unittest.TextTestRunner(verbosity=2).run(suite)
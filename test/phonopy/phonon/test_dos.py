@@ -0,0 +1,161 @@
+import unittest
+import os
+import numpy as np
+from phonopy import Phonopy
+from phonopy.interface.vasp import read_vasp
+from phonopy.file_IO import parse_FORCE_SETS
+from phonopy.phonon.mesh import Mesh
+from phonopy.phonon.dos import (TotalDos, PartialDos, NormalDistribution,
+                                CauchyDistribution, run_smearing_method_dos)
+
+data_dir = os.path.dirname(os.path.abspath(__file__))
+
+class TestDos(unittest.TestCase):
+    def setUp(self):
+        self._phonon = self._get_phonon()
+
+    def tearDown(self):
+        pass
+
+    def test_smearing_method_dos(self):
+        mesh = self._get_mesh()
+        weights = mesh.get_weights()
+        freqs = mesh.get_frequencies()
+        freq_points = np.linspace(-1, freqs.max() + 1, 101)
+        coef = np.random.RandomState(0).rand(len(freqs), 2, freqs.shape[1])
+        for smearing_function in (NormalDistribution(0.2),
+                                  CauchyDistribution(0.2)):
+            dos_ref = np.array(
+                [np.dot(weights, smearing_function.calc(freqs - f)).sum()
+                 for f in freq_points])
+            pdos_ref = np.array(
+                [np.einsum('q,qjb,qb->j', weights, coef,
+                           smearing_function.calc(freqs - f))
+                 for f in freq_points])
+            for max_chunk_elements in (1, 1000, 2 ** 22):
+                dos = run_smearing_method_dos(
+                    freq_points, freqs, weights, smearing_function,
+                    max_chunk_elements=max_chunk_elements)
+                np.testing.assert_allclose(dos, dos_ref, atol=1e-12)
+                pdos = run_smearing_method_dos(
+                    freq_points, freqs, weights, smearing_function,
+                    coef=coef, max_chunk_elements=max_chunk_elements)
+                np.testing.assert_allclose(pdos, pdos_ref, atol=1e-12)
+
+    def test_partial_dos_sum(self):
+        mesh = self._get_mesh()
+        for function_name in ('Normal', 'Cauchy'):
+            total_dos = TotalDos(mesh, sigma=0.1)
+            total_dos.set_smearing_function(function_name)
+            total_dos.run()
+            partial_dos = PartialDos(mesh, sigma=0.1)
+            partial_dos.set_smearing_function(function_name)
+            partial_dos.run()
+            _, dos = total_dos.get_dos()
+            _, pdos = partial_dos.get_partial_dos()
+            self.assertEqual(pdos.shape, (2, len(dos)))
+            np.testing.assert_allclose(pdos.sum(axis=0), dos, atol=1e-12)
+
+    def test_tetrahedron_method_dos(self):
+        mesh = self._get_mesh()
+        total_dos = TotalDos(mesh, tetrahedron_method=True)
+        total_dos.run()
+        partial_dos = PartialDos(mesh, tetrahedron_method=True)
+        partial_dos.run()
+        _, dos = total_dos.get_dos()
+        _, pdos = partial_dos.get_partial_dos()
+        self.assertEqual(pdos.shape, (2, len(dos)))
+        np.testing.assert_allclose(pdos.sum(axis=0), dos, atol=1e-12)
+
+        # Accumulated per grid point in python
+        partial_dos._openmp_thm = False
+        partial_dos.run()
+        np.testing.assert_allclose(partial_dos.get_partial_dos()[1], pdos,
+                                   atol=1e-12)
+
+    def test_dos_at(self):
+        mesh = self._get_mesh()
+        for tetrahedron_method in (False, True):
+            for function_name in ('Normal', 'Cauchy'):
+                total_dos = TotalDos(mesh,
+                                     sigma=0.1,
+                                     tetrahedron_method=tetrahedron_method)
+                partial_dos = PartialDos(
+                    mesh, sigma=0.1, tetrahedron_method=tetrahedron_method)
+                for dos in (total_dos, partial_dos):
+                    dos.set_smearing_function(function_name)
+                    dos.run()
+                freq_points, dos = total_dos.get_dos()
+                _, pdos = partial_dos.get_partial_dos()
+                np.testing.assert_allclose(total_dos.dos_at(freq_points),
+                                           dos, atol=1e-12)
+                np.testing.assert_allclose(
+                    partial_dos.dos_at(freq_points[::-1]),
+                    pdos[:, ::-1], atol=1e-12)
+
+                # Refined frequency points include the uniform ones.
+                total_dos.set_draw_area(adaptive_tolerance=1e-3)
+                total_dos.run()
+                _freq_points, _dos = total_dos.get_dos()
+                self.assertTrue(len(_freq_points) > len(freq_points))
+                self.assertTrue((np.diff(_freq_points) > 0).all())
+                self.assertTrue(np.isin(freq_points, _freq_points).all())
+                np.testing.assert_allclose(total_dos.dos_at(_freq_points),
+                                           _dos, atol=1e-12)
+
+    def test_histogram_method_dos(self):
+        mesh = self._get_mesh()
+        for function_name in ('Normal', 'Cauchy'):
+            for cls in (TotalDos, PartialDos):
+                values = []
+                for method in (None, 'histogram'):
+                    dos = cls(mesh, sigma=0.1, method=method)
+                    dos.set_smearing_function(function_name)
+                    dos.set_draw_area(freq_pitch=0.01)
+                    dos.run()
+                    if cls is TotalDos:
+                        values.append(dos.get_dos()[1])
+                    else:
+                        values.append(dos.get_partial_dos()[1])
+                np.testing.assert_allclose(values[1], values[0],
+                                           atol=np.abs(values[0]).max() * 1e-3)
+
+        # Finer bins reduce the discretisation error.
+        phonon = self._phonon
+        phonon.set_mesh([5, 5, 5])
+        phonon.set_total_DOS(sigma=0.1, freq_pitch=0.01)
+        _, dos = phonon.get_total_DOS()
+        errors = []
+        for bin_width in (0.01, 0.001):
+            phonon.set_total_DOS(sigma=0.1, freq_pitch=0.01,
+                                 method='histogram', bin_width=bin_width)
+            errors.append(np.abs(phonon.get_total_DOS()[1] - dos).max())
+        self.assertTrue(errors[1] < errors[0] / 10)
+        self.assertTrue(errors[1] < np.abs(dos).max() * 1e-4)
+
+    def _get_mesh(self):
+        mesh = Mesh(self._phonon.get_dynamical_matrix(),
+                    [5, 5, 5],
+                    is_eigenvectors=True,
+                    rotations=(self._phonon.get_primitive_symmetry().
+                               get_pointgroup_operations()))
+        mesh.run()
+        return mesh
+
+    def _get_phonon(self):
+        cell = read_vasp(os.path.join(data_dir, "../POSCAR_NaCl"))
+        phonon = Phonopy(cell,
+                         np.diag([2, 2, 2]),
+                         primitive_matrix=[[0, 0.5, 0.5],
+                                           [0.5, 0, 0.5],
+                                           [0.5, 0.5, 0]])
+        filename = os.path.join(data_dir, "../FORCE_SETS_NaCl")
+        force_sets = parse_FORCE_SETS(filename=filename)
+        phonon.set_displacement_dataset(force_sets)
+        phonon.produce_force_constants()
+        return phonon
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestDos)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -1,14 +1,23 @@
 import unittest
 import os
 import sys
+import shutil
+import tempfile
 try:
     from StringIO import StringIO
 except ImportError:
     from io import StringIO
 import numpy as np
 from phonopy import Phonopy
+from phonopy.phonon.mesh import (Mesh, IterMesh, StreamingMesh,
+                                 MeshHdf5Writer, MeshHdf5Reader)
+from phonopy.phonon.dos import TotalDosReducer, PartialDosReducer
+from phonopy.phonon.thermal_properties import ThermalPropertiesReducer
+from phonopy.phonon.thermal_displacement import (
+    ThermalDisplacementsReducer, ThermalDisplacementMatricesReducer)
+from phonopy.phonon.moment import PhononMoment, PhononMomentReducer
 from phonopy.interface.vasp import read_vasp
-from phonopy.file_IO import parse_FORCE_SETS, parse_BORN
+from phonopy.file_IO import parse_FORCE_SETS, parse_BORN, parse_mesh_yaml
 
 data_dir = os.path.dirname(os.path.abspath(__file__))
 
@@ -35,6 +44,235 @@ class TestIterMesh(unittest.TestCase):
         np.testing.assert_allclose(mesh_freqs, freqs)
         np.testing.assert_allclose(mesh_eigvecs, eigvecs)
 
+    def testMeshChunk(self):
+        phonon = self._get_phonon()
+        phonon.set_mesh([4, 4, 4], is_eigenvectors=True)
+        _, _, freqs, eigvecs = phonon.get_mesh()
+        dynmat = phonon.get_dynamical_matrix()
+        rotations = phonon.get_primitive_symmetry().get_pointgroup_operations()
+        for chunk_size in (1, 3, 100):
+            mesh = Mesh(dynmat,
+                        [4, 4, 4],
+                        is_eigenvectors=True,
+                        rotations=rotations,
+                        chunk_size=chunk_size)
+            mesh.run()
+            np.testing.assert_allclose(freqs, mesh.get_frequencies())
+            np.testing.assert_allclose(eigvecs, mesh.get_eigenvectors())
+
+            imesh = IterMesh(dynmat,
+                             [4, 4, 4],
+                             is_eigenvectors=True,
+                             rotations=rotations,
+                             chunk_size=chunk_size)
+            for i, (f, e) in enumerate(imesh):
+                np.testing.assert_allclose(freqs[i], f)
+                np.testing.assert_allclose(eigvecs[i], e)
+            self.assertEqual(i + 1, len(freqs))
+
+    def testMeshProcessPool(self):
+        phonon = self._get_phonon()
+        phonon.set_mesh([4, 4, 4], is_eigenvectors=True)
+        _, _, freqs, eigvecs = phonon.get_mesh()
+        for chunk_size in (None, 2):
+            mesh = Mesh(phonon.get_dynamical_matrix(),
+                        [4, 4, 4],
+                        is_eigenvectors=True,
+                        rotations=(phonon.get_primitive_symmetry().
+                                   get_pointgroup_operations()),
+                        chunk_size=chunk_size,
+                        nprocs=2)
+            mesh.run()
+            np.testing.assert_allclose(freqs, mesh.get_frequencies())
+            np.testing.assert_allclose(eigvecs, mesh.get_eigenvectors())
+
+        phonon.set_mesh([4, 4, 4], nprocs=3)
+        _, _, freqs_pool, eigvecs_pool = phonon.get_mesh()
+        np.testing.assert_allclose(freqs, freqs_pool)
+        self.assertTrue(eigvecs_pool is None)
+
+    def testMeshLapackSolver(self):
+        phonon = self._get_phonon()
+        nac_params = phonon.get_nac_params()
+        for method in ('wang', 'gonze', None):
+            if method is None:
+                phonon.set_nac_params(None)
+            else:
+                params = dict(nac_params)
+                params['method'] = method
+                phonon.set_nac_params(params)
+            phonon.set_mesh([4, 4, 4], is_eigenvectors=True)
+            _, _, freqs, _ = phonon.get_mesh()
+            dynmat = phonon.get_dynamical_matrix()
+            rotations = (
+                phonon.get_primitive_symmetry().get_pointgroup_operations())
+            mesh = Mesh(dynmat,
+                        [4, 4, 4],
+                        is_eigenvectors=True,
+                        rotations=rotations,
+                        use_lapack_solver=True,
+                        chunk_size=5)
+            mesh.run()
+            np.testing.assert_allclose(freqs, mesh.get_frequencies(),
+                                       atol=1e-8)
+            # Eigenvectors are compared through dynamical matrices
+            # because of the arbitrary phases and degeneracy.
+            dynmat.set_dynamical_matrices(mesh.get_qpoints())
+            eigvecs = mesh.get_eigenvectors()
+            eigvals = mesh.get_eigenvalues()
+            dms = np.einsum('qij,qj,qkj->qik', eigvecs, eigvals,
+                            eigvecs.conj())
+            np.testing.assert_allclose(dynmat.get_dynamical_matrices(), dms,
+                                       atol=1e-8)
+
+        # Failure of LAPACK is reported.
+        from phonopy.phonon.solver import solve_dynamical_matrices
+        self.assertRaises(RuntimeError,
+                          solve_dynamical_matrices,
+                          np.full((2, 3, 3), np.nan, dtype='c16'),
+                          use_lapack_solver=True)
+
+        # numpy.linalg.eigh is used with a warning without _lapackpy.
+        import warnings
+        dms = dynmat.get_dynamical_matrices()
+        _lapackpy = sys.modules.get('phonopy._lapackpy')
+        sys.modules['phonopy._lapackpy'] = None
+        try:
+            with warnings.catch_warnings(record=True) as w:
+                warnings.simplefilter('always')
+                eigvals_eigh, _ = solve_dynamical_matrices(
+                    dms, use_lapack_solver=True)
+        finally:
+            if _lapackpy is None:
+                del sys.modules['phonopy._lapackpy']
+            else:
+                sys.modules['phonopy._lapackpy'] = _lapackpy
+        self.assertEqual(len(w), 1)
+        np.testing.assert_allclose(eigvals_eigh, eigvals, atol=1e-8)
+
+    def testStreamingMesh(self):
+        phonon = self._get_phonon()
+        masses = phonon.get_primitive().get_masses()
+        phonon.set_mesh([4, 4, 4], is_eigenvectors=True,
+                        is_mesh_symmetry=False)
+        _, weights, freqs, eigvecs = phonon.get_mesh()
+        phonon.set_total_DOS(sigma=0.1)
+        freq_points, dos = phonon.get_total_DOS()
+        phonon.set_partial_DOS(sigma=0.1)
+        _, pdos = phonon.get_partial_DOS()
+        phonon.set_thermal_properties(t_step=100, t_max=500, t_min=0,
+                                      is_projection=True)
+        tp = phonon.get_thermal_properties()
+        phonon.set_thermal_displacements(t_step=100, t_max=500, t_min=0)
+        _, disps = phonon.get_thermal_displacements()
+        moment = PhononMoment(freqs, weights, eigenvectors=eigvecs)
+        moment.run(order=2)
+
+        smesh = StreamingMesh(
+            phonon.get_dynamical_matrix(),
+            [4, 4, 4],
+            is_mesh_symmetry=False,
+            rotations=(phonon.get_primitive_symmetry().
+                       get_pointgroup_operations()),
+            chunk_size=7)
+        total_dos = TotalDosReducer(freq_points, 0.1)
+        partial_dos = PartialDosReducer(freq_points, 0.1)
+        tp_reducer = ThermalPropertiesReducer(is_projection=True)
+        tp_reducer.set_temperature_range(t_min=0, t_max=500, t_step=100)
+        td_reducer = ThermalDisplacementsReducer(masses)
+        td_reducer.set_temperature_range(t_min=0, t_max=500, t_step=100)
+        tdm_reducer = ThermalDisplacementMatricesReducer(masses)
+        tdm_reducer.set_temperature_range(t_min=0, t_max=500, t_step=100)
+        moment_reducer = PhononMomentReducer(order=2, is_projection=True)
+        for reducer in (total_dos, partial_dos, tp_reducer, td_reducer,
+                        tdm_reducer, moment_reducer):
+            smesh.add_reducer(reducer)
+        smesh.run()
+
+        np.testing.assert_allclose(freqs, smesh.get_frequencies())
+        np.testing.assert_allclose(dos, total_dos.get_dos()[1])
+        np.testing.assert_allclose(pdos, partial_dos.get_partial_dos()[1],
+                                   atol=1e-12)
+        for v, v_ref in zip(tp_reducer.get_thermal_properties(), tp):
+            np.testing.assert_allclose(v, v_ref)
+        np.testing.assert_allclose(
+            disps, td_reducer.get_thermal_displacements()[1])
+        _, disp_matrices = tdm_reducer.get_thermal_displacement_matrices()
+        np.testing.assert_allclose(
+            disps, np.diagonal(disp_matrices, axis1=2, axis2=3).reshape(
+                len(disps), -1).real)
+        np.testing.assert_allclose(moment.get_moment(),
+                                   moment_reducer.get_moment())
+
+    def testMeshHdf5(self):
+        phonon = self._get_phonon()
+        mesh = Mesh(phonon.get_dynamical_matrix(),
+                    [4, 4, 4],
+                    is_eigenvectors=True,
+                    rotations=(phonon.get_primitive_symmetry().
+                               get_pointgroup_operations()),
+                    chunk_size=5)
+        mesh.run()
+        freqs = mesh.get_frequencies()
+        eigvecs = mesh.get_eigenvectors()
+        tmpdir = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(tmpdir, "mesh.hdf5")
+            mesh.write_hdf5(filename=filename)
+            with MeshHdf5Reader(filename) as mesh:
+                np.testing.assert_allclose(freqs, mesh.get_frequencies())
+                np.testing.assert_allclose(eigvecs, mesh.get_eigenvectors())
+                np.testing.assert_allclose(
+                    eigvecs[[3, 1]][:, :, 2:5],
+                    mesh.get_eigenvectors(q_indices=[3, 1],
+                                          band_indices=slice(2, 5)))
+                np.testing.assert_allclose(
+                    freqs[2, [0, 4]],
+                    mesh.get_frequencies(q_indices=2, band_indices=[0, 4]))
+
+            # Written chunk by chunk from StreamingMesh
+            smesh = StreamingMesh(
+                phonon.get_dynamical_matrix(),
+                [4, 4, 4],
+                rotations=(phonon.get_primitive_symmetry().
+                           get_pointgroup_operations()),
+                chunk_size=3)
+            smesh.add_reducer(MeshHdf5Writer(smesh,
+                                             filename=filename,
+                                             compression='lzf'))
+            smesh.run()
+            with MeshHdf5Reader(filename) as mesh:
+                np.testing.assert_allclose(freqs, mesh.get_frequencies())
+                np.testing.assert_allclose(eigvecs, mesh.get_eigenvectors())
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def testMeshYaml(self):
+        phonon = self._get_phonon()
+        phonon.set_group_velocity()
+        phonon.set_mesh([4, 4, 4], is_eigenvectors=True)
+        qpoints, weights, freqs, eigvecs = phonon.get_mesh()
+        cwd = os.getcwd()
+        tmpdir = tempfile.mkdtemp()
+        try:
+            os.chdir(tmpdir)
+            phonon.write_yaml_mesh()
+            data = parse_mesh_yaml("mesh.yaml", is_eigenvectors=True)
+            self.assertEqual(data['mesh'], [4, 4, 4])
+            self.assertEqual(data['natom'], 2)
+            np.testing.assert_allclose(qpoints, data['qpoints'], atol=1e-7)
+            np.testing.assert_array_equal(weights, data['weights'])
+            np.testing.assert_allclose(freqs, data['frequencies'], atol=1e-10)
+            np.testing.assert_allclose(eigvecs, data['eigenvectors'],
+                                       atol=1e-14)
+            self.assertEqual(data['group_velocities'].shape,
+                             (len(qpoints), 6, 3))
+            data = parse_mesh_yaml("mesh.yaml")
+            self.assertTrue('eigenvectors' not in data)
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(tmpdir)
+
     def _get_phonon(self):
         cell = read_vasp(os.path.join(data_dir, "../POSCAR_NaCl"))
         phonon = Phonopy(cell,
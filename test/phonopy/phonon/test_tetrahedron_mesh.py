@@ -65,6 +65,20 @@ class TestTetrahedronMesh(unittest.TestCase):
         dos_comp = np.transpose([freq_points, dos]).reshape(10, 8)
         self.assertTrue(np.abs(dos_comp - data).all() < 1e-5)
 
+        # Integration weights of all bands in one C call are equal to
+        # those computed band by band.
+        thm_py = TetrahedronMesh(primitive,
+                                 frequencies,
+                                 mesh,
+                                 grid_address,
+                                 grid_mapping_table,
+                                 ir_grid_points,
+                                 lang='Py')
+        thm.set(value='J', division_number=40)
+        thm_py.set(value='J', division_number=40)
+        for iw, iw_py in zip(thm, thm_py):
+            np.testing.assert_allclose(iw, iw_py, atol=1e-12)
+
     def _show(self, freq_points, dos):
         data = []
         for f, d in zip(freq_points, dos):
@@ -0,0 +1,85 @@
+import unittest
+import numpy as np
+from phonopy.phonon.yaml_format import FixedWidthFormatter, BandYamlFormatter
+
+
+class TestYamlFormat(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_FixedWidthFormatter(self):
+        template = "- [ %12.7f, %17.14f ] # %-5d %3d\n"
+        formatter = FixedWidthFormatter(template)
+        values = np.random.RandomState(1).randn(100, 4)
+        values[:, :2] *= 10.0 ** np.arange(-3, 1)[np.arange(100) % 4, None]
+        values[:, 2:] = np.abs(np.rint(values[:, 2:] * 100))
+        values[:10, :2] = [[0.5, -0.25], [1.25e-7, -1.25e-7],
+                           [-0.0, 5e-15], [1.5e-14, 2.5e-14],
+                           [0, 0], [1e-300, -1e-300],
+                           [3.00000005, 0.12345678901234567],
+                           [-2.00000015, -0.99999999999999995],
+                           [2.5e-8, 7.5e-8], [1234.5678901, 0.1]]
+        self._assert_texts(formatter, template, values)
+
+        # Values not fitting in fields are formatted by python.
+        for v in ([1e5, 0, 0, 0], [0, 12.5, 0, 0], [0, 0, 123456, 0],
+                  [0, 0, 0, 1.5], [0, np.nan, 0, 0]):
+            _values = values.copy()
+            _values[3] = v
+            self._assert_texts(formatter, template, _values)
+
+    def test_BandYamlFormatter(self):
+        num_band = 6
+        rng = np.random.RandomState(2)
+        qpoints = rng.rand(10, 3)
+        frequencies = rng.randn(10, num_band) * 5
+        gv = rng.randn(10, num_band, 3) * 10
+        eigvecs = (rng.randn(10, num_band, num_band) +
+                   1j * rng.randn(10, num_band, num_band))
+        qpoint_format = "- q-position: [ %12.7f, %12.7f, %12.7f ]\n  band:\n"
+        formatter = BandYamlFormatter(num_band,
+                                      frequency_format="    frequency: %15.10f",
+                                      qpoint_format=qpoint_format,
+                                      end="\n\n",
+                                      is_group_velocity=True,
+                                      is_eigenvectors=True)
+        texts = []
+        for i, q in enumerate(qpoints):
+            text = [(qpoint_format % tuple(q)).rstrip("\n")]
+            for j, freq in enumerate(frequencies[i]):
+                text.append("  - # %d" % (j + 1))
+                text.append("    frequency: %15.10f" % freq)
+                text.append("    group_velocity: [ %13.7f, %13.7f, %13.7f ]" %
+                            tuple(gv[i, j]))
+                text.append("    eigenvector:")
+                for k in range(num_band // 3):
+                    text.append("    - # atom %d" % (k + 1))
+                    for l in range(3):
+                        text.append("      - [ %17.14f, %17.14f ]" %
+                                    (eigvecs[i, k * 3 + l, j].real,
+                                     eigvecs[i, k * 3 + l, j].imag))
+            texts.append("\n".join(text) + "\n\n")
+
+        self.assertEqual(texts,
+                         formatter.get_blocks(frequencies,
+                                              group_velocities=gv,
+                                              eigenvectors=eigvecs,
+                                              qpoint_values=qpoints))
+        self.assertEqual("".join(texts),
+                         "".join(formatter.iter_texts(frequencies,
+                                                      group_velocities=gv,
+                                                      eigenvectors=eigvecs,
+                                                      qpoint_values=qpoints)))
+
+    def _assert_texts(self, formatter, template, values):
+        texts = [template % tuple(v) for v in values.tolist()]
+        self.assertEqual(texts, formatter.format(values))
+        self.assertEqual("".join(texts), formatter.format_joined(values))
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestYamlFormat)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,114 @@
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+from phonopy.file_IO import (parse_FORCE_SETS, write_FORCE_SETS,
+                             get_force_sets_format, parse_FORCE_CONSTANTS,
+                             write_FORCE_CONSTANTS,
+                             write_force_constants_to_hdf5,
+                             read_force_constants_hdf5)
+
+data_dir = os.path.dirname(os.path.abspath(__file__))
+
+class TestFileIO(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self._tmpdir)
+
+    def test_FORCE_SETS(self):
+        filename = os.path.join(data_dir, "FORCE_SETS_NaCl")
+        dataset = parse_FORCE_SETS(filename=filename)
+        with open(filename) as f:
+            text = f.read()
+
+        for name, file_format in (("FORCE_SETS", 'text'),
+                                  ("force_sets.hdf5", 'hdf5'),
+                                  ("force_sets.npz", 'npz')):
+            _filename = os.path.join(self._tmpdir, name)
+            write_FORCE_SETS(dataset, filename=_filename)
+            self.assertEqual(get_force_sets_format(_filename), file_format)
+            if file_format == 'text':
+                with open(_filename) as f:
+                    self.assertEqual(text, f.read())
+            _dataset = parse_FORCE_SETS(filename=_filename)
+            self._assert_dataset(dataset, _dataset)
+
+        # Number of values is validated.
+        lines = text.splitlines(True)
+        _filename = os.path.join(self._tmpdir, "FORCE_SETS")
+        for broken_lines in (lines[:-1],
+                             lines[:-1] + ["  0.0 0.0 x\n"],
+                             lines[:3] + ["  0.0 x 0.0\n"] + lines[4:],
+                             lines + ["  0.0 0.0 0.0\n"]):
+            with open(_filename, 'w') as f:
+                f.write("".join(broken_lines))
+            self.assertRaises(RuntimeError, parse_FORCE_SETS,
+                              filename=_filename)
+
+    def test_FORCE_SETS_translational_invariance(self):
+        filename = os.path.join(data_dir, "FORCE_SETS_NaCl")
+        dataset = parse_FORCE_SETS(filename=filename,
+                                   is_translational_invariance=True)
+        for disp in dataset['first_atoms']:
+            np.testing.assert_allclose(disp['forces'].sum(axis=0), 0,
+                                       atol=1e-12)
+
+        _filename = os.path.join(self._tmpdir, "force_sets.hdf5")
+        write_FORCE_SETS(parse_FORCE_SETS(filename=filename),
+                         filename=_filename)
+        _dataset = parse_FORCE_SETS(filename=_filename,
+                                    is_translational_invariance=True)
+        self._assert_dataset(dataset, _dataset)
+
+    def test_FORCE_CONSTANTS(self):
+        fc = np.random.RandomState(0).randn(5, 5, 3, 3)
+        filename = os.path.join(self._tmpdir, "FORCE_CONSTANTS")
+        write_FORCE_CONSTANTS(fc, filename=filename)
+        with open(filename) as f:
+            lines = f.readlines()
+        self.assertEqual(lines[0], "   5\n")
+        self.assertEqual(lines[5], "   1   2\n")
+        self.assertEqual(lines[6], ("%22.15f" * 3 + "\n") % tuple(fc[0, 1, 0]))
+        np.testing.assert_allclose(fc, parse_FORCE_CONSTANTS(filename),
+                                   atol=1e-15)
+
+        # Header and atom pairs are validated.
+        for broken_lines in (["   6\n"] + lines[1:],
+                             lines[:-1],
+                             lines[:-1] + ["  0.0 x 0.0\n"],
+                             lines[:1] + lines[5:9] + lines[1:5] + lines[9:]):
+            with open(filename, 'w') as f:
+                f.write("".join(broken_lines))
+            self.assertRaises(RuntimeError, parse_FORCE_CONSTANTS, filename)
+
+    def test_force_constants_hdf5(self):
+        fc = np.random.RandomState(0).randn(2, 8, 3, 3)
+        p2s_map = np.array([0, 4], dtype='intc')
+        filename = os.path.join(self._tmpdir, "force_constants.hdf5")
+        write_force_constants_to_hdf5(fc, filename=filename, p2s_map=p2s_map)
+        np.testing.assert_array_equal(fc, read_force_constants_hdf5(filename))
+        np.testing.assert_array_equal(
+            fc, read_force_constants_hdf5(filename, p2s_map=p2s_map))
+        self.assertRaises(RuntimeError, read_force_constants_hdf5, filename,
+                          p2s_map=[0, 1])
+        self.assertRaises(RuntimeError, write_FORCE_CONSTANTS, fc,
+                          filename=os.path.join(self._tmpdir,
+                                                "FORCE_CONSTANTS"))
+
+    def _assert_dataset(self, dataset, dataset_ref):
+        self.assertEqual(dataset['natom'], dataset_ref['natom'])
+        self.assertEqual(len(dataset['first_atoms']),
+                         len(dataset_ref['first_atoms']))
+        for disp, disp_ref in zip(dataset['first_atoms'],
+                                  dataset_ref['first_atoms']):
+            self.assertEqual(disp['number'], disp_ref['number'])
+            np.testing.assert_allclose(disp['displacement'],
+                                       disp_ref['displacement'])
+            np.testing.assert_allclose(disp['forces'], disp_ref['forces'])
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestFileIO)
+    unittest.TextTestRunner(verbosity=2).run(suite)